@@ -0,0 +1,301 @@
+#!/usr/bin/env python
+"""
+Benchmarks for parsing, rendering and submission throughput.
+
+Generates synthetic yaml job files with the given number of tasks and
+measures the time spent in parse_jobs_from_yaml, BatchJob.generate_script and
+submit_jobs. Submissions are made against a local fake submit executable
+that mimics the output of the resource manager.
+
+Usage:
+
+# default sweep
+python bench_launcher.py
+
+# larger sweep with a different cluster config, store results as baseline
+python bench_launcher.py -n 1000,10000,100000,1000000 -c ../examples/cluster_config/sara_edison.yaml -s baseline.json
+
+# compare against stored baseline, fails if any phase is >20% slower
+python bench_launcher.py -b baseline.json --tolerance 1.2
+"""
+from __future__ import print_function
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import tempfile
+import tracemalloc
+import contextlib
+import subprocess
+from collections import OrderedDict
+
+from hpclauncher import *
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_CLUSTER = os.path.join(BENCH_DIR, '..', 'examples', 'cluster_config',
+                               'mike_stampede.yaml')
+
+# fake submit executables, print resource manager specific job ids
+FAKE_SUBMIT = {
+    'slurm': 'echo "Submitted batch job $n"',
+    'sge': 'echo "Your job $n (\\"$1\\") has been submitted"',
+    'pbs': 'echo "$n.fakeserver"',
+    'bash': 'true',
+}
+FAKE_SUBMIT_TEMPLATE = """#!/bin/bash
+counter={counter}
+n=$(( $(cat $counter 2>/dev/null || echo 0) + 1 ))
+echo $n > $counter
+{output}
+"""
+
+JOB_TEMPLATE = """job_{name}:
+    logfile: log_{name}
+    nproc: {nproc}
+    time:
+        hours: 1
+        minutes: 30
+        seconds: 0
+"""
+TASK_TEMPLATE = """    task_{index}:
+        command: '{{mpiexec}} python runSome.py -r {{runTag}} -i {index}'
+        runTag: run_{name}
+        logfile: log_{name}_{index}
+"""
+
+
+def generate_job_file(filename, ntasks, tasks_per_job):
+    """
+    Writes a synthetic yaml job file with ntasks tasks in total.
+    """
+    with open(filename, 'w') as f:
+        f.write('queue: normal\nlogfiledir: log\n')
+        njobs = max(1, (ntasks + tasks_per_job - 1)//tasks_per_job)
+        for i in range(njobs):
+            name = 'bench{:07d}'.format(i)
+            f.write(JOB_TEMPLATE.format(name=name, nproc=(i % 4 + 1)*12))
+            first = i*tasks_per_job
+            last = min(ntasks, first + tasks_per_job)
+            for k in range(first, last):
+                f.write(TASK_TEMPLATE.format(name=name, index=k))
+
+
+def generate_fake_submit(workdir, managertype):
+    """
+    Creates a fake submit executable in workdir and returns its path.
+    """
+    exe = os.path.join(workdir, 'fake_submit')
+    with open(exe, 'w') as f:
+        f.write(FAKE_SUBMIT_TEMPLATE.format(
+            counter=os.path.join(workdir, 'counter'),
+            output=FAKE_SUBMIT.get(managertype, 'true')))
+    os.chmod(exe, 0o755)
+    return exe
+
+
+@contextlib.contextmanager
+def silenced():
+    """
+    Redirects stdout to /dev/null.
+    """
+    stdout = sys.stdout
+    with open(os.devnull, 'w') as devnull:
+        sys.stdout = devnull
+        try:
+            yield
+        finally:
+            sys.stdout = stdout
+
+
+def measure(func, trace_memory=True):
+    """
+    Calls func and returns (result, elapsed time, peak traced memory).
+    """
+    if trace_memory:
+        tracemalloc.start()
+    t0 = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - t0
+    peak = None
+    if trace_memory:
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def run_case(ntasks, tasks_per_job, clusterfile, workdir, repeat=1,
+             trace_memory=True, submit=True):
+    """
+    Runs all benchmarks for one sweep size. Returns results in a dict.
+    """
+    clusterparams.initialize_from_file(clusterfile)
+    managertype = clusterparams['resourcemanager']
+    kw = dict(clusterparams.get_args())
+    kw['submitexec'] = generate_fake_submit(workdir, managertype)
+    kw['scriptpattern'] = clusterparams.scriptpattern
+    clusterparams.initialize_with_args(**kw)
+
+    jobfile = os.path.join(workdir, 'jobs_{:d}.yaml'.format(ntasks))
+    generate_job_file(jobfile, ntasks, tasks_per_job)
+
+    def parse():
+        return parse_jobs_from_yaml(jobfile)
+
+    def render():
+        return [j.generate_script() for j in jobs]
+
+    def submit():
+        with silenced():
+            submit_jobs(jobs)
+
+    phases = [('parse_jobs_from_yaml', parse),
+              ('generate_script', render)]
+    if submit:
+        phases.append(('submit_jobs', submit))
+
+    curdir = os.getcwd()
+    os.chdir(workdir)
+    results = OrderedDict()
+    try:
+        jobs = parse()
+        njobs = len(jobs)
+        for name, func in phases:
+            metrics.reset()
+            times = []
+            for i in range(repeat):
+                out, elapsed, _ = measure(func, trace_memory=False)
+                times.append(elapsed)
+                if name == 'parse_jobs_from_yaml':
+                    jobs = out
+            peak = None
+            if trace_memory:
+                _, _, peak = measure(func, trace_memory=True)
+            best = min(times)
+            r = OrderedDict()
+            r['ntasks'] = ntasks
+            r['njobs'] = njobs
+            r['time'] = best
+            r['tasks_per_second'] = ntasks/best if best > 0 else None
+            r['jobs_per_second'] = njobs/best if best > 0 else None
+            r['peak_memory'] = peak
+            r['phases'] = OrderedDict(
+                [(p, h['mean']) for p, h in metrics.as_dict().items()])
+            results[name] = r
+    finally:
+        os.chdir(curdir)
+    return results
+
+
+def get_environment():
+    """
+    Returns metadata that identifies the benchmarked version.
+    """
+    env = OrderedDict()
+    env['python'] = platform.python_version()
+    env['platform'] = platform.platform()
+    env['date'] = time.strftime('%Y-%m-%d %H:%M:%S')
+    try:
+        rev = subprocess.check_output(['git', 'describe', '--always',
+                                       '--dirty'], cwd=BENCH_DIR,
+                                      stderr=subprocess.STDOUT)
+        env['revision'] = rev.decode('ascii').strip()
+    except Exception:
+        env['revision'] = None
+    return env
+
+
+def print_results(results):
+    fmt = '{:<22s} {:>9s} {:>7s} {:>10s} {:>12s} {:>11s}'
+    print(fmt.format('phase', 'ntasks', 'njobs', 'time (s)', 'tasks/s',
+                     'peak (MiB)'))
+    for key, r in results.items():
+        peak = r['peak_memory']
+        peak = '{:.1f}'.format(peak/2.0**20) if peak is not None else '-'
+        print(fmt.format(key.split('/')[0], str(r['ntasks']), str(r['njobs']),
+                         '{:.4f}'.format(r['time']),
+                         '{:.0f}'.format(r['tasks_per_second'] or 0),
+                         peak))
+
+
+def compare_results(results, baseline, tolerance):
+    """
+    Compares results against a baseline. Returns list of regressed entries.
+    """
+    fmt = '{:<30s} {:>10s} {:>10s} {:>7s}'
+    print(fmt.format('benchmark', 'baseline', 'current', 'ratio'))
+    regressions = []
+    for key, r in results.items():
+        b = baseline['results'].get(key)
+        if b is None:
+            continue
+        ratio = r['time']/b['time'] if b['time'] > 0 else float('inf')
+        flag = ''
+        if ratio > tolerance:
+            regressions.append(key)
+            flag = ' !'
+        print(fmt.format(key, '{:.4f}'.format(b['time']),
+                         '{:.4f}'.format(r['time']),
+                         '{:.2f}'.format(ratio)) + flag)
+    return regressions
+
+
+def parseCommandLine():
+    import argparse
+    parser = argparse.ArgumentParser(
+        description='Benchmark hpclauncher parsing, rendering and submission')
+    parser.add_argument('-n', '--ntasks', default='1000,10000',
+                        help='comma separated list of total task counts')
+    parser.add_argument('-j', '--tasks-per-job', type=int, default=100,
+                        help='number of tasks in each synthetic job')
+    parser.add_argument('-c', '--clusterparamsfile', default=DEFAULT_CLUSTER,
+                        help='cluster parameter file used in the benchmark')
+    parser.add_argument('-r', '--repeat', type=int, default=3,
+                        help='number of timed repetitions, best is reported')
+    parser.add_argument('--no-submit', action='store_true', default=False,
+                        help='skip the end-to-end submit_jobs benchmark')
+    parser.add_argument('--no-memory', action='store_true', default=False,
+                        help='skip the peak memory measurement')
+    parser.add_argument('-s', '--save', help='store results in a json file')
+    parser.add_argument('-b', '--baseline',
+                        help='compare results against a stored json file')
+    parser.add_argument('--tolerance', type=float, default=1.2,
+                        help='max allowed time ratio versus baseline')
+    args = parser.parse_args()
+
+    results = OrderedDict()
+    for n in [int(s) for s in args.ntasks.split(',')]:
+        workdir = tempfile.mkdtemp(prefix='hpclauncher_bench_')
+        try:
+            r = run_case(n, args.tasks_per_job, args.clusterparamsfile,
+                         workdir, repeat=args.repeat,
+                         trace_memory=not args.no_memory,
+                         submit=not args.no_submit)
+        finally:
+            shutil.rmtree(workdir)
+        for phase in r:
+            results['{:}/{:d}'.format(phase, n)] = r[phase]
+    print_results(results)
+
+    if args.save is not None:
+        output = OrderedDict()
+        output['environment'] = get_environment()
+        output['clusterparamsfile'] = os.path.basename(args.clusterparamsfile)
+        output['tasks_per_job'] = args.tasks_per_job
+        output['results'] = results
+        with open(args.save, 'w') as f:
+            json.dump(output, f, indent=2)
+    if args.baseline is not None:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        print('\nComparing to baseline {:} ({:})'.format(
+            args.baseline, baseline['environment'].get('revision')))
+        regressions = compare_results(results, baseline, args.tolerance)
+        if len(regressions) > 0:
+            print('Regressions: ' + ', '.join(regressions))
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    parseCommandLine()
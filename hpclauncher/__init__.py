@@ -4,6 +4,7 @@ from .hpclauncher import *
 from .clusterparameters import CLUSTERPARAM_ENV_VAR, CLUSTERPARAM_USERFILE  # NOQA
 from .task import BatchTask  # NOQA
 from .job import BatchJob  # NOQA
+from .instrumentation import metrics  # NOQA
 from os.path import expanduser  # NOQA
 
 # initialize cluster parameters
@@ -0,0 +1,34 @@
+"""
+Command line tools that are run inside generated job scripts.
+
+Usage:
+
+python -m hpclauncher accounting -s summary.tsv -t taskname -- cmd
+python -m hpclauncher envsnapshot -o snapshot.sh -- 'module load python'
+python -m hpclauncher pyworker -d taskdir -n 4
+"""
+from __future__ import absolute_import, print_function
+import sys
+from . import accounting
+from . import envsnapshot
+from . import pyworker
+
+TOOLS = {
+    'accounting': accounting.main,
+    'envsnapshot': envsnapshot.main,
+    'pyworker': pyworker.main,
+}
+
+
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv[1:]
+    if len(argv) == 0 or argv[0] not in TOOLS:
+        print('usage: python -m hpclauncher {{{0}}} [args]'.format(
+            ','.join(sorted(TOOLS))), file=sys.stderr)
+        return 2
+    return TOOLS[argv[0]](argv[1:])
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,166 @@
+"""
+Per-task resource accounting.
+
+With keyword accounting=True each task in the generated script is run
+through a small wrapper that records wall time, cpu time, max resident set
+size and exit status of the task. One tab separated record per task is
+appended to a per-job summary file in logfiledir.
+
+Summaries of many jobs can be loaded into columnar arrays for analysis:
+
+    from hpclauncher import accounting
+    acct = accounting.load_summaries('log/*_acct.*.tsv')
+    print(max(acct['maxrss']))
+
+Usage of the wrapper:
+
+python -m hpclauncher accounting -s summary.tsv -t taskname -- bash -c 'cmd'
+"""
+from __future__ import absolute_import, print_function
+import os
+import glob
+import time
+import shlex
+import signal
+import socket
+import resource
+import argparse
+import subprocess
+from collections import OrderedDict
+
+from .logstaging import JOBID_EXPR
+
+# record columns and their types
+COLUMNS = OrderedDict([
+    ('jobid', str),
+    ('jobname', str),
+    ('taskname', str),
+    ('host', str),
+    ('start', float),
+    ('walltime', float),
+    ('usertime', float),
+    ('systime', float),
+    ('maxrss', int),  # kilobytes
+    ('exitcode', int),
+])
+
+
+def get_summary_file(jobname, logdir=None):
+    """
+    Returns path of the job summary file, containing the run time job id.
+    """
+    name = '{0}_acct.{1}.tsv'.format(jobname, JOBID_EXPR)
+    if logdir is not None:
+        name = os.path.join(logdir, name)
+    return name
+
+
+def wrap_command(cmd, taskname, summaryfile, jobname=None,
+                 pythonexec='python'):
+    """
+    Wraps a bash command with the accounting wrapper.
+    """
+    wrapper = '{0} -m hpclauncher accounting -s {1} -t {2}'.format(
+        pythonexec, summaryfile, shlex.quote(taskname))
+    if jobname is not None:
+        wrapper += ' -j {0}'.format(shlex.quote(jobname))
+    return wrapper + ' -- bash -c ' + shlex.quote(cmd)
+
+
+def format_record(values):
+    """
+    Formats a record as one line of text.
+    """
+    words = []
+    for (key, typ), v in zip(COLUMNS.items(), values):
+        if typ is float:
+            words.append('{0:.3f}'.format(v))
+        else:
+            words.append(str(v).replace('\t', ' '))
+    return '\t'.join(words) + '\n'
+
+
+def append_record(summaryfile, values):
+    """
+    Appends a record to the summary file with a single write call.
+    """
+    line = format_record(values).encode('utf-8')
+    fd = os.open(summaryfile, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        os.write(fd, line)
+    finally:
+        os.close(fd)
+
+
+def run_task(cmd, summaryfile, taskname, jobname=''):
+    """
+    Runs a command, appends its resource usage to summaryfile.
+
+    Returns the exit code of the command.
+    """
+    start = time.time()
+    proc = subprocess.Popen(cmd)
+
+    def forward(signum, frame):
+        proc.send_signal(signum)
+    for s in [signal.SIGTERM, signal.SIGINT]:
+        signal.signal(s, forward)
+    exitcode = proc.wait()
+    walltime = time.time() - start
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    jobid = os.environ.get('SLURM_JOB_ID', os.environ.get(
+        'PBS_JOBID', os.environ.get('JOB_ID', '')))
+    append_record(summaryfile, [jobid, jobname, taskname,
+                                socket.gethostname(), start, walltime,
+                                usage.ru_utime, usage.ru_stime,
+                                usage.ru_maxrss, exitcode])
+    return exitcode
+
+
+def load_summaries(files, asarray=False):
+    """
+    Loads summary files into columns.
+
+    files is a list of file names or a glob pattern. Returns an OrderedDict
+    of column lists. If asarray=True, columns are converted to numpy arrays.
+    """
+    if not isinstance(files, (list, tuple)):
+        files = sorted(glob.glob(files))
+    columns = OrderedDict([(k, []) for k in COLUMNS])
+    types = list(COLUMNS.values())
+    for fn in files:
+        with open(fn) as f:
+            for line in f:
+                words = line.rstrip('\n').split('\t')
+                if len(words) != len(types):
+                    # skip truncated records
+                    continue
+                for k, typ, w in zip(columns, types, words):
+                    columns[k].append(typ(w))
+    if asarray:
+        import numpy
+        columns = OrderedDict([(k, numpy.array(v))
+                               for k, v in columns.items()])
+    return columns
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m hpclauncher accounting',
+        description='Runs a command and records its resource usage')
+    parser.add_argument('-s', '--summaryfile', required=True,
+                        help='summary file where the record is appended')
+    parser.add_argument('-t', '--taskname', required=True)
+    parser.add_argument('-j', '--jobname', default='')
+    parser.add_argument('command', nargs=argparse.REMAINDER)
+    args = parser.parse_args(argv)
+    cmd = args.command
+    if len(cmd) > 0 and cmd[0] == '--':
+        cmd = cmd[1:]
+    if len(cmd) == 0:
+        parser.error('command missing')
+    exitcode = run_task(cmd, args.summaryfile, args.taskname, args.jobname)
+    if exitcode < 0:
+        # killed by a signal, use shell convention
+        exitcode = 128 - exitcode
+    return exitcode
@@ -0,0 +1,118 @@
+"""
+Hierarchical barrier jobs for jobs with many parents.
+
+parentjobok and parentjobany may be lists of parent jobs, e.g. an
+aggregation job that depends on all jobs of a parameter sweep. Very long
+dependency lists are slow to evaluate for the scheduler and may exceed
+the length limits of the submission. If a job has more than maxfanin
+parents, the parents are split in groups of maxfanin and each group is
+replaced by a barrier job: a one process, one minute job that depends on
+the group with the same dependency type and does nothing. Barriers are
+added in levels until no job has more than maxfanin parents, so with the
+default limit up to 4096 parents need one level of barriers.
+
+A failed parent blocks its barrier in the same way as it would block the
+job itself.
+
+Usage:
+
+    sweep = [BatchJob(jobname='run{0:d}'.format(i), ...) for i in range(1000)]
+    agg = BatchJob(jobname='aggregate', ...,
+                   parentjobok=[j['jobname'] for j in sweep])
+    submit_jobs(sweep + [agg])
+
+Cluster keywords:
+
+- maxfanin: largest number of parents of a job (default 64)
+"""
+from __future__ import absolute_import
+
+from .clusterparameters import clusterparams
+from . import job
+
+DEFAULT_MAX_FANIN = 64
+
+BARRIER_WALLTIME = 60
+
+# keywords copied from the job that waits for the barrier
+INHERITED_KEYS = ['queue', 'useraccountnb', 'qos', 'rundir', 'logfiledir']
+
+
+class BarrierJob(job.BatchJob):
+    """
+    A minimal job that only waits for its parent jobs.
+    """
+    def __init__(self, parents, tag, child, **kwargs):
+        """
+        Arguments
+        ---------
+        parents : list of parent job names or ids
+        tag : str
+                dependency type, 'parentjobok' or 'parentjobany'
+        child : BatchJob
+                the job that waits for the barrier
+        kwargs  : keyword arguments
+                arguments of the barrier job
+        """
+        for k in INHERITED_KEYS:
+            if child[k] is not None:
+                kwargs.setdefault(k, child[k])
+        kwargs.setdefault('nproc', 1)
+        kwargs.setdefault('nnode', 1)
+        kwargs.setdefault('logfile', 'log_' + kwargs['jobname'])
+        kwargs[tag] = list(parents)
+        super(BarrierJob, self).__init__(**kwargs)
+        self.set_walltime(BARRIER_WALLTIME)
+        self.append_new_task('true')
+
+
+def get_max_fanin(maxfanin=None):
+    """
+    Returns the largest number of parents of a job.
+    """
+    if maxfanin is None:
+        maxfanin = clusterparams['maxfanin']
+        if maxfanin is None:
+            maxfanin = DEFAULT_MAX_FANIN
+    maxfanin = int(maxfanin)
+    if maxfanin < 2:
+        raise Exception('maxfanin must be at least 2: ' + str(maxfanin))
+    return maxfanin
+
+
+def insert_barriers(job_list, maxfanin=None, verbose=False):
+    """
+    Inserts barrier jobs for jobs that have more than maxfanin parents.
+
+    Barriers are placed before the job that waits for them, so parents
+    still precede their children in the returned list.
+    """
+    if not isinstance(job_list, list):
+        job_list = [job_list]
+    maxfanin = get_max_fanin(maxfanin)
+    new_list = []
+    for j in job_list:
+        for tag in job.PARENT_TAGS:
+            parents = job.get_parents(j, tag)
+            level = 0
+            while len(parents) > maxfanin:
+                level += 1
+                upper = []
+                for i in range(0, len(parents), maxfanin):
+                    chunk = parents[i:i + maxfanin]
+                    if len(chunk) == 1:
+                        upper.append(chunk[0])
+                        continue
+                    name = '{0}_{1}{2:d}_{3:d}'.format(
+                        j['jobname'], tag.replace('parentjob', 'barrier'),
+                        level, len(upper) + 1)
+                    new_list.append(BarrierJob(chunk, tag, j, jobname=name))
+                    upper.append(name)
+                if verbose:
+                    print('{0}: {1:d} parents behind {2:d} barriers'.format(
+                        j['jobname'], len(parents), len(upper)))
+                parents = upper
+            if level > 0:
+                j.kwargs[tag] = parents
+        new_list.append(j)
+    return new_list
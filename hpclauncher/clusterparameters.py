@@ -6,6 +6,7 @@ Tuomas Karna 2015-09-02
 from __future__ import absolute_import
 import os
 from . import yaml_interface
+from .instrumentation import metrics
 
 # constants for fiding cluster param file
 CLUSTERPARAM_ENV_VAR = 'HPCLAUNCHER_CLUSTER'
@@ -86,6 +87,7 @@ clusterParams.initializeWithArgs(submitexec='sbatch', ...)
         self._check_initialized()
         return self.kwargs
 
+    @metrics.timed('generate_script_header')
     def generate_script_header(self, **kwargs):
         """
         Returns submission script filled with metadata
@@ -142,6 +144,7 @@ class SlurmSetup(ClusterSetup):
 #SBATCH -A {useraccountnb}
 #SBATCH --dependency=afterany:{parentjobany}
 #SBATCH --dependency=afterok:{parentjobok}
+#SBATCH --nice={nice}
 """
         if scriptpattern is None:
             scriptpattern = default_pattern
@@ -0,0 +1,173 @@
+"""
+Coalescing of small independent jobs into fewer allocations.
+
+Compatible jobs (same queue, account and run directory, no parent jobs) are
+packed into bundles of a target node count and wall time. Each bundle is
+submitted as a single job. Inside the bundle the member jobs are arranged in
+lanes: lanes run concurrently, members of a lane run one after another.
+Jobs that depend on a member are rewired to depend on the bundle.
+
+Usage:
+
+    jobs = coalesce_jobs(jobs, nnode=1, walltime=TimeRequest(2, 0, 0))
+    submit_jobs(jobs)
+"""
+from __future__ import absolute_import
+from collections import OrderedDict
+
+from .clusterparameters import clusterparams
+from . import job
+
+
+class JobBundle(job.BatchJob):
+    """
+    A batch job that runs several member jobs in concurrent lanes.
+    """
+    def __init__(self, lanes, **kwargs):
+        """
+        Arguments
+        ---------
+        lanes : list of lists of BatchJob objects
+                members of each lane are executed sequentially
+        kwargs  : keyword arguments
+                arguments of the bundle job
+        """
+        super(JobBundle, self).__init__(**kwargs)
+        self.lanes = lanes
+
+    @property
+    def members(self):
+        return [m for lane in self.lanes for m in lane]
+
+    def generate_script_body(self):
+        """
+        Generates content of the batch script without the header.
+        """
+        content = ''
+        for i, lane in enumerate(self.lanes):
+            content += '# lane {0:d}\n(\n'.format(i)
+            for m in lane:
+                content += '# member job {0}\n(\n'.format(m['jobname'])
+                content += m.generate_script_body()
+                content += ')\n'
+            content += ') &\n'
+        content += 'wait\n'
+        return content
+
+
+def _compatibility_key(j):
+    return (j['queue'], j['useraccountnb'], j['rundir'])
+
+
+def coalesce_jobs(job_list, nnode=1, walltime=None, ncoresnode=None,
+                  verbose=False):
+    """
+    Packs small independent jobs into bundles.
+
+    Arguments
+    ---------
+    job_list : list of BatchJob objects
+    nnode : int
+            number of nodes in each bundle
+    walltime : TimeRequest or seconds
+            maximum wall time of a bundle. By default the longest member
+            wall time in each group is used.
+    ncoresnode : int
+            number of cores in a node, read from cluster parameters by default
+
+    Returns a new job list where bundles replace their member jobs. Jobs that
+    can not be coalesced are returned as is.
+    """
+    if not isinstance(job_list, list):
+        job_list = [job_list]
+    if ncoresnode is None:
+        ncoresnode = clusterparams['ncoresnode']
+    if ncoresnode is None:
+        raise Exception('missing cluster parameter: ncoresnode')
+    capacity = int(nnode)*int(ncoresnode)
+    max_walltime = job.to_seconds(walltime)
+
+    # candidates: no parents, fit in a bundle, known wall time
+    groups = OrderedDict()
+    for j in job_list:
+        has_parents = len(job.get_parents(j)) > 0
+        w = j.get_walltime()
+        if (has_parents or w is None or int(j['nproc']) > capacity or
+                int(j['nnode'] or 1) > 1 or
+                (max_walltime is not None and w > max_walltime) or
+                type(j) is not job.BatchJob):
+            continue
+        groups.setdefault(_compatibility_key(j), []).append(j)
+
+    bundle_of = {}
+    bundles = OrderedDict()
+    for key, members in groups.items():
+        if len(members) < 2:
+            continue
+        limit = max_walltime
+        if limit is None:
+            limit = max(m.get_walltime() for m in members)
+        # first fit decreasing, lanes have the width of member nproc
+        members = sorted(members, key=lambda m: -m.get_walltime())
+        packed = []
+        for m in members:
+            p = int(m['nproc'])
+            w = m.get_walltime()
+            placed = False
+            for b in packed:
+                # prefer a new concurrent lane, then append to a lane
+                if b['cores'] + p <= capacity:
+                    b['lanes'].append({'width': p, 'time': w, 'jobs': [m]})
+                    b['cores'] += p
+                    placed = True
+                    break
+                for lane in b['lanes']:
+                    if lane['width'] == p and lane['time'] + w <= limit:
+                        lane['jobs'].append(m)
+                        lane['time'] += w
+                        placed = True
+                        break
+                if placed:
+                    break
+            if not placed:
+                packed.append({'cores': p, 'lanes': [
+                    {'width': p, 'time': w, 'jobs': [m]}]})
+        for b in packed:
+            lanes = [lane['jobs'] for lane in b['lanes']]
+            if sum(len(lane) for lane in lanes) < 2:
+                continue
+            name = 'bundle{0:d}'.format(len(bundles) + 1)
+            kw = {
+                'jobname': name,
+                'queue': key[0],
+                'nproc': b['cores'],
+                'nnode': (b['cores'] + int(ncoresnode) - 1)//int(ncoresnode),
+                'logfile': 'log_' + name,
+            }
+            if key[1] is not None:
+                kw['useraccountnb'] = key[1]
+            if key[2] is not None:
+                kw['rundir'] = key[2]
+            bundle = JobBundle(lanes, **kw)
+            bundle.set_walltime(max(lane['time'] for lane in b['lanes']))
+            for m in bundle.members:
+                bundle_of[m['jobname']] = name
+            bundles[name] = bundle
+            if verbose:
+                print('coalesced {0:d} jobs into {1}'.format(
+                    len(bundle.members), name))
+
+    # replace members by bundles, rewire dependencies
+    new_list = []
+    added = set()
+    for j in job_list:
+        name = j['jobname']
+        if name in bundle_of:
+            bname = bundle_of[name]
+            if bname not in added:
+                new_list.append(bundles[bname])
+                added.add(bname)
+            continue
+        job.rename_parents(j, bundle_of)
+        new_list.append(j)
+    return new_list
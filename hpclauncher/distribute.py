@@ -0,0 +1,165 @@
+"""
+Distribution of independent tasks over the nodes of a multi-node job.
+
+Without distribution all tasks of a job script run on the first node of
+the allocation. If the distribute keyword is set, each threaded (concurrent)
+task without MPI is started on a node that has free slots. The node list is
+read when the job starts and slots are accounted per node with a lock, so
+tasks are placed as slots become free:
+
+- 'srun': Slurm job steps pinned to the node, srun -N1 -n1 -w <node>
+- 'ssh': remote launch with ssh, e.g. for SGE or PBS. The task runs in the
+  current directory; the environment is not propagated.
+- 'local': run on the current node, only node accounting (for testing)
+- 'auto' or True: 'srun' in Slurm jobs, otherwise 'ssh' if the allocation
+  has more than one node, otherwise 'local'
+
+The node list is read from the Slurm, PBS or SGE environment, or from the
+file given with hostfile. Each task takes nthread slots (default 1) of the
+slotspernode slots of a node (default ncoresnode, or nproc/nnode). The node
+name is available in the task as $HPCL_NODE.
+
+Job keywords:
+
+- distribute: 'auto', 'srun', 'ssh' or 'local'
+- slotspernode: number of slots in a node
+- hostfile: file with one node name per line
+"""
+from __future__ import absolute_import
+import shlex
+
+DISTRIBUTE_METHODS = ['auto', 'srun', 'ssh', 'local']
+
+PROLOGUE_TEMPLATE = """# distribute tasks over the nodes of the allocation
+_hpcl_nodedir=$(mktemp -d {localscratch}/hpclauncher_nodes_XXXXXX)
+_hpcl_hostfile={hostfile}
+if [ -n "$_hpcl_hostfile" ]; then
+    _hpcl_nodes=$(awk '!seen[$1]++ {{print $1}}' "$_hpcl_hostfile")
+elif [ -n "$SLURM_JOB_NODELIST" ]; then
+    _hpcl_nodes=$(scontrol show hostnames "$SLURM_JOB_NODELIST")
+elif [ -n "$PBS_NODEFILE" ]; then
+    _hpcl_nodes=$(awk '!seen[$0]++' $PBS_NODEFILE)
+elif [ -n "$PE_HOSTFILE" ]; then
+    _hpcl_nodes=$(awk '{{print $1}}' $PE_HOSTFILE)
+else
+    _hpcl_nodes=$(hostname)
+fi
+for _hpcl_node in $_hpcl_nodes; do echo 0 > $_hpcl_nodedir/$_hpcl_node; done
+_hpcl_launch={method}
+if [ $_hpcl_launch = auto ]; then
+    if [ -n "$SLURM_JOB_ID" ]; then
+        _hpcl_launch=srun
+    elif [ $(echo $_hpcl_nodes | wc -w) -gt 1 ]; then
+        _hpcl_launch=ssh
+    else
+        _hpcl_launch=local
+    fi
+fi
+_hpcl_slots={slots}
+_hpcl_acquire_node() {{
+    # prints a node with $1 free slots and reserves them
+    while true; do
+        {{
+            flock 9
+            for _hpcl_node in $_hpcl_nodes; do
+                read _hpcl_used < $_hpcl_nodedir/$_hpcl_node
+                if [ $((_hpcl_used + $1)) -le $_hpcl_slots ]; then
+                    echo $((_hpcl_used + $1)) > $_hpcl_nodedir/$_hpcl_node
+                    echo $_hpcl_node
+                    return
+                fi
+            done
+        }} 9> $_hpcl_nodedir/.lock
+        sleep 0.2
+    done
+}}
+_hpcl_release_node() {{
+    {{
+        flock 9
+        read _hpcl_used < $_hpcl_nodedir/$1
+        echo $((_hpcl_used - $2)) > $_hpcl_nodedir/$1
+    }} 9> $_hpcl_nodedir/.lock
+}}
+_hpcl_on_node() {{
+    # runs command $2 on a node with $1 free slots
+    _hpcl_n=$(( $1 < _hpcl_slots ? $1 : _hpcl_slots ))
+    _hpcl_host=$(_hpcl_acquire_node $_hpcl_n)
+    case $_hpcl_launch in
+        srun) HPCL_NODE=$_hpcl_host srun -N1 -n1 -c $_hpcl_n -w $_hpcl_host \\
+                  --exact bash -c "$2" ;;
+        ssh) ssh -o BatchMode=yes $_hpcl_host \\
+                 "cd $(printf %q "$PWD") && export HPCL_NODE=$_hpcl_host && $2" ;;
+        *) HPCL_NODE=$_hpcl_host bash -c "$2" ;;
+    esac
+    _hpcl_rc=$?
+    _hpcl_release_node $_hpcl_host $_hpcl_n
+    return $_hpcl_rc
+}}
+_hpcl_cleanup_nodes() {{
+    rm -rf $_hpcl_nodedir
+}}
+"""
+
+# name of the shell function that must be called at exit
+EXIT_HOOK = '_hpcl_cleanup_nodes'
+
+DEFAULT_LOCALSCRATCH = '${TMPDIR:-/tmp}'
+
+
+def get_method(value):
+    """
+    Returns the distribution method of a distribute keyword value, or None
+    if tasks are not distributed.
+    """
+    if value is None or value is False:
+        return None
+    if value is True:
+        return 'auto'
+    if value not in DISTRIBUTE_METHODS:
+        raise Exception('unknown distribute method: ' + str(value))
+    return value
+
+
+def get_slots_per_node(slotspernode=None, ncoresnode=None, nproc=None,
+                       nnode=None):
+    """
+    Returns the number of task slots in a node.
+    """
+    if slotspernode is not None:
+        return int(slotspernode)
+    if ncoresnode is not None:
+        return int(ncoresnode)
+    if nproc is not None:
+        nnode = int(nnode or 1)
+        return max(1, -(-int(nproc)//nnode))
+    return 1
+
+
+def is_distributable(task):
+    """
+    Returns True if the task can be run on any node of the allocation.
+    """
+    if not task.threaded or task.cmd is None:
+        return False
+    return '{mpiexec}' not in task.cmd.lower()
+
+
+def generate_prologue(method, slots, hostfile=None, localscratch=None):
+    """
+    Returns script lines that read the node list and define the launch
+    functions.
+
+    EXIT_HOOK must be called when the job script exits.
+    """
+    if localscratch is None:
+        localscratch = DEFAULT_LOCALSCRATCH
+    return PROLOGUE_TEMPLATE.format(
+        method=method, slots=int(slots), localscratch=localscratch,
+        hostfile=shlex.quote(hostfile) if hostfile else "''")
+
+
+def wrap_command(cmd, nslots=1):
+    """
+    Wraps a bash command to run on a node with nslots free slots.
+    """
+    return '_hpcl_on_node {0:d} {1}'.format(int(nslots), shlex.quote(cmd))
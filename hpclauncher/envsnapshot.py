@@ -0,0 +1,178 @@
+"""
+Cached snapshots of the task environment.
+
+Instead of running 'module load ...; source env.sh' in every task, the
+environment setup is declared once with the envsetup keyword. The setup is
+run once in a clean shell and the resulting changes to the environment are
+stored in a snapshot file of export statements. The job script sources the
+snapshot once before the tasks are started, so all tasks inherit the
+environment without touching the module system.
+
+Snapshots are cached in envcache, keyed by a hash of the setup commands.
+Remove the cached file to force a refresh.
+
+Job or cluster keywords:
+
+- envsetup: shell commands (string or list) that set up the environment
+- envcache: snapshot directory (default ~/.hpclauncher/envcache), must be
+  visible on the compute nodes
+- envresolve: 'submit' (default) creates the snapshot when the script is
+  generated, 'job' creates it in the first job that needs it
+
+Usage of the snapshot tool:
+
+python -m hpclauncher envsnapshot -o snapshot.sh -- 'module load python'
+"""
+from __future__ import absolute_import, print_function
+import os
+import shlex
+import hashlib
+import argparse
+import tempfile
+import subprocess
+
+DEFAULT_CACHEDIR = '~/.hpclauncher/envcache'
+
+# variables that describe the shell rather than the environment
+EXCLUDED = ['_', 'PWD', 'OLDPWD', 'SHLVL', '_HPCL_ENV_OUT']
+EXCLUDED_PREFIXES = ['BASH_FUNC_']
+
+PROLOGUE_TEMPLATE = """# load cached environment snapshot
+_hpcl_envsnap={snapshot}
+{create}source $_hpcl_envsnap
+"""
+
+CREATE_TEMPLATE = """if [ ! -f $_hpcl_envsnap ]; then
+    {pythonexec} -m hpclauncher envsnapshot -o $_hpcl_envsnap -- {setup}
+fi
+"""
+
+
+def as_string(setup):
+    """
+    Returns setup commands (string or list) as one string.
+    """
+    if setup is None:
+        return None
+    if isinstance(setup, (list, tuple)):
+        return '\n'.join(setup)
+    return str(setup)
+
+
+def get_snapshot_file(setup, cachedir=None):
+    """
+    Returns path of the snapshot of the given setup commands.
+    """
+    if cachedir is None:
+        cachedir = DEFAULT_CACHEDIR
+    key = hashlib.sha1(as_string(setup).encode('utf-8')).hexdigest()[:16]
+    return os.path.join(os.path.expanduser(cachedir),
+                        'env_{0}.sh'.format(key))
+
+
+def capture_environment(setup=None, shell='bash'):
+    """
+    Runs setup commands in a new shell and returns the environment as a
+    dict.
+    """
+    fd, outfile = tempfile.mkstemp(prefix='hpcl_env_')
+    os.close(fd)
+    try:
+        script = (setup + '\n' if setup else '') + 'env -0 > "$_HPCL_ENV_OUT"\n'
+        env = dict(os.environ, _HPCL_ENV_OUT=outfile)
+        subprocess.check_call([shell, '-c', script], env=env,
+                              stdout=subprocess.DEVNULL)
+        with open(outfile, 'rb') as f:
+            data = f.read().decode('utf-8', 'replace')
+    finally:
+        os.remove(outfile)
+    result = {}
+    for item in data.split('\0'):
+        if '=' in item:
+            k, v = item.split('=', 1)
+            result[k] = v
+    return result
+
+
+def _excluded(name):
+    return name in EXCLUDED or any(name.startswith(p)
+                                   for p in EXCLUDED_PREFIXES)
+
+
+def create_snapshot(setup, filename, shell='bash'):
+    """
+    Runs the setup commands and stores the changes to the environment in
+    filename as export and unset statements.
+    """
+    setup = as_string(setup)
+    before = capture_environment(None, shell)
+    after = capture_environment(setup, shell)
+    lines = ['# environment snapshot of:']
+    lines += ['#   ' + l for l in setup.splitlines()]
+    for k in sorted(after):
+        if not _excluded(k) and before.get(k) != after[k]:
+            lines.append('export {0}={1}'.format(k, shlex.quote(after[k])))
+    for k in sorted(before):
+        if not _excluded(k) and k not in after:
+            lines.append('unset {0}'.format(k))
+    dirname = os.path.dirname(os.path.abspath(filename))
+    if not os.path.isdir(dirname):
+        os.makedirs(dirname)
+    # write atomically, several jobs may create the same snapshot
+    fd, tmpfile = tempfile.mkstemp(dir=dirname, prefix='.hpcl_env_')
+    with os.fdopen(fd, 'w') as f:
+        f.write('\n'.join(lines) + '\n')
+    os.chmod(tmpfile, 0o644)
+    os.rename(tmpfile, filename)
+    return filename
+
+
+def get_snapshot(setup, cachedir=None, refresh=False):
+    """
+    Returns path of the snapshot of the setup commands, creating it if it
+    does not exist.
+    """
+    filename = get_snapshot_file(setup, cachedir)
+    if refresh or not os.path.isfile(filename):
+        create_snapshot(setup, filename)
+    return filename
+
+
+def generate_prologue(setup, cachedir=None, resolve='submit',
+                      pythonexec='python'):
+    """
+    Returns script lines that source the environment snapshot.
+
+    With resolve='submit' the snapshot is created now, with resolve='job'
+    the script creates it if it does not exist.
+    """
+    setup = as_string(setup)
+    if resolve == 'submit':
+        snapshot = get_snapshot(setup, cachedir)
+        create = ''
+    elif resolve == 'job':
+        snapshot = get_snapshot_file(setup, cachedir)
+        create = CREATE_TEMPLATE.format(pythonexec=pythonexec,
+                                        setup=shlex.quote(setup))
+    else:
+        raise Exception('unknown envresolve: ' + str(resolve))
+    return PROLOGUE_TEMPLATE.format(snapshot=shlex.quote(snapshot),
+                                    create=create)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m hpclauncher envsnapshot',
+        description='Stores environment changes of setup commands')
+    parser.add_argument('-o', '--outfile', required=True,
+                        help='snapshot file')
+    parser.add_argument('setup', nargs=argparse.REMAINDER,
+                        help='setup commands')
+    args = parser.parse_args(argv)
+    setup = args.setup
+    if len(setup) > 0 and setup[0] == '--':
+        setup = setup[1:]
+    if len(setup) == 0:
+        parser.error('setup commands missing')
+    create_snapshot('\n'.join(setup), args.outfile)
+    return 0
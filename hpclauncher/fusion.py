@@ -0,0 +1,165 @@
+"""
+Fusion of linear dependency chains into a single allocation.
+
+A job can be fused with its parent if it depends on the parent with
+parentjobok, the parent has no other children, and the job fits in the
+resources of the parent (nproc, nnode, queue, account and rundir). Fused
+stages run one after another in one job script; a stage that exits with a
+non-zero status ends the job with that status, like afterok would. The wall
+time of the fused job is the sum of the stage wall times, and chains are
+split when the sum would exceed maxwalltime.
+
+The fused job keeps the name of the first stage, other stage names are
+aliases of it in the SubmittedRun. Jobs that depend on a stage depend on the
+fused job.
+
+Usage:
+
+    submit_jobs(jobs, fuse=True)
+
+Cluster keywords:
+
+- maxwalltime: longest allowed wall time 'HH:MM:SS' (default no limit)
+"""
+from __future__ import absolute_import
+from collections import OrderedDict
+
+from .clusterparameters import clusterparams
+from . import job
+
+STAGE_CHECK = """_hpcl_rc=$?
+if [ $_hpcl_rc -ne 0 ]; then
+    echo "stage {name} failed with exit status $_hpcl_rc" >&2
+    exit $_hpcl_rc
+fi
+"""
+
+
+class FusedJob(job.BatchJob):
+    """
+    A batch job that runs a chain of jobs in sequence.
+    """
+    def __init__(self, stages, **kwargs):
+        """
+        Arguments
+        ---------
+        stages : list of BatchJob objects
+                stages in execution order, the first one defines the
+                resources and parent jobs
+        kwargs  : keyword arguments
+                arguments that override those of the first stage
+        """
+        kw = dict(stages[0].kwargs)
+        kw.update(kwargs)
+        super(FusedJob, self).__init__(**kw)
+        self.stages = stages
+        self.set_walltime(sum(s.get_walltime() for s in stages))
+
+    @property
+    def members(self):
+        return self.stages[1:]
+
+    def generate_script_body(self):
+        """
+        Generates content of the batch script without the header.
+        """
+        content = ''
+        for i, s in enumerate(self.stages):
+            content += '# stage {0:d}: {1}\n(\n'.format(i + 1, s['jobname'])
+            content += s.generate_script_body()
+            content += ')\n'
+            if i < len(self.stages) - 1:
+                content += STAGE_CHECK.format(name=s['jobname'])
+        return content
+
+
+def _fits(parent, child):
+    """
+    Tests whether child can be run as the next stage of parent.
+    """
+    if type(parent) is not job.BatchJob or type(child) is not job.BatchJob:
+        return False
+    if job.get_parents(child, 'parentjobok') != [parent['jobname']] or \
+            child['parentjobany'] is not None:
+        return False
+    if parent.get_walltime() is None or child.get_walltime() is None:
+        return False
+    for k in ['queue', 'useraccountnb', 'rundir']:
+        if child[k] != parent[k]:
+            return False
+    return (int(child['nproc']) <= int(parent['nproc']) and
+            int(child['nnode'] or 1) <= int(parent['nnode'] or 1))
+
+
+def fuse_chains(job_list, maxwalltime=None, verbose=False):
+    """
+    Fuses linear chains of dependent jobs into single jobs.
+
+    Arguments
+    ---------
+    job_list : list of BatchJob objects
+    maxwalltime : TimeRequest, 'HH:MM:SS' or seconds
+            longest wall time of a fused job, read from cluster parameters
+            by default
+
+    Returns a new job list where fused jobs replace their stages.
+    """
+    if not isinstance(job_list, list):
+        job_list = [job_list]
+    if maxwalltime is None:
+        maxwalltime = clusterparams['maxwalltime']
+    limit = job.to_seconds(maxwalltime)
+    index = OrderedDict([(j['jobname'], i) for i, j in enumerate(job_list)])
+    children = OrderedDict([(n, []) for n in index])
+    for j in job_list:
+        for p in job.get_parents(j):
+            if p in children:
+                children[p].append(j['jobname'])
+    # next stage of each fusable link, parent must precede child
+    next_of = {}
+    for name, kids in children.items():
+        if len(kids) != 1 or index[kids[0]] < index[name]:
+            continue
+        if _fits(job_list[index[name]], job_list[index[kids[0]]]):
+            next_of[name] = kids[0]
+    heads = [n for n in next_of if n not in next_of.values()]
+
+    fused_of = {}
+    fused = OrderedDict()
+    for head in heads:
+        # split the chain in segments that fit in the wall time limit
+        segments = [[head]]
+        walltime = job_list[index[head]].get_walltime()
+        name = head
+        while name in next_of:
+            name = next_of[name]
+            w = job_list[index[name]].get_walltime()
+            if limit is not None and walltime + w > limit:
+                segments.append([name])
+                walltime = w
+            else:
+                segments[-1].append(name)
+                walltime += w
+        for seg in segments:
+            if len(seg) < 2:
+                continue
+            f = FusedJob([job_list[index[n]] for n in seg])
+            fused[seg[0]] = f
+            for n in seg:
+                fused_of[n] = seg[0]
+            if verbose:
+                print('fused {0} into {1}'.format(', '.join(seg), seg[0]))
+
+    # replace stages by fused jobs, rewire dependencies
+    new_list = []
+    for j in job_list:
+        name = j['jobname']
+        if name in fused_of:
+            if name in fused:
+                new_list.append(fused[name])
+            continue
+        job.rename_parents(j, fused_of)
+        new_list.append(j)
+    for f in fused.values():
+        job.rename_parents(f, fused_of)
+    return new_list
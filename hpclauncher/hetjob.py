@@ -0,0 +1,175 @@
+"""
+Co-scheduling of jobs as one Slurm heterogeneous job.
+
+Jobs with different resource shapes, e.g. a solver and its post-processing,
+are submitted as components of a single heterogeneous job. All components
+are allocated at once and the tasks of each component are run one component
+after another in the batch script, so post-processing starts as soon as the
+solver has finished, without queuing again.
+
+Each component gets its own #SBATCH block, separated by '#SBATCH hetjob'.
+Job name, log file, mail and dependency directives are taken from the
+first component; the group depends on the outside parents of all
+components. The wall time of the group is the sum of the component wall
+times. Tasks are launched in their component with hetmpiexec.
+
+Usage:
+
+    group = HeterogeneousJob([run_job, combine_job, extract_job])
+    submit_jobs(group)
+
+or set the same 'hetjob' keyword in the jobs, e.g. in a yaml file.
+
+Job keywords:
+
+- hetjob: name of the heterogeneous job the job belongs to
+
+Cluster keywords:
+
+- hetmpiexec: replaces mpiexec in components, default
+  'srun --het-group={hetgroup}'
+"""
+from __future__ import absolute_import
+from collections import OrderedDict
+
+from .clusterparameters import clusterparams
+from .instrumentation import metrics
+from . import job
+
+DEFAULT_HETMPIEXEC = 'srun --het-group={hetgroup}'
+
+# directives that apply to the whole heterogeneous job
+GLOBAL_OPTIONS = ['-J', '--job-name', '-o', '--output', '-e', '--error',
+                  '--mail-user', '--mail-type', '-d', '--dependency']
+
+
+def _is_global_directive(line):
+    """
+    Returns True if an #SBATCH line must only appear in the first component.
+    """
+    words = line.split()
+    if len(words) < 2 or words[0] != '#SBATCH':
+        return False
+    opt = words[1].split('=')[0]
+    return opt in GLOBAL_OPTIONS
+
+
+class HeterogeneousJob(job.BatchJob):
+    """
+    A batch job whose components are co-scheduled as a heterogeneous job.
+    """
+    def __init__(self, components, **kwargs):
+        """
+        Arguments
+        ---------
+        components : list of BatchJob objects
+                components in execution order
+        kwargs  : keyword arguments
+                arguments of the group, by default taken from the first
+                component
+        """
+        if len(components) < 2:
+            raise Exception('heterogeneous job needs at least two components')
+        first = components[0]
+        names = [c['jobname'] for c in components]
+        # dependencies to jobs outside the group
+        for tag in job.PARENT_TAGS:
+            parents = []
+            for c in components:
+                for p in job.get_parents(c, tag):
+                    if p not in names and p not in parents:
+                        parents.append(p)
+            if len(parents) == 1:
+                kwargs.setdefault(tag, parents[0])
+            elif len(parents) > 1:
+                kwargs.setdefault(tag, parents)
+        kwargs.setdefault('jobname', first['hetjob'] or first['jobname'])
+        kwargs.setdefault('queue', first['queue'])
+        kwargs.setdefault('nproc', sum(int(c['nproc']) for c in components))
+        if first['logfile'] is not None:
+            kwargs.setdefault('logfile', first['logfile'])
+        super(HeterogeneousJob, self).__init__(**kwargs)
+        hetmpiexec = clusterparams['hetmpiexec'] or DEFAULT_HETMPIEXEC
+        for i, c in enumerate(components):
+            c.kwargs['hetgroup'] = i
+            c.kwargs['mpiexec'] = hetmpiexec
+            # dependencies within the group are implied by execution order
+            for tag in job.PARENT_TAGS:
+                c.kwargs.pop(tag, None)
+        self.components = components
+        walltimes = [c.get_walltime() for c in components]
+        if None not in walltimes:
+            self.set_walltime(sum(walltimes))
+
+    @property
+    def members(self):
+        return self.components
+
+    @metrics.timed('generate_script')
+    def generate_script(self):
+        """
+        Generates content of the batch script.
+        """
+        if clusterparams['resourcemanager'] not in ['slurm', 'slurmrest']:
+            raise Exception('heterogeneous jobs are only supported on slurm')
+        time_kw = dict((k, self[k]) for k in ['hours', 'minutes', 'seconds']
+                       if self[k] is not None)
+        header = ''
+        for i, c in enumerate(self.components):
+            kw = dict(c.kwargs)
+            kw.update(time_kw)
+            if i == 0:
+                for k in ['jobname', 'logfile'] + job.PARENT_TAGS:
+                    kw.pop(k, None)
+                    if self[k] is not None:
+                        kw[k] = self[k]
+                header += clusterparams.generate_script_header(**kw)
+                continue
+            lines = clusterparams.generate_script_header(**kw).splitlines()
+            header += '#SBATCH hetjob\n'
+            for l in lines:
+                if l.startswith('#SBATCH') and not _is_global_directive(l):
+                    header += l + '\n'
+        return header + self.generate_script_body()
+
+    def generate_script_body(self):
+        """
+        Generates content of the batch script without the header.
+        """
+        content = ''
+        for i, c in enumerate(self.components):
+            content += '# het group {0:d}: {1}\n(\n'.format(i, c['jobname'])
+            content += c.generate_script_body()
+            content += ')\n'
+        return content
+
+
+def group_heterogeneous_jobs(job_list):
+    """
+    Replaces jobs that have the same 'hetjob' keyword by a HeterogeneousJob.
+
+    The group takes the place of its first component in the list. Jobs
+    that depend on a component are made to depend on the group.
+    """
+    groups = OrderedDict()
+    for j in job_list:
+        if j['hetjob'] is not None:
+            groups.setdefault(j['hetjob'], []).append(j)
+    if len(groups) == 0:
+        return job_list
+    group_of = {}
+    hetjobs = {}
+    for name, components in groups.items():
+        hetjobs[name] = HeterogeneousJob(components, jobname=name)
+        for c in components:
+            group_of[c['jobname']] = name
+    new_list = []
+    for j in job_list:
+        name = j['hetjob']
+        if name is not None:
+            if j is groups[name][0]:
+                new_list.append(hetjobs[name])
+            continue
+        job.rename_parents(j, group_of)
+        new_list.append(j)
+    return new_list
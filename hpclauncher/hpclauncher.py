@@ -17,8 +17,19 @@ from . import job
 from . import yaml_interface
 from . import launcher
 from .clusterparameters import clusterparams
-
-
+from .instrumentation import metrics
+from .coalesce import coalesce_jobs
+from .hetjob import HeterogeneousJob, group_heterogeneous_jobs
+from .fusion import fuse_chains
+from .barrier import insert_barriers
+from . import priority
+from . import render
+from . import partitions
+from . import limits
+from .submission import SubmittedRun
+
+
+@metrics.timed('parse_jobs_from_yaml')
 def parse_jobs_from_yaml(yamlfile):
     """
     Parses a yaml file and returns a list of job objects
@@ -40,30 +51,141 @@ def parse_jobs_from_yaml(yamlfile):
     return job_list
 
 
-def submit_jobs(job_list, testonly=False, verbose=False):
+def submit_jobs(job_list, testonly=False, verbose=False, coalesce=False,
+                fuse=False, critical_path=False, nice=None, renderdir=None,
+                workers=None, preflight=False):
     """
     Submits the given list of jobs.
+
+    Jobs with the same 'hetjob' keyword are submitted as one heterogeneous
+    job, see HeterogeneousJob. If coalesce=True, small independent jobs are
+    packed into single node bundles before submission, see coalesce_jobs.
+    If fuse=True, linear chains of dependent jobs are run in one allocation,
+    see fuse_chains.
+    Parents may be given as lists of jobs; jobs with more than maxfanin
+    parents wait for hierarchical barrier jobs, see insert_barriers.
+    If critical_path=True, jobs are submitted in order of their longest
+    remaining dependency path. If nice is given, jobs off the critical path
+    get nice values up to nice, see priority module.
+    If the queue of a job is a list of partitions, the partition that is
+    expected to start the job first is selected, see partitions module.
+    If preflight=True, all jobs are validated against cached partition and
+    QOS limits before anything is submitted, see limits module.
+
+    Returns a SubmittedRun object that contains job ids and dependencies of
+    the submitted jobs.
+
+    If renderdir is given, nothing is submitted. The scripts are rendered
+    to renderdir with workers processes and the path of the manifest file
+    is returned, see render_jobs.
+    """
+    if renderdir is not None:
+        return render_jobs(job_list, renderdir, workers=workers,
+                           verbose=verbose, coalesce=coalesce, fuse=fuse,
+                           critical_path=critical_path, nice=nice,
+                           preflight=preflight)
+    job_list = _prepare_jobs(job_list, verbose, coalesce, fuse,
+                             critical_path, nice, preflight)
+    return _launch_all(job_list, testonly, verbose)
+
+
+def render_jobs(job_list, outdir, workers=None, batchsize=None,
+                verbose=False, coalesce=False, fuse=False,
+                critical_path=False, nice=None, preflight=False):
+    """
+    Renders the scripts of the given jobs to outdir without submitting.
+
+    Jobs are transformed as in submit_jobs. A manifest with job names,
+    script hashes, resources and dependencies is written in outdir, and
+    its path is returned. Scripts are rendered with workers processes (by
+    default the number of cpus), each process writing batchsize scripts
+    at a time. The jobs can be submitted later with submit_manifest.
+    """
+    job_list = _prepare_jobs(job_list, verbose, coalesce, fuse,
+                             critical_path, nice, preflight)
+    return render.render_scripts(job_list, outdir, workers=workers,
+                                 batchsize=batchsize, verbose=verbose)
+
+
+def submit_manifest(manifestfile, testonly=False, verbose=False):
+    """
+    Submits jobs rendered with render_jobs.
+
+    Returns a SubmittedRun object.
+    """
+    job_list = render.read_manifest(manifestfile)
+    return _launch_all(job_list, testonly, verbose)
+
+
+def _prepare_jobs(job_list, verbose=False, coalesce=False, fuse=False,
+                  critical_path=False, nice=None, preflight=False):
+    """
+    Selects partitions, groups, fuses, coalesces, adds barriers, orders and
+    validates jobs for submission.
     """
     if not isinstance(job_list, list):
         job_list = [job_list]
-    # keep track of launched job names and ids
-    parent_tags = ['parentjobOk', 'parentjobAny']
-    parent_job_ids = {}
-    # launch jobs
+    # jobs with a list of queues, before jobs are combined
+    partitions.select_partitions(job_list, verbose=verbose)
+    job_list = group_heterogeneous_jobs(job_list)
+    if fuse:
+        job_list = fuse_chains(job_list, verbose=verbose)
+    if coalesce:
+        job_list = coalesce_jobs(job_list, verbose=verbose)
+    job_list = insert_barriers(job_list, verbose=verbose)
+    if critical_path or nice is not None:
+        lengths = priority.get_path_lengths(job_list)
+        if critical_path:
+            job_list = priority.order_by_critical_path(job_list, lengths)
+        if nice is not None:
+            priority.set_nice_values(job_list, nice, lengths)
+    if preflight:
+        limits.check_jobs(job_list)
+    return job_list
+
+
+def _launch_all(job_list, testonly=False, verbose=False):
+    """
+    Launches jobs in order and returns a SubmittedRun.
+    """
+    # keep track of launched job names, ids and dependencies
+    run = SubmittedRun(clusterparams['resourcemanager'])
+    # launch jobs in waves of independent jobs
+    wave = []
+    names = set()
+    for j in job_list:
+        if any(p in names for p in job.get_parents(j)):
+            _launch_wave(wave, run, testonly, verbose)
+            wave = []
+            names = set()
+        wave.append(j)
+        names.add(j['jobname'])
+    _launch_wave(wave, run, testonly, verbose)
+    return run
+
+
+def _launch_wave(job_list, run, testonly=False, verbose=False):
+    """
+    Launches jobs that do not depend on each other and adds them to run.
+    """
+    parents = []
     for j in job_list:
+        parents.append([])
         # substitute parentjob with actual job id
-        for tag in parent_tags:
+        for tag in job.PARENT_TAGS:
             # parent jobs can only be defined in BatchJob
-            parent_name = j.kwargs.get(tag)
-            if parent_name is not None:
-                if parent_name in parent_job_ids:
-                    j.kwargs[tag] = parent_job_ids[parent_name]
-                else:
-                    # raise Exception('unknown parentjob: ' + parentName)
-                    # assume that user has given a valid parent job ID
-                    pass
-        id = launcher.launch_job(j, testonly=testonly, verbose=verbose)
-        parent_job_ids[j['jobname']] = id
+            names = job.get_parents(j, tag)
+            if len(names) == 0:
+                continue
+            parents[-1].extend(names)
+            # names that are not in run are assumed to be valid job ids
+            ids = [run[n] if n in run else n for n in names]
+            j.kwargs[tag] = job.format_dependency(ids, run.managertype)
+    ids = launcher.launch_jobs(job_list, testonly=testonly, verbose=verbose)
+    for j, id, p in zip(job_list, ids, parents):
+        run.add_job(j['jobname'], id, p, j.get_resources())
+        for m in getattr(j, 'members', []):
+            run.add_alias(m['jobname'], j['jobname'])
 
 
 def _parse_job_from_dict(jobkey, d):
@@ -89,7 +211,9 @@ def _parse_job_from_dict(jobkey, d):
     for tkey in tasks:
         task_kwargs = tasks[tkey]
         # create task
-        command = task_kwargs.pop('command')
+        command = task_kwargs.pop('command', None)
+        # parse taskname from the key
+        task_kwargs.setdefault('taskname', '_'.join(tkey.split('_')[1:]))
         j.append_new_task(command, **task_kwargs)
     return j
 
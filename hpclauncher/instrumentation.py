@@ -0,0 +1,223 @@
+"""
+Timing instrumentation for the phases of the launcher pipeline.
+
+Each phase (yaml parsing, script rendering, file writes, submission calls)
+records its latency in a histogram. Metrics can be exported as JSON or in
+Prometheus text format, and user callbacks can be attached to receive each
+individual measurement.
+
+Usage:
+
+    from hpclauncher import metrics
+    metrics.add_hook(lambda phase, duration: print(phase, duration))
+    submit_jobs(parse_jobs_from_yaml('jobs.yaml'))
+    metrics.write_json('metrics.json')
+    metrics.write_prometheus('/var/lib/node_exporter/hpclauncher.prom')
+"""
+from __future__ import absolute_import
+import os
+import json
+import time
+import functools
+from collections import OrderedDict
+
+# upper bounds of histogram buckets in seconds
+DEFAULT_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5,
+                   1.0, 5.0, 10.0, 30.0, 60.0)
+
+PROMETHEUS_METRIC = 'hpclauncher_phase_duration_seconds'
+
+_clock = getattr(time, 'perf_counter', time.time)
+
+
+class PhaseHistogram(object):
+    """
+    Latency histogram of a single phase.
+    """
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.bucket_counts = [0]*(len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+
+    def observe(self, duration):
+        """
+        Adds a new measurement to the histogram.
+        """
+        i = 0
+        while i < len(self.buckets) and duration > self.buckets[i]:
+            i += 1
+        self.bucket_counts[i] += 1
+        self.count += 1
+        self.sum += duration
+        if self.min is None or duration < self.min:
+            self.min = duration
+        if self.max is None or duration > self.max:
+            self.max = duration
+
+    def cumulative_counts(self):
+        """
+        Returns cumulative bucket counts, the last entry being +Inf.
+        """
+        counts = []
+        total = 0
+        for c in self.bucket_counts:
+            total += c
+            counts.append(total)
+        return counts
+
+    def as_dict(self):
+        mean = self.sum/self.count if self.count > 0 else None
+        return OrderedDict([
+            ('count', self.count),
+            ('sum', self.sum),
+            ('mean', mean),
+            ('min', self.min),
+            ('max', self.max),
+            ('buckets', [[b, c] for b, c in
+                         zip(list(self.buckets) + ['+Inf'],
+                             self.cumulative_counts())]),
+        ])
+
+
+class PhaseTimer(object):
+    """
+    Measures the duration of a phase.
+
+    Can be used as a context manager or as a function decorator.
+    """
+    def __init__(self, registry, phase):
+        self.registry = registry
+        self.phase = phase
+        self._t0 = []
+
+    def __enter__(self):
+        self._t0.append(_clock())
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        duration = _clock() - self._t0.pop()
+        self.registry.observe(self.phase, duration)
+        return False
+
+    def __call__(self, func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not self.registry.enabled:
+                return func(*args, **kwargs)
+            with self:
+                return func(*args, **kwargs)
+        return wrapper
+
+
+class PhaseMetrics(object):
+    """
+    Registry of phase histograms and user callbacks.
+    """
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.enabled = True
+        self.histograms = OrderedDict()
+        self.hooks = []
+
+    def timed(self, phase):
+        """
+        Returns a timer for the given phase.
+
+        Usage:
+
+            with metrics.timed('myphase'):
+                do_something()
+
+            @metrics.timed('myphase')
+            def do_something():
+                ...
+        """
+        return PhaseTimer(self, phase)
+
+    def observe(self, phase, duration):
+        """
+        Records a measurement and calls all registered hooks.
+        """
+        if not self.enabled:
+            return
+        h = self.histograms.get(phase)
+        if h is None:
+            h = PhaseHistogram(self.buckets)
+            self.histograms[phase] = h
+        h.observe(duration)
+        for hook in self.hooks:
+            hook(phase, duration)
+
+    def add_hook(self, func):
+        """
+        Registers a callback func(phase, duration) called for every
+        measurement.
+        """
+        self.hooks.append(func)
+
+    def remove_hook(self, func):
+        self.hooks.remove(func)
+
+    def reset(self):
+        """
+        Removes all recorded measurements. Hooks are kept.
+        """
+        self.histograms = OrderedDict()
+
+    def as_dict(self):
+        return OrderedDict([(p, h.as_dict())
+                            for p, h in self.histograms.items()])
+
+    def to_json(self, **kwargs):
+        return json.dumps(self.as_dict(), **kwargs)
+
+    def to_prometheus(self, metric=PROMETHEUS_METRIC):
+        """
+        Returns metrics in Prometheus text exposition format.
+        """
+        lines = [
+            '# HELP {0} Duration of hpclauncher pipeline phases.'.format(metric),
+            '# TYPE {0} histogram'.format(metric),
+        ]
+        for phase, h in self.histograms.items():
+            bounds = ['{0:g}'.format(b) for b in h.buckets] + ['+Inf']
+            for le, c in zip(bounds, h.cumulative_counts()):
+                lines.append('{0}_bucket{{phase="{1}",le="{2}"}} {3}'.format(
+                    metric, phase, le, c))
+            lines.append('{0}_sum{{phase="{1}"}} {2!r}'.format(
+                metric, phase, h.sum))
+            lines.append('{0}_count{{phase="{1}"}} {2}'.format(
+                metric, phase, h.count))
+        return '\n'.join(lines) + '\n'
+
+    def write_json(self, filename):
+        """
+        Stores metrics in a JSON file.
+        """
+        _write_atomic(filename, self.to_json(indent=2) + '\n')
+
+    def write_prometheus(self, filename):
+        """
+        Stores metrics in a Prometheus text file.
+
+        The file is replaced atomically so that it can be read by the node
+        exporter textfile collector at any time.
+        """
+        _write_atomic(filename, self.to_prometheus())
+
+
+def _write_atomic(filename, content):
+    """
+    Writes content to a temporary file and renames it to filename.
+    """
+    tmpfile = '{0}.tmp.{1}'.format(filename, os.getpid())
+    with open(tmpfile, 'w') as f:
+        f.write(content)
+    os.rename(tmpfile, filename)
+
+
+# create global metrics registry
+metrics = PhaseMetrics()
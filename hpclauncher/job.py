@@ -7,10 +7,29 @@ Tuomas Karna 2015-09-02
 """
 from __future__ import absolute_import
 from .clusterparameters import clusterparams
+from .instrumentation import metrics
 from . import task
+from . import logstaging
+from . import staging
+from . import accounting
+from . import pinning
+from . import sentinel
+from . import envsnapshot
+from . import pyworker
+from . import distribute
 
 import os
 from string import Template
+from collections import OrderedDict
+
+# job keywords that define dependencies to other jobs
+PARENT_TAGS = ['parentjobok', 'parentjobany']
+
+# separator of job ids in a dependency, ':' if not listed
+DEPENDENCY_SEPARATORS = {'sge': ','}
+
+# job keywords that describe the requested resources
+RESOURCE_KEYS = ['queue', 'nproc', 'nnode', 'useraccountnb', 'nice']
 
 
 def create_directory(path):
@@ -27,6 +46,85 @@ def create_directory(path):
     return path
 
 
+def to_seconds(t):
+    """
+    Converts a TimeRequest, 'HH:MM:SS' string or number of seconds to
+    seconds.
+    """
+    if t is None or isinstance(t, (int, float)):
+        return t
+    if isinstance(t, str):
+        h, m, s = [int(w) for w in t.split(':')]
+        return (h*60 + m)*60 + s
+    return ((t.days*24 + t.hours)*60 + t.minutes)*60 + t.seconds
+
+
+def get_parents(j, tag=None):
+    """
+    Returns the list of parent jobs of a job for the given dependency tag,
+    or for all tags.
+
+    Parents may be given as one job name (or id) or as a list.
+    """
+    tags = PARENT_TAGS if tag is None else [tag]
+    parents = []
+    for t in tags:
+        p = j[t]
+        if isinstance(p, (list, tuple)):
+            parents.extend(p)
+        elif p is not None:
+            parents.append(p)
+    return parents
+
+
+def rename_parents(j, names):
+    """
+    Replaces parents of a job by names[parent], e.g. by the job that a
+    parent was merged into. Duplicate parents are removed.
+    """
+    for tag in PARENT_TAGS:
+        p = j[tag]
+        if isinstance(p, (list, tuple)):
+            new = []
+            for n in p:
+                n = names.get(n, n)
+                if n not in new:
+                    new.append(n)
+            j.kwargs[tag] = new
+        elif p is not None:
+            j.kwargs[tag] = names.get(p, p)
+
+
+def format_dependency(jobids, managertype=None):
+    """
+    Joins job ids to the value of a dependency header line, e.g. '1:2'.
+    """
+    if managertype is None:
+        managertype = clusterparams['resourcemanager']
+    sep = DEPENDENCY_SEPARATORS.get(managertype, ':')
+    return sep.join(str(i) for i in jobids)
+
+
+def generate_exit_trap(hooks):
+    """
+    Returns script lines that call given shell functions when the script
+    exits.
+
+    The functions are called also when the job is terminated, e.g. when it
+    exceeds its time limit. Exit status of the script is stored in
+    $_hpcl_status.
+    """
+    content = '_hpcl_on_exit() {\n'
+    content += '    _hpcl_status=$?\n'
+    content += '    trap - EXIT TERM INT\n'
+    for h in hooks:
+        content += '    {0}\n'.format(h)
+    content += '}\n'
+    content += 'trap _hpcl_on_exit EXIT\n'
+    content += "trap 'exit 143' TERM INT\n"
+    return content
+
+
 class BatchJob(object):
     """
     An object that represents a batch job, that can contain multiple tasks.
@@ -49,6 +147,10 @@ class BatchJob(object):
         kw = {}
         kw.update(clusterparams.get_args())
         kw.update(kwargs)
+        # dependency tags are case insensitive, e.g. parentJobOk in yaml files
+        for k in list(kw.keys()):
+            if k.lower() in PARENT_TAGS:
+                kw[k.lower()] = kw.pop(k)
         for k in self.necessary_parameters:
             if kw.get(k) is None:
                 raise Exception('missing job parameter: ' + k)
@@ -79,25 +181,25 @@ class BatchJob(object):
         t = task.BatchTask(*args, **kwargs)
         self.append_task(t)
 
-    def generate_script(self):
+    def get_task_args(self):
         """
-        Generates content of the batch script.
+        Returns a list of keyword dictionaries, one for each task.
+
+        Task keywords are merged with cluster and job keywords. Task log files
+        are prepended with logfiledir.
         """
-        header = clusterparams.generate_script_header(**self.kwargs)
         all_args = {}
         all_args.update(clusterparams.get_args())
         all_args.update(self.kwargs)
         logdir = all_args.get('logfiledir')
         all_args.pop('logfile', None)
-        # prepend logfile with logfiledir
-        if logdir is not None:
-            # ensure logfiledir exists
-            create_directory(logdir)
-        footer = ''
-        for t in self.tasks:
+        task_args = []
+        for i, t in enumerate(self.tasks):
             # all possible kwargs
             d = dict(all_args)
             d.update(t.kwargs)
+            if d.get('taskname') is None:
+                d['taskname'] = 'task{:d}'.format(i + 1)
             # use 'nproc' by default if 'nthread' is not defined
             if 'nproc' in d:
                 d.setdefault('nthread', d['nproc'])
@@ -105,13 +207,195 @@ class BatchJob(object):
                 # update task logfile
                 if d['logfile'] is not None and logdir+'/' not in d['logfile']:
                     d['logfile'] = os.path.join(logdir, d['logfile'])
+            task_args.append(d)
+        return task_args
+
+    def get_staged_files(self):
+        """
+        Returns lists of stage_in and stage_out files of all tasks.
+        """
+        stage_in = staging.as_list(self['stage_in'])
+        stage_out = staging.as_list(self['stage_out'])
+        for t in self.tasks:
+            stage_in += staging.as_list(t['stage_in'])
+            stage_out += staging.as_list(t['stage_out'])
+        # remove duplicates, keep order
+        stage_in = [f for i, f in enumerate(stage_in)
+                    if f not in stage_in[:i]]
+        stage_out = [f for i, f in enumerate(stage_out)
+                     if f not in stage_out[:i]]
+        return stage_in, stage_out
+
+    def _allocate_cores(self, task_args):
+        """
+        Assigns cores of the node to threaded tasks.
+
+        Sets {cpulist} and {numanodes} tags in task_args.
+        """
+        ncoresnode = self['ncoresnode']
+        if ncoresnode is None:
+            raise Exception('missing cluster parameter: ncoresnode')
+        ncoressocket = self['ncoressocket'] or ncoresnode
+        threaded = [(t, d) for t, d in zip(self.tasks, task_args)
+                    if t.threaded]
+        cores = pinning.allocate_cores([d['nthread'] for t, d in threaded],
+                                       ncoresnode, ncoressocket)
+        for (t, d), c in zip(threaded, cores):
+            d['nthread'] = len(c)
+            d['cpulist'] = pinning.format_cpulist(c)
+            d['numanodes'] = pinning.format_cpulist(
+                pinning.get_numa_nodes(c, ncoressocket))
+
+    def get_walltime(self):
+        """
+        Returns requested wall time in seconds, or None if not set.
+        """
+        if self['hours'] is None:
+            return None
+        return (int(self['hours'])*3600 + int(self['minutes'] or 0)*60 +
+                int(self['seconds'] or 0))
+
+    def get_resources(self):
+        """
+        Returns an OrderedDict of the requested resources.
+
+        The wall time is given as 'HH:MM:SS' string, or None if not set.
+        """
+        resources = OrderedDict((k, self[k]) for k in RESOURCE_KEYS
+                                if self[k] is not None)
+        walltime = None
+        if self['hours'] is not None:
+            walltime = '{0}:{1}:{2}'.format(self['hours'],
+                                            self['minutes'] or '00',
+                                            self['seconds'] or '00')
+        resources['walltime'] = walltime
+        return resources
+
+    def set_walltime(self, seconds):
+        """
+        Sets requested wall time in seconds.
+        """
+        minutes, seconds = divmod(int(seconds), 60)
+        hours, minutes = divmod(minutes, 60)
+        self.kwargs['hours'] = '{0:02d}'.format(hours)
+        self.kwargs['minutes'] = '{0:02d}'.format(minutes)
+        self.kwargs['seconds'] = '{0:02d}'.format(seconds)
+
+    @metrics.timed('generate_script')
+    def generate_script(self):
+        """
+        Generates content of the batch script.
+        """
+        header = clusterparams.generate_script_header(**self.kwargs)
+        return header + self.generate_script_body()
+
+    def generate_script_body(self):
+        """
+        Generates content of the batch script without the header.
+        """
+        logdir = self['logfiledir']
+        # prepend logfile with logfiledir
+        if logdir is not None:
+            # ensure logfiledir exists
+            create_directory(logdir)
+        local_logs = self['logmode'] == 'local'
+        log_index = []
+        stage_in, stage_out = self.get_staged_files()
+        staged = stage_in + stage_out
+        task_args = self.get_task_args()
+        pin_method = self['pinning']
+        dist_method = distribute.get_method(self['distribute'])
+        if pin_method and dist_method:
+            raise Exception('pinning can not be combined with distribute')
+        if pin_method:
+            self._allocate_cores(task_args)
+        distributed = False
+        footer = ''
+        pytasks = []
+        for t, d in zip(self.tasks, task_args):
+            if local_logs and d['logfile'] is not None:
+                # redirect to node-local storage
+                logfile = d['logfile'].format(**d).format(**d)
+                log_index.append((d['taskname'], logfile))
+                d['logfile'] = logstaging.get_local_logfile(logfile)
+            if len(staged) > 0:
+                # point tags to node-local copies
+                staging.rewrite_tags(d, staged)
 
+            logfile = d['logfile']
+            if logfile is not None:
+                logfile = logfile.format(**d).format(**d)
+            if t.function is not None:
+                # run by the python worker pool, no wrappers
+                cmd = pyworker.get_task_command(len(pytasks), logfile)
+                pytasks.append(pyworker.format_arguments(t, d))
+                if self['sentineldir'] is not None:
+                    cmd = sentinel.wrap_command(cmd, d['taskname'])
+                footer += t.get_command(cmd, logfile) + '\n'
+                continue
             # substitute to command, twice to allow tags in tags
-            cmd = t.get_command() + '\n'
-            cmd = cmd.format(**d)
-            cmd = cmd.format(**d)
-            footer += cmd
-        content = header + footer
+            cmd = t.cmd.format(**d).format(**d)
+            if d.get('accounting'):
+                cmd = accounting.wrap_command(
+                    cmd, d['taskname'],
+                    accounting.get_summary_file(self['jobname'], logdir),
+                    jobname=self['jobname'],
+                    pythonexec=d.get('pythonexec') or 'python')
+            if pin_method and t.threaded:
+                cmd = pinning.wrap_command(cmd, d['cpulist'], d['numanodes'],
+                                           d['nthread'], method=pin_method)
+            if dist_method and distribute.is_distributable(t):
+                # slots of explicitly given threads only, nthread
+                # defaults to nproc of the whole job
+                nslots = t.kwargs.get('nthread') or self['nthread'] or 1
+                cmd = distribute.wrap_command(cmd, nslots)
+                distributed = True
+            if self['sentineldir'] is not None:
+                cmd = sentinel.wrap_command(cmd, d['taskname'])
+            footer += t.get_command(cmd, logfile) + '\n'
+        prologue = ''
+        exit_hooks = []
+        if self['envsetup'] is not None:
+            # environment is loaded first, other prologues may need it
+            prologue += envsnapshot.generate_prologue(
+                self['envsetup'], cachedir=self['envcache'],
+                resolve=self['envresolve'] or 'submit',
+                pythonexec=self['pythonexec'] or 'python')
+        if len(staged) > 0:
+            prologue += staging.generate_prologue(
+                self['jobname'], stage_in, stage_out,
+                managertype=clusterparams['resourcemanager'],
+                nnode=self['nnode'], localscratch=self['localscratch'])
+            exit_hooks.append(staging.EXIT_HOOK)
+        if local_logs:
+            compress = self['logcompress'] is None or bool(self['logcompress'])
+            prologue += logstaging.generate_prologue(
+                self['jobname'], log_index, logdir=logdir, compress=compress,
+                localscratch=self['localscratch'])
+            exit_hooks.append(logstaging.EXIT_HOOK)
+        if self['sentineldir'] is not None:
+            # job sentinel is written last, when outputs are in place
+            prologue += sentinel.generate_prologue(self['jobname'],
+                                                   self['sentineldir'])
+            exit_hooks.append(sentinel.EXIT_HOOK)
+        if distributed:
+            slots = distribute.get_slots_per_node(
+                self['slotspernode'], self['ncoresnode'], self['nproc'],
+                self['nnode'])
+            prologue += distribute.generate_prologue(
+                dist_method, slots, hostfile=self['hostfile'],
+                localscratch=self['localscratch'])
+            exit_hooks.insert(0, distribute.EXIT_HOOK)
+        if len(pytasks) > 0:
+            prologue += pyworker.generate_prologue(
+                pytasks, nworkers=self['pyworkers'],
+                pythonexec=self['pythonexec'] or 'python',
+                localscratch=self['localscratch'])
+            # workers must be stopped before logs are collected
+            exit_hooks.insert(0, pyworker.EXIT_HOOK)
+        if len(exit_hooks) > 0:
+            prologue = generate_exit_trap(exit_hooks) + prologue
+        content = prologue + footer
         content += 'wait\n'
         return content
 
@@ -7,6 +7,9 @@ from __future__ import absolute_import
 import os
 import subprocess
 from .clusterparameters import clusterparams
+from .instrumentation import metrics
+from . import sentinel
+from . import slurmrest
 
 
 def launch_job(job, testonly=False, verbose=False):
@@ -21,17 +24,68 @@ def launch_job(job, testonly=False, verbose=False):
     logfile = job['logfile']
     if rundir is not None and not os.path.isdir(rundir):
         raise IOError('rundir does not exist: ' + rundir)
+    sentineldir = job['sentineldir']
+    if sentineldir is not None and not testonly:
+        # remove sentinels of previous runs
+        sentinel.clear(name, os.path.join(rundir or '', sentineldir))
+    if managertype == 'slurmrest':
+        return _launch_jobs_rest([name], [content], [rundir],
+                                 testonly, verbose)[0]
+    # without sentinels bash jobs are run in the foreground
+    detach = sentineldir is not None
     return _launch_job(name, content, submitexec, managertype, rundir,
-                       logfile, testonly, verbose)
+                       logfile, testonly, verbose, detach=detach)
+
+
+def launch_jobs(jobs, testonly=False, verbose=False):
+    """
+    Launches given independent jobs and returns list of jobIDs.
+
+    With resourcemanager 'slurmrest' the jobs are submitted concurrently.
+    """
+    if clusterparams['resourcemanager'] != 'slurmrest' or len(jobs) < 2:
+        return [launch_job(j, testonly=testonly, verbose=verbose)
+                for j in jobs]
+    names, contents, rundirs = [], [], []
+    for j in jobs:
+        rundir = j['rundir']
+        if rundir is not None and not os.path.isdir(rundir):
+            raise IOError('rundir does not exist: ' + rundir)
+        names.append(j['jobname'])
+        contents.append(j.generate_script())
+        rundirs.append(rundir)
+    return _launch_jobs_rest(names, contents, rundirs, testonly, verbose)
+
+
+def _launch_jobs_rest(names, contents, rundirs, testonly=False,
+                      verbose=False):
+    """
+    Submits batch scripts to slurmrestd. Returns list of jobIDs.
+    """
+    if testonly or verbose:
+        for content in contents:
+            print(content)
+    if testonly:
+        return [0]*len(contents)
+    client = slurmrest.get_client(clusterparams)
+    if verbose:
+        print('submitting {0:d} jobs to {1}'.format(len(names), client.url))
+    with metrics.timed('submit_call'):
+        jobids = client.submit_many(contents, rundirs)
+    for name, jobid in zip(names, jobids):
+        print('Parsed Job ID: {:} ({:})'.format(jobid, name))
+    return jobids
 
 
 def _launch_job(name, content, submitexec, managertype, rundir=None,
                 logfile=None,
-                testonly=False, verbose=False):
+                testonly=False, verbose=False, detach=False):
     """
     Writes given batch script content to a temp file and launches the run.
     Returns jobID of the started job.
     If directory given, starts job in that directory.
+    If detach=True, bash jobs are started in the background and the process
+    id is returned as the job id.
     """
     if testonly:
         # print to stdout and return
@@ -53,12 +107,20 @@ def _launch_job(name, content, submitexec, managertype, rundir=None,
         call = [submitexec, subfile]
         if verbose:
             print('excecuting {:}'.format(' '.join(call)))
-        if managertype == 'bash' and logfile is not None:
-            with open(logfile, 'w') as logstream:
-                output = subprocess.check_call(call, stdout=logstream,
-                                               stderr=subprocess.STDOUT)
-        else:
-            output = subprocess.check_output(call).decode('ascii')
+        with metrics.timed('submit_call'):
+            if managertype == 'bash' and detach:
+                logstream = open(logfile or os.devnull, 'w')
+                proc = subprocess.Popen(call, stdout=logstream,
+                                        stderr=subprocess.STDOUT,
+                                        start_new_session=True)
+                logstream.close()
+                output = 'Started process {0:d}'.format(proc.pid)
+            elif managertype == 'bash' and logfile is not None:
+                with open(logfile, 'w') as logstream:
+                    output = subprocess.check_call(call, stdout=logstream,
+                                                   stderr=subprocess.STDOUT)
+            else:
+                output = subprocess.check_output(call).decode('ascii')
     except Exception as e:
         print(e)
         raise e
@@ -74,6 +136,7 @@ def _launch_job(name, content, submitexec, managertype, rundir=None,
     return jobid
 
 
+@metrics.timed('write_script_file')
 def _write_script_file(subfile, content, verbose=False):
     """
     Stores content to a submission script file.
@@ -94,6 +157,8 @@ def _parse_job_id(output, managertype):
         return _parse_job_id_slurm(output)
     if managertype == 'sge':
         return _parse_job_id_sge(output)
+    if managertype == 'bash' and str(output).startswith('Started process '):
+        return int(output.split()[-1])
     # not implemented yet
     return 0
 
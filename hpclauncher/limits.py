@@ -0,0 +1,290 @@
+"""
+Preflight validation of jobs against partition and QOS limits.
+
+Partition limits ('scontrol -o show partition') and QOS limits ('sacctmgr
+show qos') are fetched once and cached on disk for limitsttl seconds. All
+planned jobs are validated in one pass before anything is submitted, and
+all violations are reported together:
+
+- unknown or inactive partition
+- wall time above the partition MaxTime or the QOS MaxWall
+- nodes outside partition MinNodes/MaxNodes, above the partition size or
+  the QOS MaxTRES node limit
+- processes above the partition CPUs or the QOS MaxTRES cpu limit
+- more jobs in a QOS than its MaxSubmitPU
+
+The QOS of a job is the qos keyword, or the partition QoS, or 'normal'.
+
+Usage:
+
+    submit_jobs(jobs, preflight=True)
+
+Cluster keywords:
+
+- limitscache: cache directory (default ~/.hpclauncher/limits)
+- limitsttl: cache lifetime in seconds (default 3600)
+- scontrolexec, sacctmgrexec: executables (default next to submitexec)
+"""
+from __future__ import absolute_import
+import os
+import json
+import time
+import hashlib
+import tempfile
+import subprocess
+from collections import OrderedDict
+
+from .clusterparameters import clusterparams
+from .instrumentation import metrics
+from .submission import _find_exec
+from .hetjob import HeterogeneousJob
+
+DEFAULT_CACHEDIR = '~/.hpclauncher/limits'
+DEFAULT_TTL = 3600
+
+QOS_FIELDS = ['Name', 'MaxWall', 'MaxTRES', 'MaxSubmitPU']
+
+UNLIMITED = ['', 'UNLIMITED', 'INFINITE', 'NONE', 'N/A']
+
+
+def parse_limit_time(s):
+    """
+    Parses a Slurm time limit to seconds, None if unlimited.
+
+    Accepted formats: MM, MM:SS, HH:MM:SS, D-HH, D-HH:MM, D-HH:MM:SS
+    """
+    if s is None or s.upper() in UNLIMITED:
+        return None
+    days = 0
+    if '-' in s:
+        d, s = s.split('-', 1)
+        days = int(d)
+        parts = [int(p) for p in s.split(':')]
+        parts += [0]*(3 - len(parts))
+    else:
+        parts = [int(p) for p in s.split(':')]
+        if len(parts) == 1:
+            parts = [0, parts[0], 0]
+        elif len(parts) == 2:
+            parts = [0] + parts
+    h, m, sec = parts
+    return ((days*24 + h)*60 + m)*60 + sec
+
+
+def parse_limit_int(s):
+    """
+    Parses a Slurm count limit, None if unlimited.
+    """
+    if s is None or s.upper() in UNLIMITED:
+        return None
+    return int(s)
+
+
+def parse_tres(s):
+    """
+    Parses a TRES string, e.g. 'cpu=64,node=4', to a dict.
+    """
+    tres = {}
+    for item in (s or '').split(','):
+        if '=' in item:
+            k, v = item.split('=', 1)
+            tres[k] = parse_limit_int(v)
+    return tres
+
+
+def parse_partitions(output):
+    """
+    Parses 'scontrol -o show partition' output.
+
+    Returns OrderedDict of partition name: dict of limits.
+    """
+    partitions = OrderedDict()
+    for line in output.splitlines():
+        fields = dict(w.split('=', 1) for w in line.split() if '=' in w)
+        if 'PartitionName' not in fields:
+            continue
+        partitions[fields['PartitionName']] = OrderedDict([
+            ('state', fields.get('State', 'UP')),
+            ('maxtime', parse_limit_time(fields.get('MaxTime'))),
+            ('minnodes', parse_limit_int(fields.get('MinNodes'))),
+            ('maxnodes', parse_limit_int(fields.get('MaxNodes'))),
+            ('totalnodes', parse_limit_int(fields.get('TotalNodes'))),
+            ('totalcpus', parse_limit_int(fields.get('TotalCPUs'))),
+            ('qos', fields.get('QoS', 'N/A')),
+        ])
+    return partitions
+
+
+def parse_qos(output):
+    """
+    Parses 'sacctmgr -n -P show qos format=Name,MaxWall,MaxTRES,MaxSubmitPU'
+    output.
+
+    Returns OrderedDict of QOS name: dict of limits.
+    """
+    qos = OrderedDict()
+    for line in output.splitlines():
+        words = line.split('|')
+        if len(words) < len(QOS_FIELDS) or len(words[0]) == 0:
+            continue
+        tres = parse_tres(words[2])
+        qos[words[0]] = OrderedDict([
+            ('maxwall', parse_limit_time(words[1])),
+            ('maxnodes', tres.get('node')),
+            ('maxcpus', tres.get('cpu')),
+            ('maxsubmit', parse_limit_int(words[3])),
+        ])
+    return qos
+
+
+def fetch_limits():
+    """
+    Queries partition and QOS limits from Slurm.
+
+    QOS limits are omitted if sacctmgr is not available.
+    """
+    scontrol = clusterparams['scontrolexec'] or _find_exec('scontrol')
+    with metrics.timed('limits_call'):
+        output = subprocess.check_output([scontrol, '-o', 'show',
+                                          'partition'])
+    limits = OrderedDict([
+        ('partitions', parse_partitions(output.decode('utf-8'))),
+        ('qos', OrderedDict()),
+    ])
+    sacctmgr = clusterparams['sacctmgrexec'] or _find_exec('sacctmgr')
+    call = [sacctmgr, '-n', '-P', 'show', 'qos',
+            'format=' + ','.join(QOS_FIELDS)]
+    try:
+        with metrics.timed('limits_call'):
+            output = subprocess.check_output(call, stderr=subprocess.DEVNULL)
+        limits['qos'] = parse_qos(output.decode('utf-8'))
+    except (OSError, subprocess.CalledProcessError):
+        pass
+    return limits
+
+
+def get_cache_file(cachedir=None):
+    """
+    Returns path of the limits cache of the current cluster configuration.
+    """
+    if cachedir is None:
+        cachedir = clusterparams['limitscache'] or DEFAULT_CACHEDIR
+    key = str(clusterparams['scontrolexec'] or _find_exec('scontrol'))
+    key = hashlib.sha1(key.encode('utf-8')).hexdigest()[:16]
+    return os.path.join(os.path.expanduser(cachedir),
+                        'limits_{0}.json'.format(key))
+
+
+def get_limits(cachedir=None, ttl=None, refresh=False):
+    """
+    Returns cached partition and QOS limits, fetching them if the cache is
+    older than ttl seconds.
+    """
+    if ttl is None:
+        ttl = clusterparams['limitsttl']
+        ttl = DEFAULT_TTL if ttl is None else float(ttl)
+    cachefile = get_cache_file(cachedir)
+    if not refresh and os.path.isfile(cachefile) and \
+            time.time() - os.path.getmtime(cachefile) < ttl:
+        with open(cachefile) as f:
+            return json.load(f, object_pairs_hook=OrderedDict)
+    limits = fetch_limits()
+    dirname = os.path.dirname(cachefile)
+    if not os.path.isdir(dirname):
+        os.makedirs(dirname)
+    # write atomically, several submissions may share the cache
+    fd, tmpfile = tempfile.mkstemp(dir=dirname, prefix='.limits_')
+    with os.fdopen(fd, 'w') as f:
+        json.dump(limits, f)
+    os.rename(tmpfile, cachefile)
+    return limits
+
+
+def _check_job(j, limits, walltime):
+    """
+    Returns (list of violations, QOS name) of one job.
+    """
+    name = j['jobname']
+    errors = []
+    partition = j['queue']
+    p = limits['partitions'].get(str(partition))
+    if p is None:
+        return ['{0}: unknown partition {1}'.format(name, partition)], None
+    if p['state'] != 'UP':
+        errors.append('{0}: partition {1} is {2}'.format(name, partition,
+                                                         p['state']))
+    nnode = int(j['nnode'] or 1)
+    nproc = int(j['nproc'] or 1)
+    qosname = j['qos']
+    if qosname is None:
+        qosname = p['qos'] if p['qos'] not in UNLIMITED else 'normal'
+    qos = limits['qos'].get(qosname, {})
+
+    def check(value, limit, what, source, fmt=str):
+        if value is not None and limit is not None and value > limit:
+            errors.append('{0}: {1} {2} exceeds {3} limit {4}'.format(
+                name, what, fmt(value), source, fmt(limit)))
+    check(walltime, p['maxtime'], 'wall time', 'partition ' + partition,
+          _format_seconds)
+    check(walltime, qos.get('maxwall'), 'wall time', 'QOS ' + qosname,
+          _format_seconds)
+    check(nnode, p['maxnodes'], 'nodes', 'partition ' + partition)
+    check(nnode, p['totalnodes'], 'nodes', 'partition ' + partition +
+          ' size')
+    check(nnode, qos.get('maxnodes'), 'nodes', 'QOS ' + qosname)
+    check(nproc, p['totalcpus'], 'processes', 'partition ' + partition +
+          ' size')
+    check(nproc, qos.get('maxcpus'), 'processes', 'QOS ' + qosname)
+    if p['minnodes'] is not None and nnode < p['minnodes']:
+        errors.append('{0}: nodes {1} below partition {2} minimum {3}'.format(
+            name, nnode, partition, p['minnodes']))
+    return errors, qosname
+
+
+def _format_seconds(s):
+    minutes, s = divmod(int(s), 60)
+    h, m = divmod(minutes, 60)
+    return '{0:02d}:{1:02d}:{2:02d}'.format(h, m, s)
+
+
+def validate_jobs(job_list, limits=None):
+    """
+    Checks all jobs against partition and QOS limits.
+
+    Returns list of violations, empty if all jobs are valid.
+    """
+    if limits is None:
+        limits = get_limits()
+    errors = []
+    njobs = OrderedDict()
+    for j in job_list:
+        walltime = j.get_walltime()
+        if isinstance(j, HeterogeneousJob):
+            # components share the wall time of the group
+            checked = j.components
+        else:
+            checked = [j]
+        qosnames = set()
+        for c in checked:
+            e, qosname = _check_job(c, limits, walltime)
+            errors += e
+            qosnames.add(qosname)
+        for q in qosnames:
+            njobs[q] = njobs.get(q, 0) + 1
+    for q, n in njobs.items():
+        maxsubmit = limits['qos'].get(q, {}).get('maxsubmit') if q else None
+        if maxsubmit is not None and n > maxsubmit:
+            errors.append('{0:d} jobs in QOS {1} exceed MaxSubmitPU '
+                          '{2:d}'.format(n, q, maxsubmit))
+    return errors
+
+
+def check_jobs(job_list, limits=None):
+    """
+    Raises an exception listing all violations if any job exceeds the
+    limits.
+    """
+    errors = validate_jobs(job_list, limits)
+    if len(errors) > 0:
+        raise Exception('{0:d} limit violations, nothing submitted:\n'.format(
+            len(errors)) + '\n'.join(errors))
@@ -0,0 +1,211 @@
+"""
+Scanning of task log files for errors and completion markers.
+
+Task log paths are resolved with the same logic as in the job script
+(logfiledir, rundir and tag substitution). Logs are scanned in parallel
+processes with mmap, so the regular expressions run over the file contents
+without copying them. Completion markers are only searched in the tail of
+each file, and for files larger than maxscan bytes errors are searched in
+the tail only.
+
+Each task gets one of the statuses:
+
+- ok: no error found, completion marker found (if any given)
+- error: an error pattern was found
+- incomplete: no error, but completion marker not found
+- missing: log file does not exist
+
+Usage:
+
+    rows = scan_task_logs(parse_jobs_from_yaml('myjob.yaml'),
+                          done_patterns=['simulation finished'])
+    print(format_table(rows))
+
+Logs in node-local bundles (logmode 'local') must be extracted first, see
+logstaging.extract_task_logs.
+"""
+from __future__ import absolute_import
+import os
+import re
+import mmap
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+from .fusion import FusedJob
+
+DEFAULT_ERROR_PATTERNS = [
+    r'Traceback \(most recent call last\)',
+    r'Segmentation fault',
+    r'\bERROR\b',
+    r'DUE TO TIME LIMIT',
+    r'Out Of Memory|oom-kill',
+]
+
+# bytes read from the end of a file for completion markers
+DEFAULT_TAILSIZE = 64*1024
+# larger files are scanned for errors in the tail only
+DEFAULT_MAXSCAN = 256*1024*1024
+
+COLUMNS = ['jobname', 'taskname', 'status', 'size', 'logfile', 'match']
+
+
+def _expand(j):
+    """
+    Returns the jobs that contain the tasks of a (possibly combined) job.
+    """
+    if isinstance(j, FusedJob):
+        return j.stages
+    return getattr(j, 'members', None) or [j]
+
+
+def get_task_logs(job_list):
+    """
+    Returns list of (jobname, taskname, logfile) tuples of all tasks.
+
+    Tasks without a log file are omitted. Relative paths are interpreted
+    with respect to rundir.
+    """
+    if not isinstance(job_list, list):
+        job_list = [job_list]
+    logs = []
+    for parent in job_list:
+        for j in _expand(parent):
+            rundir = j['rundir'] or ''
+            for d in j.get_task_args():
+                logfile = d['logfile']
+                if logfile is None:
+                    continue
+                # substitute twice to allow tags in tags, as in the script
+                logfile = logfile.format(**d).format(**d)
+                logs.append((j['jobname'], d['taskname'],
+                             os.path.join(rundir, logfile)))
+    return logs
+
+
+def _search(regex, data):
+    m = regex.search(data)
+    if m is None:
+        return None
+    # return the whole matching line
+    start = data.rfind(b'\n', 0, m.start()) + 1
+    end = data.find(b'\n', m.end())
+    if end < 0:
+        end = len(data)
+    line = data[start:end][:200]
+    return line.decode('utf-8', 'replace').strip()
+
+
+def scan_log(logfile, error_patterns=None, done_patterns=None,
+             tailsize=DEFAULT_TAILSIZE, maxscan=DEFAULT_MAXSCAN):
+    """
+    Scans one log file.
+
+    Returns (status, size, match) where match is the first line that matched
+    an error pattern, if any.
+    """
+    if error_patterns is None:
+        error_patterns = DEFAULT_ERROR_PATTERNS
+    try:
+        size = os.path.getsize(logfile)
+    except OSError:
+        return 'missing', 0, None
+    error_re = None
+    if len(error_patterns) > 0:
+        error_re = re.compile('|'.join('(?:{0})'.format(p)
+                                       for p in error_patterns).encode())
+    done_re = None
+    if done_patterns:
+        done_re = re.compile('|'.join('(?:{0})'.format(p)
+                                      for p in done_patterns).encode())
+    if size == 0:
+        return ('incomplete' if done_re is not None else 'ok'), 0, None
+    with open(logfile, 'rb') as f:
+        m = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            tail_start = max(0, size - tailsize)
+            match = None
+            if error_re is not None:
+                start = 0 if size <= maxscan else tail_start
+                if start == 0:
+                    match = _search(error_re, m)
+                else:
+                    match = _search(error_re, m[start:])
+            if match is not None:
+                return 'error', size, match
+            if done_re is not None and done_re.search(m[tail_start:]) is None:
+                return 'incomplete', size, None
+        finally:
+            m.close()
+    return 'ok', size, None
+
+
+def _scan_one(args):
+    return scan_log(*args)
+
+
+def scan_task_logs(job_list, error_patterns=None, done_patterns=None,
+                   workers=None, tailsize=DEFAULT_TAILSIZE,
+                   maxscan=DEFAULT_MAXSCAN):
+    """
+    Scans the logs of all tasks of the given jobs.
+
+    Arguments
+    ---------
+    job_list : list of BatchJob objects
+    error_patterns : list of regular expressions that indicate an error
+    done_patterns : list of regular expressions of which one must appear
+            in the tail of a successful log
+    workers : int
+            number of processes, by default the number of cpus. workers=1
+            scans in the current process.
+
+    Returns list of OrderedDicts with keys COLUMNS.
+    """
+    logs = get_task_logs(job_list)
+    args = [(f, error_patterns, done_patterns, tailsize, maxscan)
+            for _, _, f in logs]
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers == 1 or len(args) < 2:
+        results = [_scan_one(a) for a in args]
+    else:
+        chunksize = max(1, len(args)//(4*workers))
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_scan_one, args, chunksize=chunksize))
+    rows = []
+    for (jobname, taskname, logfile), (status, size, match) in zip(logs,
+                                                                   results):
+        rows.append(OrderedDict([
+            ('jobname', jobname),
+            ('taskname', taskname),
+            ('status', status),
+            ('size', size),
+            ('logfile', logfile),
+            ('match', match),
+        ]))
+    return rows
+
+
+def summarize(rows):
+    """
+    Returns an OrderedDict of status: number of tasks.
+    """
+    counts = OrderedDict()
+    for r in rows:
+        counts[r['status']] = counts.get(r['status'], 0) + 1
+    return counts
+
+
+def format_table(rows, statuses=None):
+    """
+    Returns the rows as a tab separated table.
+
+    If statuses is given, only rows with those statuses are included.
+    """
+    lines = ['\t'.join(COLUMNS)]
+    for r in rows:
+        if statuses is not None and r['status'] not in statuses:
+            continue
+        lines.append('\t'.join('' if r[c] is None else str(r[c])
+                               for c in COLUMNS))
+    return '\n'.join(lines) + '\n'
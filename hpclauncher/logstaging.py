@@ -0,0 +1,135 @@
+"""
+Node-local staging of task log files.
+
+With logmode 'local' task output is redirected to node-local scratch
+($TMPDIR) instead of logfiledir on the shared file system. At the end of the
+job, or when the job is terminated, all task logs are copied back as a single
+tar bundle per job. An index file next to the bundle maps task names to bundle
+members and original log file paths.
+
+Job keywords:
+
+- logmode: 'shared' (default) or 'local'
+- logcompress: compress the bundle with gzip (default True)
+- localscratch: node-local directory (default ${TMPDIR:-/tmp})
+"""
+from __future__ import absolute_import
+import os
+import tarfile
+from collections import OrderedDict
+
+# shell expression that evaluates to the job id in all resource managers
+JOBID_EXPR = '${SLURM_JOB_ID:-${PBS_JOBID:-${JOB_ID:-$$}}}'
+
+DEFAULT_LOCALSCRATCH = '${TMPDIR:-/tmp}'
+
+PROLOGUE_TEMPLATE = """# stage task logs in node-local storage
+_hpcl_logdir={localscratch}/hpclauncher_logs_{jobname}_$$
+_hpcl_logbundle={bundle}
+mkdir -p $_hpcl_logdir
+_hpcl_flush_logs() {{
+    [ -d $_hpcl_logdir ] || return
+    mkdir -p $(dirname $_hpcl_logbundle)
+    cat > $_hpcl_logbundle.index <<'_HPCL_INDEX_EOF'
+{index}_HPCL_INDEX_EOF
+    tar -c{compress}f $_hpcl_logbundle.tmp -C $_hpcl_logdir . && mv $_hpcl_logbundle.tmp $_hpcl_logbundle
+    rm -rf $_hpcl_logdir
+}}
+"""
+
+# name of the shell function that must be called at exit
+EXIT_HOOK = '_hpcl_flush_logs'
+
+
+def get_bundle_name(jobname, logdir=None, compress=True):
+    """
+    Returns path of the log bundle, containing the run time job id.
+    """
+    name = '{0}_logs.{1}.tar'.format(jobname, JOBID_EXPR)
+    if compress:
+        name += '.gz'
+    if logdir is not None:
+        name = os.path.join(logdir, name)
+    return name
+
+
+def get_local_logfile(logfile):
+    """
+    Returns node-local path for the given task log file.
+    """
+    return os.path.join('$_hpcl_logdir', os.path.basename(logfile))
+
+
+def generate_prologue(jobname, index, logdir=None, compress=True,
+                      localscratch=None):
+    """
+    Returns script lines that set up node-local logging.
+
+    EXIT_HOOK must be called when the job script exits.
+
+    index is a list of (taskname, logfile) tuples where logfile is the path
+    on the shared file system.
+    """
+    if localscratch is None:
+        localscratch = DEFAULT_LOCALSCRATCH
+    lines = ''
+    for taskname, logfile in index:
+        member = './' + os.path.basename(logfile)
+        lines += '{0}\t{1}\t{2}\n'.format(taskname, member, logfile)
+    return PROLOGUE_TEMPLATE.format(
+        localscratch=localscratch,
+        jobname=jobname,
+        bundle=get_bundle_name(jobname, logdir, compress),
+        index=lines,
+        compress='z' if compress else '')
+
+
+def read_index(bundle):
+    """
+    Reads the index of a log bundle.
+
+    Returns an OrderedDict of taskname: (member, logfile) pairs.
+    """
+    index = OrderedDict()
+    with open(bundle + '.index') as f:
+        for line in f:
+            words = line.rstrip('\n').split('\t')
+            if len(words) == 3:
+                index[words[0]] = (words[1], words[2])
+    return index
+
+
+def read_task_log(bundle, taskname):
+    """
+    Returns the log of the given task in a bundle as a string.
+    """
+    member = read_index(bundle)[taskname][0]
+    with tarfile.open(bundle) as tar:
+        f = tar.extractfile(member)
+        return f.read().decode('utf-8', 'replace')
+
+
+def extract_task_logs(bundle, tasknames=None, outdir=None):
+    """
+    Extracts task logs from a bundle.
+
+    By default logs of all tasks are restored to their original paths. If
+    outdir is given, logs are extracted to that directory instead.
+    Returns list of created files.
+    """
+    index = read_index(bundle)
+    if tasknames is None:
+        tasknames = list(index.keys())
+    created = []
+    with tarfile.open(bundle) as tar:
+        for name in tasknames:
+            member, logfile = index[name]
+            if outdir is not None:
+                logfile = os.path.join(outdir, os.path.basename(logfile))
+            dirname = os.path.dirname(logfile)
+            if dirname and not os.path.isdir(dirname):
+                os.makedirs(dirname)
+            with open(logfile, 'wb') as f:
+                f.write(tar.extractfile(member).read())
+            created.append(logfile)
+    return created
@@ -0,0 +1,1106 @@
+"""
+Local stand-in for the Slurm commands sbatch, squeue, sacct, scancel,
+scontrol, sinfo and sacctmgr, and for the job submission endpoint of
+slurmrestd.
+
+Mock Slurm keeps its state in a directory (set with HPCLAUNCHER_MOCKSLURM_DIR
+environment variable) and runs submitted batch scripts as local processes on
+a configurable number of simulated nodes. Job ids, #SBATCH directives,
+afterok/afterany/afternotok dependencies, held jobs, time limits and job
+states are emulated. Latency and random failures can be injected to test
+submission logic at scale.
+
+There is no daemon: the scheduler advances every time a command is called.
+Run `mockslurm.py run` in the background to keep scheduling without queries.
+
+Usage:
+
+# create wrapper executables in ./bin and a cluster with 8 nodes
+python -m hpclauncher.mockslurm install bin --statedir mockstate --nodes 8
+
+# point hpclauncher to the mock submit executable
+submitexec: /path/to/bin/sbatch
+resourcemanager: slurm
+
+# query mock slurm
+bin/squeue
+bin/sacct -j 1,2 --format=JobID,State,ExitCode
+
+# serve the REST API on a Unix socket (or host:port)
+python -m hpclauncher.mockslurm restd unix:/tmp/mockslurm.socket
+"""
+from __future__ import absolute_import, print_function
+import os
+import sys
+import json
+import time
+import shlex
+import fcntl
+import random
+import signal
+import argparse
+import contextlib
+import threading
+import subprocess
+import socketserver
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from collections import OrderedDict
+
+from . import slurmrest
+
+MOCKSLURM_ENV_VAR = 'HPCLAUNCHER_MOCKSLURM_DIR'
+MOCKSLURM_DEFAULT_DIR = '~/.hpclauncher/mockslurm'
+
+COMMANDS = ['sbatch', 'squeue', 'sacct', 'scancel', 'scontrol', 'sinfo',
+            'sacctmgr']
+
+DEFAULT_CONFIG = OrderedDict([
+    # partition name: number of nodes, cores per node and time limit
+    ('partitions', OrderedDict([
+        ('normal', OrderedDict([('nodes', 4),
+                                ('cpus_per_node', 16),
+                                ('max_time', '48:00:00')])),
+    ])),
+    ('default_partition', 'normal'),
+    # QOS name: limits max_wall, max_nodes, max_cpus and max_submit_pu
+    ('qos', OrderedDict([('normal', OrderedDict())])),
+    # seconds added to each command to emulate a loaded controller
+    ('submit_latency', 0.0),
+    ('query_latency', 0.0),
+    # probability that a submission is rejected
+    ('submit_failure_rate', 0.0),
+    # probability that a started job fails regardless of its exit status
+    ('job_failure_rate', 0.0),
+    ('seed', None),
+])
+
+STATE_CODES = {
+    'PENDING': 'PD',
+    'RUNNING': 'R',
+    'COMPLETED': 'CD',
+    'FAILED': 'F',
+    'CANCELLED': 'CA',
+    'TIMEOUT': 'TO',
+}
+FINISHED_STATES = ['COMPLETED', 'FAILED', 'CANCELLED', 'TIMEOUT']
+
+RUNNER_TEMPLATE = """#!/bin/bash
+echo $$ > {pidfile}
+cd {workdir}
+bash {script} >> {output} 2>&1
+rc=$?
+{failure}
+echo "$rc $(date +%s.%N)" > {exitfile}.tmp && mv {exitfile}.tmp {exitfile}
+"""
+
+
+class MockSlurmError(Exception):
+    """
+    Error reported by a mock Slurm command.
+    """
+    pass
+
+
+def parse_time(s):
+    """
+    Parses a Slurm time string to seconds.
+
+    Accepted formats: MM, MM:SS, HH:MM:SS, D-HH, D-HH:MM, D-HH:MM:SS
+    """
+    s = str(s).strip()
+    days = 0
+    if '-' in s:
+        d, s = s.split('-', 1)
+        days = int(d)
+        parts = [int(p) for p in s.split(':')]
+        parts += [0]*(3 - len(parts))
+        h, m, sec = parts
+    else:
+        parts = [int(p) for p in s.split(':')]
+        if len(parts) == 1:
+            h, m, sec = 0, parts[0], 0
+        elif len(parts) == 2:
+            h, m, sec = 0, parts[0], parts[1]
+        else:
+            h, m, sec = parts
+    return ((days*24 + h)*60 + m)*60 + sec
+
+
+def format_duration(seconds):
+    """
+    Formats seconds as Slurm duration string [D-]HH:MM:SS.
+    """
+    seconds = int(seconds)
+    days, seconds = divmod(seconds, 86400)
+    h, seconds = divmod(seconds, 3600)
+    m, s = divmod(seconds, 60)
+    out = '{0:02d}:{1:02d}:{2:02d}'.format(h, m, s)
+    if days > 0:
+        out = '{0:d}-{1}'.format(days, out)
+    return out
+
+
+def format_timestamp(t):
+    if t is None:
+        return 'Unknown'
+    return time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(t))
+
+
+def parse_dependency(spec):
+    """
+    Parses a Slurm dependency string, e.g. 'afterok:1:2,afterany:3'.
+
+    Returns a list of (type, jobid) tuples.
+    """
+    deps = []
+    if spec is None:
+        return deps
+    for clause in spec.replace('?', ',').split(','):
+        clause = clause.strip()
+        if len(clause) == 0:
+            continue
+        words = clause.split(':')
+        deptype = words[0]
+        if deptype not in ['after', 'afterok', 'afterany', 'afternotok']:
+            raise MockSlurmError('Job dependency problem')
+        for w in words[1:]:
+            try:
+                deps.append((deptype, int(w.split('+')[0])))
+            except ValueError:
+                raise MockSlurmError('Job dependency problem')
+    return deps
+
+
+def _sbatch_parser():
+    parser = argparse.ArgumentParser(prog='sbatch', add_help=False)
+    parser.add_argument('-J', '--job-name')
+    parser.add_argument('-o', '--output')
+    parser.add_argument('-e', '--error')
+    parser.add_argument('-N', '--nodes')
+    parser.add_argument('-n', '--ntasks', type=int)
+    parser.add_argument('-p', '--partition')
+    parser.add_argument('-t', '--time')
+    parser.add_argument('-A', '--account')
+    parser.add_argument('-D', '--chdir')
+    parser.add_argument('-d', '--dependency', action='append')
+    parser.add_argument('-H', '--hold', action='store_true', default=None)
+    parser.add_argument('--mail-user')
+    parser.add_argument('--mail-type', action='append')
+    parser.add_argument('--nice', type=int)
+    parser.add_argument('--parsable', action='store_true', default=None)
+    parser.add_argument('--test-only', action='store_true', default=None)
+    parser.add_argument('--wrap')
+    return parser
+
+
+def _split_list(values):
+    """
+    Splits a list of comma separated strings.
+    """
+    out = []
+    for v in values or []:
+        out.extend([w for w in v.split(',') if len(w) > 0])
+    return out
+
+
+class MockSlurm(object):
+    """
+    Mock Slurm instance whose state is stored in a directory.
+    """
+    def __init__(self, statedir=None):
+        if statedir is None:
+            statedir = os.environ.get(MOCKSLURM_ENV_VAR,
+                                      os.path.expanduser(MOCKSLURM_DEFAULT_DIR))
+        self.statedir = os.path.abspath(statedir)
+        if not os.path.isdir(self.statedir):
+            os.makedirs(self.statedir)
+        self.config = self._read_config()
+        self.random = random.Random(self.config.get('seed'))
+
+    # --- configuration and state ---
+
+    def _path(self, *names):
+        return os.path.join(self.statedir, *names)
+
+    def _read_config(self):
+        config = OrderedDict(DEFAULT_CONFIG)
+        configfile = self._path('config.json')
+        if os.path.isfile(configfile):
+            with open(configfile) as f:
+                config.update(json.load(f, object_pairs_hook=OrderedDict))
+        return config
+
+    def configure(self, **kwargs):
+        """
+        Updates and stores the mock cluster configuration.
+        """
+        self.config.update(kwargs)
+        with open(self._path('config.json'), 'w') as f:
+            json.dump(self.config, f, indent=2)
+        self.random = random.Random(self.config.get('seed'))
+
+    @contextlib.contextmanager
+    def _locked_state(self):
+        """
+        Locks, loads and stores the scheduler state.
+        """
+        with open(self._path('lock'), 'w') as lockfile:
+            fcntl.flock(lockfile, fcntl.LOCK_EX)
+            try:
+                statefile = self._path('state.json')
+                if os.path.isfile(statefile):
+                    with open(statefile) as f:
+                        state = json.load(f, object_pairs_hook=OrderedDict)
+                else:
+                    state = OrderedDict([('next_id', 1),
+                                         ('jobs', OrderedDict())])
+                yield state
+                with open(statefile + '.tmp', 'w') as f:
+                    json.dump(state, f)
+                os.rename(statefile + '.tmp', statefile)
+            finally:
+                fcntl.flock(lockfile, fcntl.LOCK_UN)
+
+    def _nodes(self, partition):
+        """
+        Returns list of node names in the partition.
+        """
+        n = self.config['partitions'][partition]['nodes']
+        return ['{0}{1:03d}'.format(partition, i + 1) for i in range(n)]
+
+    # --- scheduler ---
+
+    def _update_running(self, state, now):
+        for job in state['jobs'].values():
+            if job['state'] != 'RUNNING':
+                continue
+            exitfile = self._path('job_{0}.exit'.format(job['id']))
+            if os.path.isfile(exitfile):
+                with open(exitfile) as f:
+                    words = f.read().split()
+                rc = int(words[0])
+                job['exitcode'] = rc
+                job['end'] = float(words[1]) if len(words) > 1 else now
+                job['state'] = 'COMPLETED' if rc == 0 else 'FAILED'
+            elif now > job['start'] + job['timelimit']:
+                self._kill(job)
+                job['state'] = 'TIMEOUT'
+                job['end'] = now
+
+    def _dependency_status(self, state, job):
+        """
+        Returns 'ok', 'wait' or 'never' depending on parent job states.
+        """
+        status = 'ok'
+        for deptype, pid in job['dependency']:
+            parent = state['jobs'].get(str(pid))
+            if parent is None:
+                continue
+            pstate = parent['state']
+            finished = pstate in FINISHED_STATES
+            if deptype == 'after':
+                ok = pstate != 'PENDING'
+                never = False
+            elif deptype == 'afterany':
+                ok = finished
+                never = False
+            elif deptype == 'afterok':
+                ok = pstate == 'COMPLETED'
+                never = finished and not ok
+            else:
+                ok = finished and pstate != 'COMPLETED'
+                never = pstate == 'COMPLETED'
+            if never:
+                return 'never'
+            if not ok:
+                status = 'wait'
+        return status
+
+    def schedule(self):
+        """
+        Updates the states of running jobs and starts eligible pending jobs.
+        """
+        with self._locked_state() as state:
+            self._schedule(state)
+
+    def _schedule(self, state):
+        now = time.time()
+        self._update_running(state, now)
+        busy = set()
+        for job in state['jobs'].values():
+            if job['state'] == 'RUNNING':
+                busy.update(job['nodelist'])
+        for job in state['jobs'].values():
+            if job['state'] != 'PENDING':
+                continue
+            if job['held']:
+                job['reason'] = 'JobHeldUser'
+                continue
+            deps = self._dependency_status(state, job)
+            if deps == 'never':
+                job['reason'] = 'DependencyNeverSatisfied'
+                continue
+            if deps == 'wait':
+                job['reason'] = 'Dependency'
+                continue
+            free = [n for n in self._nodes(job['partition'])
+                    if n not in busy]
+            if len(free) < job['nodes']:
+                job['reason'] = 'Resources'
+                continue
+            job['nodelist'] = free[:job['nodes']]
+            busy.update(job['nodelist'])
+            self._start(job, now)
+
+    def _start(self, job, now):
+        jid = job['id']
+        fail = self.random.random() < self.config['job_failure_rate']
+        runner = RUNNER_TEMPLATE.format(
+            pidfile=self._path('job_{0}.pid'.format(jid)),
+            workdir=shlex.quote(job['workdir']),
+            script=self._path('job_{0}.sh'.format(jid)),
+            output=shlex.quote(job['output']),
+            exitfile=self._path('job_{0}.exit'.format(jid)),
+            failure='rc=1' if fail else '')
+        runfile = self._path('job_{0}.run'.format(jid))
+        with open(runfile, 'w') as f:
+            f.write(runner)
+        partition = self.config['partitions'][job['partition']]
+        env = dict(os.environ)
+        env.update({
+            'SLURM_JOB_ID': str(jid),
+            'SLURM_JOBID': str(jid),
+            'SLURM_JOB_NAME': job['name'],
+            'SLURM_JOB_PARTITION': job['partition'],
+            'SLURM_JOB_NODELIST': ','.join(job['nodelist']),
+            'SLURM_NNODES': str(job['nodes']),
+            'SLURM_JOB_NUM_NODES': str(job['nodes']),
+            'SLURM_NTASKS': str(job['ntasks']),
+            'SLURM_CPUS_ON_NODE': str(partition['cpus_per_node']),
+            'SLURM_SUBMIT_DIR': job['workdir'],
+        })
+        # start detached from this process, in a new session
+        subprocess.check_call(
+            ['bash', '-c', 'setsid bash "$0" </dev/null >/dev/null 2>&1 &',
+             runfile], env=env)
+        job['state'] = 'RUNNING'
+        job['reason'] = 'None'
+        job['start'] = now
+
+    def _kill(self, job):
+        pidfile = self._path('job_{0}.pid'.format(job['id']))
+        try:
+            with open(pidfile) as f:
+                pgid = int(f.read())
+            os.killpg(pgid, signal.SIGTERM)
+        except (IOError, OSError, ValueError):
+            pass
+
+    def wait(self, jobids=None, timeout=None, interval=0.1):
+        """
+        Schedules until the given jobs (default: all) have finished.
+
+        Returns True if all jobs finished before the timeout.
+        """
+        t0 = time.time()
+        while True:
+            with self._locked_state() as state:
+                self._schedule(state)
+                jobs = state['jobs']
+                ids = jobs.keys() if jobids is None else \
+                    [str(i) for i in jobids]
+                pending = [i for i in ids if i in jobs and
+                           jobs[i]['state'] not in FINISHED_STATES and
+                           jobs[i]['reason'] != 'DependencyNeverSatisfied' and
+                           not jobs[i]['held']]
+            if len(pending) == 0:
+                return True
+            if timeout is not None and time.time() - t0 > timeout:
+                return False
+            time.sleep(interval)
+
+    def get_jobs(self):
+        """
+        Returns a copy of all job records.
+        """
+        with self._locked_state() as state:
+            self._schedule(state)
+            return json.loads(json.dumps(state['jobs']))
+
+    # --- commands ---
+
+    def _sleep(self, key):
+        latency = self.config.get(key, 0.0)
+        if latency:
+            time.sleep(latency)
+
+    def sbatch(self, argv):
+        """
+        Submits a batch script. Returns the sbatch stdout string.
+        """
+        parser = _sbatch_parser()
+        cmd_opts, rest = parser.parse_known_args(argv)
+        if cmd_opts.test_only:
+            return self.test_only(cmd_opts)
+        scripts = [a for a in rest if not a.startswith('-')]
+        if cmd_opts.wrap is not None:
+            content = '#!/bin/bash\n' + cmd_opts.wrap + '\n'
+            scriptfile = 'wrap'
+        elif len(scripts) == 0:
+            raise MockSlurmError('sbatch: error: script file not given')
+        else:
+            scriptfile = scripts[0]
+            with open(scriptfile) as f:
+                content = f.read()
+        jid = self.submit_script(content, argv, os.path.basename(scriptfile))
+        if cmd_opts.parsable:
+            return '{0}\n'.format(jid)
+        return 'Submitted batch job {0}\n'.format(jid)
+
+    def submit_script(self, content, argv=None, name='sbatch'):
+        """
+        Submits batch script content with sbatch arguments. Returns job id.
+        """
+        self._sleep('submit_latency')
+        parser = _sbatch_parser()
+        cmd_opts, _ = parser.parse_known_args(argv or [])
+        # parse #SBATCH directives until the first command
+        tokens = []
+        for line in content.splitlines()[1:]:
+            s = line.strip()
+            if s.startswith('#SBATCH'):
+                tokens.extend(shlex.split(s[len('#SBATCH'):]))
+            elif len(s) > 0 and not s.startswith('#'):
+                break
+        # heterogeneous job components are separated by 'hetjob'
+        components = [[]]
+        for t in tokens:
+            if t == 'hetjob':
+                components.append([])
+            else:
+                components[-1].append(t)
+        opts, _ = parser.parse_known_args(components[0])
+        # command line options override directives
+        for k, v in vars(cmd_opts).items():
+            if v is not None:
+                setattr(opts, k, v)
+
+        if self.random.random() < self.config['submit_failure_rate']:
+            raise MockSlurmError('sbatch: error: Batch job submission failed: '
+                                 'Socket timed out on send/recv operation')
+        partition = opts.partition or self.config['default_partition']
+        if partition not in self.config['partitions']:
+            raise MockSlurmError('sbatch: error: Batch job submission failed: '
+                                 'Invalid partition name specified')
+        pconf = self.config['partitions'][partition]
+        cpus = pconf['cpus_per_node']
+        ntasks = 0
+        nodes = 0
+        for i, c in enumerate(components):
+            copts = opts if i == 0 else parser.parse_known_args(c)[0]
+            n = int(copts.nodes.split('-')[0]) if copts.nodes else 1
+            ntasks += copts.ntasks or 1
+            nodes += max(n, ((copts.ntasks or 1) + cpus - 1)//cpus)
+        if nodes > pconf['nodes']:
+            raise MockSlurmError('sbatch: error: Batch job submission failed: '
+                                 'Requested node configuration is not '
+                                 'available')
+        max_time = parse_time(pconf['max_time'])
+        timelimit = parse_time(opts.time) if opts.time else max_time
+        if timelimit > max_time:
+            raise MockSlurmError('sbatch: error: Batch job submission failed: '
+                                 'Requested time limit is invalid (missing or '
+                                 'exceeds some limit)')
+        deps = []
+        for d in opts.dependency or []:
+            deps.extend(parse_dependency(d))
+        workdir = os.path.abspath(opts.chdir or os.getcwd())
+
+        with self._locked_state() as state:
+            for _, pid in deps:
+                if str(pid) not in state['jobs']:
+                    raise MockSlurmError('sbatch: error: Batch job submission '
+                                         'failed: Job dependency problem')
+            jid = state['next_id']
+            state['next_id'] = jid + 1
+            name = opts.job_name or name
+            output = opts.output or 'slurm-%j.out'
+            output = output.replace('%j', str(jid)).replace('%x', name)
+            output = os.path.join(workdir, output)
+            with open(self._path('job_{0}.sh'.format(jid)), 'w') as f:
+                f.write(content)
+            job = OrderedDict([
+                ('id', jid),
+                ('name', name),
+                ('partition', partition),
+                ('account', opts.account),
+                ('nodes', nodes),
+                ('ntasks', ntasks),
+                ('timelimit', timelimit),
+                ('dependency', deps),
+                ('held', bool(opts.hold)),
+                ('nice', opts.nice or 0),
+                ('workdir', workdir),
+                ('output', output),
+                ('state', 'PENDING'),
+                ('reason', 'Priority'),
+                ('nodelist', []),
+                ('submit', time.time()),
+                ('start', None),
+                ('end', None),
+                ('exitcode', None),
+            ])
+            state['jobs'][str(jid)] = job
+            self._schedule(state)
+        return jid
+
+    def _estimate_start(self, state, partition, nodes, now):
+        """
+        Returns the time when nodes are free in the partition, assuming
+        running jobs use their full time limit and ignoring pending jobs.
+        """
+        ends = []
+        for job in state['jobs'].values():
+            if job['state'] == 'RUNNING' and job['partition'] == partition:
+                ends.extend([job['start'] + job['timelimit']] *
+                            len(job['nodelist']))
+        free = len(self._nodes(partition)) - len(ends)
+        ends.sort()
+        if free >= nodes:
+            return now
+        return max(now, ends[nodes - free - 1])
+
+    def test_only(self, opts):
+        """
+        Reports the partition and time where a job would start first, as
+        'sbatch --test-only'.
+        """
+        self._sleep('query_latency')
+        partitions = _split_list([opts.partition or
+                                  self.config['default_partition']])
+        best = None
+        with self._locked_state() as state:
+            self._schedule(state)
+            now = time.time()
+            for p in partitions:
+                if p not in self.config['partitions']:
+                    raise MockSlurmError('sbatch: error: invalid partition '
+                                         'specified: ' + p)
+                cpus = self.config['partitions'][p]['cpus_per_node']
+                n = int(opts.nodes.split('-')[0]) if opts.nodes else 1
+                n = max(n, ((opts.ntasks or 1) + cpus - 1)//cpus)
+                if n > len(self._nodes(p)):
+                    continue
+                start = self._estimate_start(state, p, n, now)
+                if best is None or start < best[1]:
+                    best = (p, start, n*cpus)
+        if best is None:
+            raise MockSlurmError('sbatch: error: Requested node configuration '
+                                 'is not available')
+        return ('sbatch: Job 0 to start at {0} using {1:d} processors on '
+                'nodes {2} in partition {3}\n').format(
+                    format_timestamp(best[1]), best[2], best[0] + '001',
+                    best[0])
+
+    def sinfo(self, argv):
+        """
+        Lists partitions. Supports format codes %R %P %a %F %c %D.
+        """
+        self._sleep('query_latency')
+        parser = argparse.ArgumentParser(prog='sinfo', add_help=False)
+        parser.add_argument('-h', '--noheader', action='store_true')
+        parser.add_argument('-o', '--format', default='%P %a %l %D %F')
+        opts, _ = parser.parse_known_args(argv)
+        with self._locked_state() as state:
+            self._schedule(state)
+            busy = set()
+            for job in state['jobs'].values():
+                if job['state'] == 'RUNNING':
+                    busy.update(job['nodelist'])
+        fields = _parse_squeue_format(opts.format)
+        lines = []
+        if not opts.noheader:
+            lines.append(' '.join(_pad(SINFO_HEADERS.get(c, c), w)
+                                  for c, w in fields))
+        for name, p in self.config['partitions'].items():
+            nodes = self._nodes(name)
+            alloc = len([n for n in nodes if n in busy])
+            values = {
+                'R': name,
+                'P': name + ('*' if name == self.config['default_partition']
+                             else ''),
+                'a': 'up',
+                'l': p['max_time'],
+                'D': str(len(nodes)),
+                'F': '{0:d}/{1:d}/0/{2:d}'.format(alloc, len(nodes) - alloc,
+                                                  len(nodes)),
+                'c': str(p['cpus_per_node']),
+            }
+            lines.append(' '.join(_pad(values.get(c, ''), w)
+                                  for c, w in fields))
+        return '\n'.join(lines) + '\n'
+
+    def squeue(self, argv):
+        """
+        Lists pending and running jobs. Returns the squeue stdout string.
+        """
+        self._sleep('query_latency')
+        parser = argparse.ArgumentParser(prog='squeue', add_help=False)
+        parser.add_argument('-h', '--noheader', action='store_true')
+        parser.add_argument('-j', '--jobs', action='append')
+        parser.add_argument('-t', '--states', action='append')
+        parser.add_argument('-n', '--name', action='append')
+        parser.add_argument('-o', '--format',
+                            default='%.18i %.9P %.8j %.2t %.10M %.6D %R')
+        opts, _ = parser.parse_known_args(argv)
+        jobs = self.get_jobs().values()
+        states = _split_list(opts.states)
+        if len(states) > 0:
+            states = [s.upper() for s in states]
+            jobs = [j for j in jobs if j['state'] in states or
+                    STATE_CODES[j['state']] in states]
+        else:
+            jobs = [j for j in jobs if j['state'] not in FINISHED_STATES]
+        ids = _split_list(opts.jobs)
+        if len(ids) > 0:
+            jobs = [j for j in jobs if str(j['id']) in ids]
+        names = _split_list(opts.name)
+        if len(names) > 0:
+            jobs = [j for j in jobs if j['name'] in names]
+        fields = _parse_squeue_format(opts.format)
+        lines = []
+        if not opts.noheader:
+            lines.append(' '.join(_pad(SQUEUE_HEADERS.get(c, c), w)
+                                  for c, w in fields))
+        now = time.time()
+        for j in jobs:
+            lines.append(' '.join(_pad(_squeue_value(j, c, now), w)
+                                  for c, w in fields))
+        return '\n'.join(lines) + '\n'
+
+    def sacct(self, argv):
+        """
+        Reports accounting data of jobs. Returns the sacct stdout string.
+        """
+        self._sleep('query_latency')
+        parser = argparse.ArgumentParser(prog='sacct', add_help=False)
+        parser.add_argument('-j', '--jobs', action='append')
+        parser.add_argument('-n', '--noheader', action='store_true')
+        parser.add_argument('-P', '--parsable2', action='store_true')
+        parser.add_argument('-p', '--parsable', action='store_true')
+        parser.add_argument('-o', '--format', action='append')
+        parser.add_argument('-X', '--allocations', action='store_true')
+        opts, _ = parser.parse_known_args(argv)
+        fields = _split_list(opts.format) or SACCT_DEFAULT_FORMAT
+        jobs = self.get_jobs().values()
+        ids = _split_list(opts.jobs)
+        if len(ids) > 0:
+            jobs = [j for j in jobs if str(j['id']) in ids]
+        now = time.time()
+        rows = [[_sacct_value(j, f, now) for f in fields] for j in jobs]
+        header = [f.split('%')[0] for f in fields]
+        lines = []
+        if opts.parsable2 or opts.parsable:
+            end = '|' if opts.parsable else ''
+            if not opts.noheader:
+                lines.append('|'.join(header) + end)
+            lines += ['|'.join(r) + end for r in rows]
+        else:
+            if not opts.noheader:
+                lines.append(' '.join(_pad(h, 12) for h in header))
+                lines.append(' '.join(['-'*12]*len(header)))
+            lines += [' '.join(_pad(v, 12) for v in r) for r in rows]
+        return '\n'.join(lines) + '\n'
+
+    def scancel(self, argv):
+        """
+        Cancels jobs. Returns the scancel stdout string.
+        """
+        self._sleep('query_latency')
+        parser = argparse.ArgumentParser(prog='scancel', add_help=False)
+        parser.add_argument('-n', '--name', action='append')
+        parser.add_argument('jobids', nargs='*')
+        opts, _ = parser.parse_known_args(argv)
+        ids = _split_list(opts.jobids)
+        names = _split_list(opts.name)
+        with self._locked_state() as state:
+            now = time.time()
+            for job in state['jobs'].values():
+                if str(job['id']) not in ids and job['name'] not in names:
+                    continue
+                if job['state'] == 'RUNNING':
+                    self._kill(job)
+                if job['state'] in ['PENDING', 'RUNNING']:
+                    job['state'] = 'CANCELLED'
+                    job['end'] = now
+            self._schedule(state)
+        return ''
+
+    def scontrol(self, argv):
+        """
+        Supports 'scontrol hold|release ids', 'scontrol show hostnames' and
+        'scontrol -o show partition'.
+        """
+        argv = [a for a in argv if a not in ['-o', '--oneliner']]
+        if len(argv) >= 2 and argv[0] == 'show' and argv[1] == 'partition':
+            return self.show_partitions()
+        if len(argv) >= 2 and argv[0] == 'show' and argv[1] == 'hostnames':
+            hosts = argv[2] if len(argv) > 2 else \
+                os.environ.get('SLURM_JOB_NODELIST', '')
+            return ''.join(h + '\n' for h in _split_list([hosts]))
+        if len(argv) < 2 or argv[0] not in ['hold', 'release']:
+            raise MockSlurmError('scontrol: error: unsupported command')
+        self._sleep('query_latency')
+        ids = _split_list(argv[1:])
+        with self._locked_state() as state:
+            for i in ids:
+                job = state['jobs'].get(i)
+                if job is None:
+                    raise MockSlurmError('Invalid job id specified')
+                if job['state'] != 'PENDING':
+                    continue
+                job['held'] = argv[0] == 'hold'
+                if not job['held']:
+                    job['reason'] = 'Priority'
+            self._schedule(state)
+        return ''
+
+    def show_partitions(self):
+        """
+        Returns partitions in 'scontrol -o show partition' format.
+        """
+        lines = []
+        for name, p in self.config['partitions'].items():
+            fields = [
+                ('PartitionName', name),
+                ('QoS', p.get('qos', 'N/A')),
+                ('MaxNodes', p.get('max_nodes', 'UNLIMITED')),
+                ('MaxTime', p['max_time']),
+                ('MinNodes', p.get('min_nodes', 0)),
+                ('State', p.get('state', 'UP')),
+                ('TotalCPUs', p['nodes']*p['cpus_per_node']),
+                ('TotalNodes', p['nodes']),
+            ]
+            lines.append(' '.join('{0}={1}'.format(k, v) for k, v in fields))
+        return '\n'.join(lines) + '\n'
+
+    def sacctmgr(self, argv):
+        """
+        Supports 'sacctmgr -n -P show qos format=Name,MaxWall,MaxTRES,
+        MaxSubmitPU'.
+        """
+        self._sleep('query_latency')
+        words = [a.lower() for a in argv if not a.startswith('-')]
+        if words[:2] != ['show', 'qos']:
+            raise MockSlurmError('sacctmgr: error: unsupported command')
+        lines = []
+        for name, q in self.config['qos'].items():
+            tres = []
+            if q.get('max_cpus') is not None:
+                tres.append('cpu={0}'.format(q['max_cpus']))
+            if q.get('max_nodes') is not None:
+                tres.append('node={0}'.format(q['max_nodes']))
+            lines.append('|'.join([name, q.get('max_wall', ''),
+                                   ','.join(tres),
+                                   str(q.get('max_submit_pu', ''))]))
+        return '\n'.join(lines) + '\n'
+
+
+SQUEUE_HEADERS = {
+    'i': 'JOBID', 'P': 'PARTITION', 'j': 'NAME', 't': 'ST', 'T': 'STATE',
+    'M': 'TIME', 'D': 'NODES', 'R': 'NODELIST(REASON)', 'r': 'REASON',
+    'N': 'NODELIST', 'l': 'TIME_LIMIT', 'u': 'USER', 'a': 'ACCOUNT',
+}
+
+SINFO_HEADERS = {
+    'R': 'PARTITION', 'P': 'PARTITION', 'a': 'AVAIL', 'l': 'TIMELIMIT',
+    'D': 'NODES', 'F': 'NODES(A/I/O/T)', 'c': 'CPUS',
+}
+
+SACCT_DEFAULT_FORMAT = ['JobID', 'JobName', 'Partition', 'Account',
+                        'AllocCPUS', 'State', 'ExitCode']
+
+
+def _pad(value, width):
+    if width is None:
+        return value
+    if width < 0:
+        return value[:-width].ljust(-width)
+    return value[:width].rjust(width)
+
+
+def _parse_squeue_format(fmt):
+    """
+    Parses squeue format string, e.g. '%.18i %j'.
+
+    Returns list of (code, width) tuples.
+    """
+    fields = []
+    for item in fmt.split('%')[1:]:
+        item = item.strip()
+        width = None
+        i = 0
+        right = item.startswith('.')
+        if right:
+            i = 1
+        digits = ''
+        while i < len(item) and item[i].isdigit():
+            digits += item[i]
+            i += 1
+        if len(digits) > 0:
+            width = int(digits) if right else -int(digits)
+        fields.append((item[i], width))
+    return fields
+
+
+def _squeue_value(job, code, now):
+    if code == 'i':
+        return str(job['id'])
+    if code == 'P':
+        return job['partition']
+    if code == 'j':
+        return job['name']
+    if code == 't':
+        return STATE_CODES[job['state']]
+    if code == 'T':
+        return job['state']
+    if code == 'M':
+        if job['start'] is None:
+            return '0:00'
+        return format_duration((job['end'] or now) - job['start'])
+    if code == 'D':
+        return str(job['nodes'])
+    if code == 'N':
+        return ','.join(job['nodelist'])
+    if code == 'R':
+        if job['state'] == 'PENDING':
+            return '(' + job['reason'] + ')'
+        return ','.join(job['nodelist'])
+    if code == 'r':
+        return job['reason']
+    if code == 'l':
+        return format_duration(job['timelimit'])
+    if code == 'a':
+        return job['account'] or ''
+    if code == 'u':
+        return os.environ.get('USER', '')
+    return ''
+
+
+def _sacct_value(job, field, now):
+    key = field.split('%')[0].lower()
+    if key == 'jobid':
+        return str(job['id'])
+    if key == 'jobname':
+        return job['name']
+    if key == 'partition':
+        return job['partition']
+    if key == 'account':
+        return job['account'] or ''
+    if key == 'state':
+        if job['state'] == 'CANCELLED':
+            return 'CANCELLED by {0}'.format(os.getuid())
+        return job['state']
+    if key == 'exitcode':
+        rc = job['exitcode'] if job['exitcode'] is not None else 0
+        return '{0}:0'.format(rc)
+    if key == 'submit':
+        return format_timestamp(job['submit'])
+    if key == 'eligible':
+        return format_timestamp(job['submit'])
+    if key == 'start':
+        return format_timestamp(job['start'])
+    if key == 'end':
+        return format_timestamp(job['end'])
+    if key == 'elapsed':
+        if job['start'] is None:
+            return '00:00:00'
+        return format_duration((job['end'] or now) - job['start'])
+    if key == 'elapsedraw':
+        if job['start'] is None:
+            return '0'
+        return str(int((job['end'] or now) - job['start']))
+    if key == 'timelimit':
+        return format_duration(job['timelimit'])
+    if key == 'timelimitraw':
+        return str(int(job['timelimit']//60))
+    if key == 'nnodes':
+        return str(job['nodes'])
+    if key in ['ntasks', 'alloccpus', 'reqcpus']:
+        return str(job['ntasks'])
+    if key == 'nodelist':
+        return ','.join(job['nodelist']) or 'None assigned'
+    if key == 'reason':
+        return job['reason']
+    return ''
+
+
+class _RestHandler(BaseHTTPRequestHandler):
+    """
+    Handles slurmrestd job submit requests.
+    """
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        BaseHTTPRequestHandler.setup(self)
+        with self.server.lock:
+            self.server.connections += 1
+
+    def address_string(self):
+        return 'mockslurm'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self, status, output):
+        data = json.dumps(output).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        body = self.rfile.read(length)
+        words = self.path.strip('/').split('/')
+        if len(words) != 4 or words[0] != 'slurm' or \
+                words[2:] != ['job', 'submit']:
+            self._reply(404, {'errors': [{'error': 'Unknown path'}]})
+            return
+        try:
+            data = json.loads(body.decode('utf-8'))
+            job = data.get('job', {})
+            args = slurmrest.job_to_sbatch_args(job)
+            jid = self.server.slurm.submit_script(data['script'], args,
+                                                  job.get('name', 'rest'))
+        except (MockSlurmError, ValueError, KeyError) as e:
+            self._reply(500, {'errors': [{'error': str(e)}]})
+            return
+        with self.server.lock:
+            self.server.requests += 1
+        self._reply(200, OrderedDict([('job_id', jid), ('step_id', 'batch'),
+                                      ('errors', []), ('warnings', [])]))
+
+
+class _TCPRestServer(socketserver.ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class _UnixRestServer(socketserver.ThreadingMixIn,
+                      socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def start_restd(listen, statedir=None):
+    """
+    Serves the slurmrestd job submit endpoint in a background thread.
+
+    listen is 'unix:/path/to/socket' or 'host:port'. Returns the server, stop
+    it with server.shutdown().
+    """
+    if listen.startswith('unix:'):
+        path = listen[len('unix:'):]
+        if os.path.exists(path):
+            os.remove(path)
+        server = _UnixRestServer(path, _RestHandler)
+    else:
+        host, port = listen.rsplit(':', 1)
+        server = _TCPRestServer((host, int(port)), _RestHandler)
+    server.slurm = MockSlurm(statedir)
+    server.lock = threading.Lock()
+    # number of accepted connections and submitted jobs
+    server.connections = 0
+    server.requests = 0
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    return server
+
+
+def install(bindir, statedir=None, **config):
+    """
+    Creates executable wrappers for the mock Slurm commands in bindir.
+
+    Returns a MockSlurm object.
+    """
+    bindir = os.path.abspath(bindir)
+    if not os.path.isdir(bindir):
+        os.makedirs(bindir)
+    m = MockSlurm(statedir)
+    m.configure(**config)
+    pkgdir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    for cmd in COMMANDS:
+        exe = os.path.join(bindir, cmd)
+        with open(exe, 'w') as f:
+            f.write('#!/bin/bash\n')
+            f.write('export {0}={1}\n'.format(MOCKSLURM_ENV_VAR,
+                                              shlex.quote(m.statedir)))
+            f.write('export PYTHONPATH={0}${{PYTHONPATH:+:$PYTHONPATH}}\n'.format(
+                shlex.quote(pkgdir)))
+            f.write('exec {0} -m hpclauncher.mockslurm {1} "$@"\n'.format(
+                shlex.quote(sys.executable), cmd))
+        os.chmod(exe, 0o755)
+    return m
+
+
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv[1:]
+    tools = COMMANDS + ['install', 'run', 'restd']
+    if len(argv) == 0 or argv[0] not in tools:
+        print('usage: mockslurm.py {{{0}}} [args]'.format(
+            ','.join(tools)), file=sys.stderr)
+        return 2
+    cmd, args = argv[0], argv[1:]
+    if cmd == 'install':
+        parser = argparse.ArgumentParser(prog='mockslurm.py install')
+        parser.add_argument('bindir', help='directory for the executables')
+        parser.add_argument('--statedir', help='mock Slurm state directory')
+        parser.add_argument('--nodes', type=int, default=4,
+                            help='number of nodes in the default partition')
+        parser.add_argument('--cpus-per-node', type=int, default=16)
+        parser.add_argument('--submit-latency', type=float, default=0.0)
+        parser.add_argument('--query-latency', type=float, default=0.0)
+        parser.add_argument('--submit-failure-rate', type=float, default=0.0)
+        parser.add_argument('--job-failure-rate', type=float, default=0.0)
+        parser.add_argument('--seed', type=int)
+        opts = parser.parse_args(args)
+        partitions = OrderedDict([
+            ('normal', OrderedDict([('nodes', opts.nodes),
+                                    ('cpus_per_node', opts.cpus_per_node),
+                                    ('max_time', '48:00:00')]))])
+        install(opts.bindir, opts.statedir, partitions=partitions,
+                submit_latency=opts.submit_latency,
+                query_latency=opts.query_latency,
+                submit_failure_rate=opts.submit_failure_rate,
+                job_failure_rate=opts.job_failure_rate,
+                seed=opts.seed)
+        return 0
+    if cmd == 'restd':
+        server = start_restd(args[0] if len(args) > 0 else
+                             'unix:' + os.path.join(MockSlurm().statedir,
+                                                    'slurmrestd.socket'))
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            server.shutdown()
+        return 0
+    m = MockSlurm()
+    if cmd == 'run':
+        # keep scheduling until all jobs have finished
+        interval = float(args[0]) if len(args) > 0 else 1.0
+        m.wait(interval=interval)
+        return 0
+    try:
+        out = getattr(m, cmd)(args)
+    except MockSlurmError as e:
+        print(str(e), file=sys.stderr)
+        return 1
+    sys.stdout.write(out)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
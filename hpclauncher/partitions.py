@@ -0,0 +1,196 @@
+"""
+Load-aware selection of the queue (partition) at submission time.
+
+The queue keyword of a job may be a list of candidate partitions in order
+of preference, e.g. queue: [normal, short]. At submission one partition is
+selected for each such job:
+
+1. the first candidate with enough idle nodes, according to one sinfo
+   snapshot taken for the whole submission. Selected jobs are subtracted
+   from the idle nodes of the snapshot, so a large batch spreads over the
+   candidates.
+2. otherwise the partition that Slurm estimates to start the job first,
+   from 'sbatch --test-only' with all candidates. Estimates are cached per
+   resource shape (candidates, nodes, processes, wall time) and at most
+   maxestimates calls are made per submission.
+3. otherwise the first candidate.
+
+Load information is only available for resourcemanager 'slurm', other
+resource managers use the first candidate.
+
+Cluster keywords:
+
+- sinfoexec: sinfo executable (default: 'sinfo' next to submitexec)
+"""
+from __future__ import absolute_import
+import time
+import subprocess
+from collections import OrderedDict
+
+from .clusterparameters import clusterparams
+from .instrumentation import metrics
+from .submission import _find_exec
+
+SINFO_FORMAT = '%R %a %F %c'
+
+# at most this many sbatch --test-only calls per submission
+DEFAULT_MAX_ESTIMATES = 32
+
+TEST_ONLY_TARGET = ' to start at '
+
+
+def get_candidates(j):
+    """
+    Returns the candidate partitions of a job, or None if queue is fixed.
+    """
+    queue = j['queue']
+    if isinstance(queue, (list, tuple)):
+        return [str(q) for q in queue]
+    return None
+
+
+def parse_sinfo(output):
+    """
+    Parses 'sinfo -h -o "%R %a %F %c"' output.
+
+    Returns OrderedDict of partition: (idle nodes, cpus per node).
+    """
+    state = OrderedDict()
+    for line in output.splitlines():
+        words = line.split()
+        if len(words) < 4:
+            continue
+        name, avail, counts, cpus = words[:4]
+        idle = int(counts.split('/')[1]) if avail == 'up' else 0
+        cpus = int(cpus.rstrip('+'))
+        if name in state:
+            # node groups with different configuration
+            old_idle, old_cpus = state[name]
+            state[name] = (old_idle + idle, min(old_cpus, cpus))
+        else:
+            state[name] = (idle, cpus)
+    return state
+
+
+def parse_test_only(output):
+    """
+    Parses 'sbatch --test-only' output.
+
+    Returns (partition, start time in seconds since epoch).
+    """
+    for line in output.splitlines():
+        if TEST_ONLY_TARGET not in line:
+            continue
+        words = line.split(TEST_ONLY_TARGET)[1].split()
+        start = time.mktime(time.strptime(words[0], '%Y-%m-%dT%H:%M:%S'))
+        return words[-1], start
+    raise Exception('Could not parse sbatch --test-only output')
+
+
+class PartitionSelector(object):
+    """
+    Selects partitions for jobs with one cached snapshot of partition
+    state.
+    """
+    def __init__(self, managertype=None, maxestimates=DEFAULT_MAX_ESTIMATES,
+                 verbose=False):
+        if managertype is None:
+            managertype = clusterparams['resourcemanager']
+        self.managertype = managertype
+        self.maxestimates = maxestimates
+        self.verbose = verbose
+        self.state = None
+        self.estimates = {}
+
+    def get_state(self):
+        """
+        Returns the partition snapshot, querying sinfo on first call.
+        """
+        if self.state is None:
+            sinfo = clusterparams['sinfoexec'] or _find_exec('sinfo')
+            call = [sinfo, '-h', '-o', SINFO_FORMAT]
+            try:
+                with metrics.timed('sinfo_call'):
+                    output = subprocess.check_output(call)
+                self.state = parse_sinfo(output.decode('utf-8'))
+            except (OSError, subprocess.CalledProcessError) as e:
+                print('partition state not available: {0}'.format(e))
+                self.state = OrderedDict()
+        return self.state
+
+    def estimate(self, candidates, nnode, nproc, walltime):
+        """
+        Returns the partition where the job is estimated to start first, or
+        None if not known.
+        """
+        key = (tuple(candidates), nnode, nproc, walltime)
+        if key in self.estimates:
+            return self.estimates[key]
+        if len(self.estimates) >= self.maxestimates:
+            return None
+        call = [clusterparams['submitexec'] or 'sbatch', '--test-only',
+                '-p', ','.join(candidates), '-N', str(nnode),
+                '-n', str(nproc)]
+        if walltime is not None:
+            call += ['-t', walltime]
+        call += ['--wrap', 'true']
+        try:
+            with metrics.timed('test_only_call'):
+                output = subprocess.check_output(call,
+                                                 stderr=subprocess.STDOUT)
+            partition = parse_test_only(output.decode('utf-8'))[0]
+        except Exception as e:
+            if self.verbose:
+                print('start estimate failed: {0}'.format(e))
+            partition = None
+        self.estimates[key] = partition
+        return partition
+
+    def select(self, j):
+        """
+        Sets the queue of a job with candidate partitions.
+
+        Returns the selected partition.
+        """
+        candidates = get_candidates(j)
+        if candidates is None:
+            return j['queue']
+        if len(candidates) == 0:
+            raise Exception('empty queue list in job: ' + j['jobname'])
+        selected = candidates[0]
+        if self.managertype == 'slurm':
+            selected = self._select_slurm(j, candidates) or selected
+        if self.verbose:
+            print('selected partition {0} for {1}'.format(selected,
+                                                          j['jobname']))
+        j.kwargs['queue'] = selected
+        return selected
+
+    def _select_slurm(self, j, candidates):
+        state = self.get_state()
+        nproc = int(j['nproc'])
+        for p in candidates:
+            if p not in state:
+                continue
+            idle, cpus = state[p]
+            needed = max(int(j['nnode'] or 1), -(-nproc//max(cpus, 1)))
+            if idle >= needed:
+                state[p] = (idle - needed, cpus)
+                return p
+        partition = self.estimate(candidates, int(j['nnode'] or 1), nproc,
+                                  j.get_resources()['walltime'])
+        if partition in candidates:
+            return partition
+        return None
+
+
+def select_partitions(job_list, verbose=False):
+    """
+    Selects the partition of all jobs that have a list of candidates.
+    """
+    jobs = [j for j in job_list if get_candidates(j) is not None]
+    if len(jobs) == 0:
+        return
+    selector = PartitionSelector(verbose=verbose)
+    for j in jobs:
+        selector.select(j)
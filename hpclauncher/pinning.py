@@ -0,0 +1,108 @@
+"""
+Core and NUMA aware pinning of threaded tasks.
+
+Cores of a node are divided among the threaded tasks of a job, each task
+taking nthread cores. Tasks are kept within one socket whenever they fit.
+Cores are assumed to be numbered contiguously within each socket.
+
+Cluster keywords:
+
+- ncoresnode: number of cores in a node
+- ncoressocket: number of cores in a socket (NUMA domain)
+
+Job keywords:
+
+- pinning: 'taskset', 'numactl' or 'tags'. With 'tags' tasks are not bound,
+  only the {cpulist} and {numanodes} tags and OpenMP variables are set, e.g.
+  for launcher binding flags in mpiexec.
+"""
+from __future__ import absolute_import
+import shlex
+
+PINNING_METHODS = ['taskset', 'numactl', 'tags']
+
+
+def allocate_cores(nthreads, ncoresnode, ncoressocket=None):
+    """
+    Assigns cores to tasks.
+
+    nthreads is a list of number of threads of each task. Returns a list of
+    core id lists. Each task is placed in the socket with most free cores if
+    it fits there. If there are not enough free cores, allocation starts over
+    and cores are shared.
+    """
+    ncoresnode = int(ncoresnode)
+    if ncoressocket is None:
+        ncoressocket = ncoresnode
+    ncoressocket = int(ncoressocket)
+    nsockets = max(1, ncoresnode//ncoressocket)
+
+    def all_free():
+        return [list(range(s*ncoressocket, min((s + 1)*ncoressocket,
+                                                ncoresnode)))
+                for s in range(nsockets)]
+    free = all_free()
+    allocation = []
+    for n in nthreads:
+        n = max(1, min(int(n), ncoresnode))
+        if sum(len(f) for f in free) < n:
+            free = all_free()
+        fits = [s for s in range(nsockets) if len(free[s]) >= n]
+        if len(fits) > 0:
+            s = max(fits, key=lambda s: len(free[s]))
+            cores = free[s][:n]
+            free[s] = free[s][n:]
+        else:
+            # span sockets
+            cores = []
+            for s in range(nsockets):
+                take = free[s][:n - len(cores)]
+                cores += take
+                free[s] = free[s][len(take):]
+        allocation.append(cores)
+    return allocation
+
+
+def get_numa_nodes(cores, ncoressocket):
+    """
+    Returns sorted list of NUMA nodes (sockets) that the cores belong to.
+    """
+    return sorted(set([c//int(ncoressocket) for c in cores]))
+
+
+def format_cpulist(ids):
+    """
+    Formats a list of integers as a cpu list, e.g. '0-3,8,10-11'.
+    """
+    ids = sorted(ids)
+    ranges = []
+    start = prev = ids[0]
+    for i in ids[1:] + [None]:
+        if i is not None and i == prev + 1:
+            prev = i
+            continue
+        if start == prev:
+            ranges.append(str(start))
+        else:
+            ranges.append('{0}-{1}'.format(start, prev))
+        if i is not None:
+            start = prev = i
+    return ','.join(ranges)
+
+
+def wrap_command(cmd, cpulist, numanodes, nthread, method='taskset'):
+    """
+    Wraps a bash command to run on the given cores with OpenMP environment.
+    """
+    env = 'OMP_NUM_THREADS={0} OMP_PLACES=cores OMP_PROC_BIND=close'.format(
+        nthread)
+    if method == 'tags':
+        return '{0} bash -c {1}'.format(env, shlex.quote(cmd))
+    if method == 'taskset':
+        binder = 'taskset -c {0}'.format(cpulist)
+    elif method == 'numactl':
+        binder = 'numactl --physcpubind={0} --membind={1}'.format(cpulist,
+                                                                   numanodes)
+    else:
+        raise Exception('unknown pinning method: ' + str(method))
+    return '{0} {1} bash -c {2}'.format(env, binder, shlex.quote(cmd))
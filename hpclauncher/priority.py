@@ -0,0 +1,112 @@
+"""
+Critical path first ordering of job submissions.
+
+For each job the length of the longest remaining dependency path to a sink
+is computed from the requested wall times. Jobs are submitted in order of
+decreasing path length, parents always before their children, so that the
+jobs that determine the makespan start accruing queue age first.
+Optionally a nice value is set for each job so that jobs off the critical
+path get lower priority. The scriptpattern must contain a '{nice}' tag,
+e.g. '#SBATCH --nice={nice}'.
+
+Usage:
+
+    submit_jobs(jobs, critical_path=True, nice=100)
+"""
+from __future__ import absolute_import
+import heapq
+from collections import OrderedDict
+
+from . import job
+
+
+def get_children(job_list):
+    """
+    Returns an OrderedDict of jobname: list of child job names.
+
+    Only dependencies between the given jobs are included.
+    """
+    children = OrderedDict([(j['jobname'], []) for j in job_list])
+    for j in job_list:
+        for p in job.get_parents(j):
+            if p in children:
+                children[p].append(j['jobname'])
+    return children
+
+
+def get_path_lengths(job_list):
+    """
+    Returns an OrderedDict of jobname: longest path to a sink in seconds.
+
+    The path length includes the wall time of the job itself. Jobs without
+    a wall time count as zero.
+    """
+    children = get_children(job_list)
+    walltime = dict((j['jobname'], j.get_walltime() or 0) for j in job_list)
+    lengths = OrderedDict()
+    for name in children:
+        # iterative depth first search, children before parents
+        stack = [(name, False)]
+        visiting = set()
+        while len(stack) > 0:
+            n, expanded = stack.pop()
+            if n in lengths:
+                continue
+            if expanded:
+                visiting.discard(n)
+                lengths[n] = walltime[n] + max(
+                    [lengths[c] for c in children[n]] + [0])
+                continue
+            if n in visiting:
+                raise Exception('dependency cycle at job: ' + n)
+            visiting.add(n)
+            stack.append((n, True))
+            stack.extend((c, False) for c in children[n]
+                         if c not in lengths)
+    return OrderedDict((n, lengths[n]) for n in children)
+
+
+def order_by_critical_path(job_list, lengths=None):
+    """
+    Returns jobs sorted by decreasing path length, parents first.
+
+    Ties are kept in the original order.
+    """
+    if lengths is None:
+        lengths = get_path_lengths(job_list)
+    children = get_children(job_list)
+    index = dict((j['jobname'], i) for i, j in enumerate(job_list))
+    nparents = dict((n, 0) for n in children)
+    for kids in children.values():
+        for c in kids:
+            nparents[c] += 1
+    ready = [(-lengths[n], index[n]) for n in children if nparents[n] == 0]
+    heapq.heapify(ready)
+    ordered = []
+    while len(ready) > 0:
+        _, i = heapq.heappop(ready)
+        j = job_list[i]
+        ordered.append(j)
+        for c in children[j['jobname']]:
+            nparents[c] -= 1
+            if nparents[c] == 0:
+                heapq.heappush(ready, (-lengths[c], index[c]))
+    if len(ordered) != len(job_list):
+        raise Exception('dependency cycle in job list')
+    return ordered
+
+
+def set_nice_values(job_list, maxnice, lengths=None):
+    """
+    Sets 'nice' keyword of jobs between 0 (critical path) and maxnice.
+    """
+    if lengths is None:
+        lengths = get_path_lengths(job_list)
+    longest = max(list(lengths.values()) + [0])
+    for j in job_list:
+        if longest == 0:
+            nice = 0
+        else:
+            nice = int(round(maxnice*(1.0 - float(lengths[j['jobname']]) /
+                                      longest)))
+        j.kwargs['nice'] = nice
@@ -0,0 +1,279 @@
+"""
+Python-callable tasks run by a pool of persistent worker processes.
+
+A task can be given as a python function, 'package.module:function', with
+positional (funcargs) and keyword (funckwargs) arguments instead of a bash
+command. String arguments may contain tags, e.g. '{rundir}'.
+
+If a job has python tasks, the job script starts a pool of long-lived
+python worker processes before the tasks. The python task lines in the
+script send the task to the pool and wait for its exit status, so threaded
+and sequential tasks behave like bash tasks, but modules are imported once
+per worker instead of once per task. The pool runs on the node that
+executes the job script and is stopped when the script exits.
+
+The exit status of a task is the return value of the function if it is an
+integer, 1 if it raises an exception, and 0 otherwise. Output is appended
+to the task log file.
+
+Job keywords:
+
+- pyworkers: number of worker processes (default: number of cpus)
+- pythonexec: python executable (default 'python')
+
+Usage:
+
+    j.append_new_task(function='mypkg.post:extract', funcargs=['{rundir}'],
+                      funckwargs={'var': 'salt'}, logfile='log_extract')
+"""
+from __future__ import absolute_import, print_function
+import os
+import sys
+import json
+import errno
+import select
+import signal
+import argparse
+import importlib
+import threading
+import traceback
+import multiprocessing
+
+PROLOGUE_TEMPLATE = """# start python task workers
+_hpcl_pydir=$(mktemp -d {localscratch}/hpclauncher_py_XXXXXX)
+cat > $_hpcl_pydir/tasks.json <<'_HPCL_PYTASKS_EOF'
+{manifest}
+_HPCL_PYTASKS_EOF
+{pythonexec} -m hpclauncher pyworker -d $_hpcl_pydir -n {nworkers} -p $$ || exit 1
+_hpcl_pytask() {{
+    mkfifo $_hpcl_pydir/$1.ret
+    # log paths are relative to the directory of the task line
+    case "$2" in
+        /*|'') _hpcl_pylog=$2 ;;
+        *) _hpcl_pylog=$PWD/$2 ;;
+    esac
+    printf '%s\\t%s\\n' "$1" "$_hpcl_pylog" > $_hpcl_pydir/requests
+    read _hpcl_pyrc < $_hpcl_pydir/$1.ret
+    rm -f $_hpcl_pydir/$1.ret
+    return $_hpcl_pyrc
+}}
+_hpcl_stop_pyworkers() {{
+    if [ -f $_hpcl_pydir/pid ]; then
+        read _hpcl_pypid < $_hpcl_pydir/pid
+        kill $_hpcl_pypid 2> /dev/null
+        while kill -0 $_hpcl_pypid 2> /dev/null; do sleep 0.1; done
+    fi
+    rm -rf $_hpcl_pydir
+}}
+"""
+
+# name of the shell function that must be called at exit
+EXIT_HOOK = '_hpcl_stop_pyworkers'
+
+DEFAULT_LOCALSCRATCH = '${TMPDIR:-/tmp}'
+
+
+def format_arguments(task, d):
+    """
+    Returns the task spec with tags substituted in string arguments.
+    """
+    def fmt(v):
+        if isinstance(v, str):
+            # twice to allow tags in tags
+            return v.format(**d).format(**d)
+        return v
+    args = [fmt(a) for a in task.funcargs]
+    kwargs = dict((k, fmt(v)) for k, v in task.funckwargs.items())
+    return {'function': task.function, 'args': args, 'kwargs': kwargs}
+
+
+def get_task_command(index, logfile=None):
+    """
+    Returns the script line that runs python task index in the pool.
+    """
+    return '_hpcl_pytask {0:d} "{1}"'.format(index, logfile or '')
+
+
+def generate_prologue(specs, nworkers=None, pythonexec='python',
+                      localscratch=None):
+    """
+    Returns script lines that start the worker pool.
+
+    EXIT_HOOK must be called when the job script exits.
+    """
+    if localscratch is None:
+        localscratch = DEFAULT_LOCALSCRATCH
+    return PROLOGUE_TEMPLATE.format(
+        localscratch=localscratch,
+        manifest=json.dumps(specs),
+        pythonexec=pythonexec,
+        nworkers=int(nworkers or 0))
+
+
+def load_function(name):
+    """
+    Imports 'package.module:function'.
+    """
+    if ':' not in name:
+        raise Exception('python task must be module:function, got ' + name)
+    module, func = name.split(':', 1)
+    obj = importlib.import_module(module)
+    for attr in func.split('.'):
+        obj = getattr(obj, attr)
+    return obj
+
+
+def run_task(spec, logfile=None):
+    """
+    Runs a task spec in the current process. Returns the exit status.
+
+    Output is appended to logfile if given.
+    """
+    saved = None
+    if logfile:
+        sys.stdout.flush()
+        sys.stderr.flush()
+        fd = os.open(logfile, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        saved = (os.dup(1), os.dup(2))
+        os.dup2(fd, 1)
+        os.dup2(fd, 2)
+        os.close(fd)
+    try:
+        func = load_function(spec['function'])
+        result = func(*spec.get('args', []), **spec.get('kwargs', {}))
+        if isinstance(result, int) and not isinstance(result, bool):
+            rc = result
+        else:
+            rc = 0
+    except SystemExit as e:
+        rc = e.code if isinstance(e.code, int) else int(e.code is not None)
+    except BaseException:
+        traceback.print_exc()
+        rc = 1
+    finally:
+        sys.stdout.flush()
+        sys.stderr.flush()
+        if saved is not None:
+            os.dup2(saved[0], 1)
+            os.dup2(saved[1], 2)
+            os.close(saved[0])
+            os.close(saved[1])
+    return rc
+
+
+def _init_worker():
+    # the server handles termination
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+
+
+def _reply(path, rc):
+    # blocks until the task line opens the fifo for reading
+    with open(path, 'w') as f:
+        f.write('{0:d}\n'.format(rc))
+
+
+def _terminate(signum, frame):
+    raise SystemExit(0)
+
+
+def serve(taskdir, nworkers=None, parent=None):
+    """
+    Runs tasks requested through the taskdir/requests fifo until
+    terminated or until the parent process exits.
+    """
+    with open(os.path.join(taskdir, 'tasks.json')) as f:
+        specs = json.load(f)
+    pool = multiprocessing.get_context('fork').Pool(
+        nworkers or None, initializer=_init_worker)
+    signal.signal(signal.SIGTERM, _terminate)
+    # opened read-write so that there is no end of file between writers
+    fd = os.open(os.path.join(taskdir, 'requests'), os.O_RDWR)
+    buf = b''
+    try:
+        while True:
+            try:
+                ready, _, _ = select.select([fd], [], [], 1.0)
+            except (OSError, select.error) as e:
+                if getattr(e, 'errno', None) == errno.EINTR:
+                    continue
+                raise
+            if parent is not None and not _is_alive(parent):
+                break
+            if not ready:
+                continue
+            buf += os.read(fd, 65536)
+            lines = buf.split(b'\n')
+            buf = lines.pop()
+            for line in lines:
+                words = line.decode('utf-8').split('\t', 1)
+                index = int(words[0])
+                logfile = words[1] if len(words) > 1 else ''
+                ret = os.path.join(taskdir, '{0:d}.ret'.format(index))
+
+                def done(rc, ret=ret):
+                    t = threading.Thread(target=_reply, args=(ret, rc))
+                    t.daemon = True
+                    t.start()
+
+                def failed(e, done=done):
+                    print('python task failed: {0}'.format(e),
+                          file=sys.stderr)
+                    done(1)
+                pool.apply_async(run_task, (specs[index], logfile),
+                                 callback=done, error_callback=failed)
+    finally:
+        os.close(fd)
+        pool.terminate()
+
+
+def _is_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except OSError as e:
+        return e.errno == errno.EPERM
+    return True
+
+
+def start(taskdir, nworkers=None, parent=None):
+    """
+    Starts the pool server in the background and returns when it is ready.
+    """
+    os.mkfifo(os.path.join(taskdir, 'requests'))
+    rfd, wfd = os.pipe()
+    pid = os.fork()
+    if pid > 0:
+        os.close(wfd)
+        # wait until the server is up
+        ok = os.read(rfd, 1)
+        os.close(rfd)
+        return 0 if ok == b'1' else 1
+    os.close(rfd)
+    try:
+        # do not read the stdin of the job script
+        devnull = os.open(os.devnull, os.O_RDONLY)
+        os.dup2(devnull, 0)
+        os.close(devnull)
+        with open(os.path.join(taskdir, 'pid'), 'w') as f:
+            f.write('{0:d}\n'.format(os.getpid()))
+        os.write(wfd, b'1')
+        os.close(wfd)
+        serve(taskdir, nworkers, parent)
+    except Exception:
+        traceback.print_exc()
+    finally:
+        os._exit(0)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m hpclauncher pyworker',
+        description='Starts a pool of python task workers')
+    parser.add_argument('-d', '--taskdir', required=True,
+                        help='directory with tasks.json')
+    parser.add_argument('-n', '--nworkers', type=int, default=0,
+                        help='number of workers, 0 for number of cpus')
+    parser.add_argument('-p', '--parent', type=int,
+                        help='stop when this process exits')
+    args = parser.parse_args(argv)
+    return start(args.taskdir, args.nworkers, args.parent)
@@ -0,0 +1,173 @@
+"""
+Rendering of job scripts to a directory for review and later submission.
+
+All job scripts are written to a directory together with a manifest file
+(manifest.json) that lists, in submission order, the job names, script
+files, sha1 hashes of the scripts, requested resources and dependencies.
+Scripts are rendered in parallel processes, each process writing a batch of
+files.
+
+Job ids of parent jobs are not known at render time. Dependency values in
+the scripts are replaced by placeholders, e.g. '@HPCL_PARENTJOBOK@', that
+are substituted when the jobs are submitted from the manifest. Scripts are
+not parsed or rendered again.
+
+Usage:
+
+    manifest = render_jobs(jobs, 'scripts')
+    # review scripts/*.sub
+    run = submit_manifest(manifest)
+
+Relative rundirs are stored as absolute paths. Task log directories and
+snapshots are created at render time, as when submitting.
+"""
+from __future__ import absolute_import
+import os
+import json
+import hashlib
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+from .clusterparameters import clusterparams
+from . import job
+
+MANIFEST_FILE = 'manifest.json'
+
+PLACEHOLDER = '@HPCL_{0}@'
+
+# jobs rendered and written by a process at a time
+DEFAULT_BATCHSIZE = 64
+
+
+def get_script_file(jobname):
+    return 'batch_{0}.sub'.format(jobname)
+
+
+def _render_batch(args):
+    """
+    Renders a batch of jobs and writes the scripts to outdir.
+
+    Returns list of (jobname, script, sha1) tuples.
+    """
+    job_list, outdir = args
+    result = []
+    for j in job_list:
+        content = j.generate_script()
+        script = get_script_file(j['jobname'])
+        with open(os.path.join(outdir, script), 'w') as f:
+            f.write(content)
+        sha1 = hashlib.sha1(content.encode('utf-8')).hexdigest()
+        result.append((j['jobname'], script, sha1))
+    return result
+
+
+def render_scripts(job_list, outdir, workers=None, batchsize=None,
+                   verbose=False):
+    """
+    Renders the scripts of the given jobs to outdir and writes the manifest.
+
+    Jobs must be in submission order, parents first. Returns the path of
+    the manifest file.
+    """
+    if not os.path.isdir(outdir):
+        os.makedirs(outdir)
+    names = set(j['jobname'] for j in job_list)
+    entries = []
+    for j in job_list:
+        deps = OrderedDict()
+        for tag in job.PARENT_TAGS:
+            parents = job.get_parents(j, tag)
+            if any(p in names for p in parents):
+                # filled in with the job ids at submission
+                deps[tag] = j[tag]
+                j.kwargs[tag] = PLACEHOLDER.format(tag.upper())
+            elif len(parents) > 0:
+                j.kwargs[tag] = job.format_dependency(parents)
+        rundir = j['rundir']
+        if rundir is not None:
+            rundir = os.path.abspath(rundir)
+        entries.append(OrderedDict([
+            ('jobname', j['jobname']),
+            ('resources', j.get_resources()),
+            ('dependencies', deps),
+            ('members', [m['jobname'] for m in getattr(j, 'members', [])]),
+            ('rundir', rundir),
+            ('logfile', j['logfile']),
+            ('sentineldir', j['sentineldir']),
+        ]))
+    if batchsize is None:
+        batchsize = DEFAULT_BATCHSIZE
+    batches = [(job_list[i:i + batchsize], outdir)
+               for i in range(0, len(job_list), batchsize)]
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers == 1 or len(batches) < 2:
+        results = [_render_batch(b) for b in batches]
+    else:
+        # forked workers inherit the cluster parameters
+        context = multiprocessing.get_context('fork')
+        with ProcessPoolExecutor(max_workers=workers,
+                                 mp_context=context) as pool:
+            results = list(pool.map(_render_batch, batches))
+    rendered = [r for batch in results for r in batch]
+    for e, (name, script, sha1) in zip(entries, rendered):
+        e['script'] = script
+        e['sha1'] = sha1
+    manifest = OrderedDict([
+        ('resourcemanager', clusterparams['resourcemanager']),
+        ('jobs', entries),
+    ])
+    manifestfile = os.path.join(outdir, MANIFEST_FILE)
+    with open(manifestfile, 'w') as f:
+        json.dump(manifest, f, indent=1)
+    if verbose:
+        print('rendered {0:d} jobs to {1}'.format(len(entries), outdir))
+    return manifestfile
+
+
+class RenderedJob(object):
+    """
+    A job whose script has been rendered to a file.
+
+    Behaves like a BatchJob in submission: generate_script returns the
+    stored script with dependency placeholders substituted from kwargs.
+    """
+    def __init__(self, entry, scriptdir):
+        self.entry = entry
+        self.scriptfile = os.path.join(scriptdir, entry['script'])
+        self.kwargs = {
+            'jobname': entry['jobname'],
+            'rundir': entry['rundir'],
+            'logfile': entry['logfile'],
+            'sentineldir': entry['sentineldir'],
+        }
+        self.kwargs.update(entry['dependencies'])
+        self.members = [{'jobname': m} for m in entry['members']]
+
+    def __getitem__(self, key):
+        return self.kwargs.get(key)
+
+    def get_resources(self):
+        return self.entry['resources']
+
+    def generate_script(self):
+        with open(self.scriptfile) as f:
+            content = f.read()
+        for tag in self.entry['dependencies']:
+            content = content.replace(PLACEHOLDER.format(tag.upper()),
+                                      str(self.kwargs[tag]))
+        return content
+
+
+def read_manifest(manifestfile):
+    """
+    Returns the jobs of a manifest as a list of RenderedJob objects.
+    """
+    with open(manifestfile) as f:
+        manifest = json.load(f, object_pairs_hook=OrderedDict)
+    if manifest['resourcemanager'] != clusterparams['resourcemanager']:
+        raise Exception('manifest was rendered for resourcemanager: ' +
+                        str(manifest['resourcemanager']))
+    scriptdir = os.path.dirname(os.path.abspath(manifestfile))
+    return [RenderedJob(e, scriptdir) for e in manifest['jobs']]
@@ -0,0 +1,198 @@
+"""
+Queue wait and makespan report of a submitted run.
+
+The job names, ids, dependencies and requested resources of a run are
+stored in the SubmittedRun object (see submitYAMLJob.py -s). The report
+queries the scheduler accounting for all jobs of the run with one sacct
+call and computes for each job:
+
+- submit, start, end: times as 'YYYY-MM-DDTHH:MM:SS'
+- dependency_wait: time from submission until the last parent finished
+- queue_wait: time from eligibility (submission or end of the last parent)
+  until start
+- elapsed, walltime: used and requested wall time in seconds
+- utilization: elapsed/walltime
+- critical: True if the job is on the realized critical path, i.e. the
+  chain of jobs that gated the end of the last job
+
+Usage:
+
+    run = SubmittedRun.load('myrun.json')
+    rows, summary = generate_report(run)
+    write_csv(rows, 'report.csv')
+    write_json(rows, summary, 'report.json')
+
+Only Slurm accounting is supported.
+"""
+from __future__ import absolute_import
+import csv
+import json
+import time
+import subprocess
+from collections import OrderedDict
+
+from .clusterparameters import clusterparams
+from .submission import _find_exec
+from . import job
+
+SACCT_FIELDS = ['JobID', 'JobName', 'State', 'ExitCode', 'Submit', 'Start',
+                'End', 'ElapsedRaw']
+
+COLUMNS = ['jobname', 'jobid', 'state', 'exitcode', 'parents', 'queue',
+           'nproc', 'nnode', 'submit', 'start', 'end', 'dependency_wait',
+           'queue_wait', 'elapsed', 'walltime', 'utilization', 'critical']
+
+TIME_FORMAT = '%Y-%m-%dT%H:%M:%S'
+
+
+def parse_timestamp(s):
+    """
+    Parses a sacct timestamp to seconds since epoch, None if not set.
+    """
+    if s in [None, '', 'Unknown', 'None']:
+        return None
+    return time.mktime(time.strptime(s, TIME_FORMAT))
+
+
+def format_timestamp(t):
+    if t is None:
+        return None
+    return time.strftime(TIME_FORMAT, time.localtime(t))
+
+
+def query_sacct(jobids, sacctexec=None):
+    """
+    Returns OrderedDict of jobid: dict of SACCT_FIELDS from one sacct call.
+    """
+    jobids = [str(i) for i in jobids if i is not None and str(i) != '0']
+    if len(jobids) == 0:
+        return OrderedDict()
+    if sacctexec is None:
+        sacctexec = clusterparams['sacctexec'] or _find_exec('sacct')
+    call = [sacctexec, '-X', '-P', '-n', '-j', ','.join(jobids),
+            '--format=' + ','.join(SACCT_FIELDS)]
+    output = subprocess.check_output(call).decode('utf-8')
+    records = OrderedDict()
+    for line in output.splitlines():
+        words = line.split('|')
+        if len(words) != len(SACCT_FIELDS):
+            continue
+        records[words[0]] = OrderedDict(zip(SACCT_FIELDS, words))
+    return records
+
+
+def get_critical_path(ends, parents):
+    """
+    Returns the names of the jobs on the realized critical path.
+
+    The path starts from the job that ended last and follows the parent
+    that ended last.
+    """
+    finished = [n for n in ends if ends[n] is not None]
+    if len(finished) == 0:
+        return []
+    name = max(finished, key=lambda n: ends[n])
+    path = []
+    while name is not None and name not in path:
+        path.append(name)
+        candidates = [p for p in parents[name] if ends.get(p) is not None]
+        name = max(candidates, key=lambda n: ends[n]) if candidates else None
+    return path[::-1]
+
+
+def generate_report(run, records=None):
+    """
+    Returns (rows, summary) for the jobs of a SubmittedRun.
+
+    rows is a list of OrderedDicts with keys COLUMNS. summary contains the
+    makespan, critical path and total waiting and used times. records are
+    sacct records, see query_sacct; queried if not given.
+    """
+    if records is None:
+        records = query_sacct(run.get_job_ids())
+    parents = OrderedDict()
+    times = OrderedDict()
+    for name, j in run.jobs.items():
+        parents[name] = [run.resolve(p) for p in j['parents']
+                         if run.resolve(p) in run.jobs]
+        r = records.get(str(j['jobid']), {})
+        times[name] = [parse_timestamp(r.get(k))
+                       for k in ['Submit', 'Start', 'End']]
+    ends = OrderedDict((n, t[2]) for n, t in times.items())
+    critical = get_critical_path(ends, parents)
+    rows = []
+    for name, j in run.jobs.items():
+        r = records.get(str(j['jobid']), {})
+        submit, start, end = times[name]
+        resources = j.get('resources', {})
+        parent_end = [ends[p] for p in parents[name] if ends[p] is not None]
+        eligible = submit
+        dep_wait = None
+        if submit is not None:
+            eligible = max([submit] + parent_end)
+            dep_wait = eligible - submit
+        queue_wait = None
+        if start is not None and eligible is not None:
+            queue_wait = max(0, start - eligible)
+        elapsed = int(r['ElapsedRaw']) if r.get('ElapsedRaw') else None
+        walltime = job.to_seconds(resources.get('walltime'))
+        utilization = None
+        if elapsed is not None and walltime:
+            utilization = round(float(elapsed)/walltime, 3)
+        rows.append(OrderedDict([
+            ('jobname', name),
+            ('jobid', j['jobid']),
+            ('state', r.get('State')),
+            ('exitcode', r.get('ExitCode')),
+            ('parents', ' '.join(parents[name])),
+            ('queue', resources.get('queue')),
+            ('nproc', resources.get('nproc')),
+            ('nnode', resources.get('nnode')),
+            ('submit', format_timestamp(submit)),
+            ('start', format_timestamp(start)),
+            ('end', format_timestamp(end)),
+            ('dependency_wait', dep_wait),
+            ('queue_wait', queue_wait),
+            ('elapsed', elapsed),
+            ('walltime', walltime),
+            ('utilization', utilization),
+            ('critical', name in critical),
+        ]))
+    submits = [t[0] for t in times.values() if t[0] is not None]
+    finished = [e for e in ends.values() if e is not None]
+    makespan = None
+    if len(submits) > 0 and len(finished) > 0:
+        makespan = max(finished) - min(submits)
+
+    def total(key):
+        return sum(row[key] for row in rows if row[key] is not None)
+    summary = OrderedDict([
+        ('njobs', len(rows)),
+        ('makespan', makespan),
+        ('critical_path', critical),
+        ('queue_wait', total('queue_wait')),
+        ('dependency_wait', total('dependency_wait')),
+        ('elapsed', total('elapsed')),
+        ('walltime', total('walltime')),
+    ])
+    return rows, summary
+
+
+def write_csv(rows, filename):
+    """
+    Writes report rows in a CSV file.
+    """
+    with open(filename, 'w') as f:
+        writer = csv.writer(f)
+        writer.writerow(COLUMNS)
+        for r in rows:
+            writer.writerow(['' if r[c] is None else r[c] for c in COLUMNS])
+
+
+def write_json(rows, summary, filename):
+    """
+    Writes report rows and summary in a json file.
+    """
+    with open(filename, 'w') as f:
+        json.dump(OrderedDict([('summary', summary), ('jobs', rows)]), f,
+                  indent=2)
@@ -0,0 +1,281 @@
+"""
+Sentinel files that mark the completion of jobs and tasks.
+
+If sentineldir is set, the job script writes a sentinel file for each task
+when it finishes and one for the job when the script exits, also when the
+job is terminated. Sentinels are written atomically (write and rename) and
+contain the status and exit code, e.g. 'FAILED 3'.
+
+    <sentineldir>/<jobname>.<taskname>.task
+    <sentineldir>/<jobname>.job
+
+Relative sentineldir is interpreted with respect to rundir. Completion can
+be awaited without polling the scheduler or the log files:
+
+    status = wait_for_jobs(['job1', 'job2'], '/scratch/me/sentinels')
+    # {'job1': ('COMPLETED', 0), 'job2': ('FAILED', 3)}
+
+The waiter uses inotify on Linux and falls back to periodic directory scans
+(one listing per directory, regardless of the number of files) elsewhere.
+
+Job keywords:
+
+- sentineldir: directory of sentinel files
+"""
+from __future__ import absolute_import
+import os
+import sys
+import time
+import errno
+import glob
+import select
+import struct
+import ctypes
+import ctypes.util
+from collections import OrderedDict
+
+PROLOGUE_TEMPLATE = """# write sentinel files at task and job end
+_hpcl_sentineldir={sentineldir}
+mkdir -p $_hpcl_sentineldir
+_hpcl_write_sentinel() {{
+    if [ $2 -eq 0 ]; then _hpcl_st=COMPLETED; else _hpcl_st=FAILED; fi
+    echo "$_hpcl_st $2" > $1.tmp.$BASHPID && mv -f $1.tmp.$BASHPID $1
+}}
+_hpcl_task_done() {{
+    _hpcl_write_sentinel $_hpcl_sentineldir/{jobname}.$1.task $2
+}}
+_hpcl_job_done() {{
+    _hpcl_rc=$_hpcl_status
+    if [ $_hpcl_rc -eq 0 ]; then
+        for _hpcl_f in $_hpcl_sentineldir/{jobname}.*.task; do
+            [ -f $_hpcl_f ] || continue
+            read _hpcl_st _hpcl_code < $_hpcl_f
+            if [ "$_hpcl_code" != 0 ]; then _hpcl_rc=$_hpcl_code; break; fi
+        done
+    fi
+    _hpcl_write_sentinel $_hpcl_sentineldir/{jobname}.job $_hpcl_rc
+}}
+"""
+
+# name of the shell function that must be called at exit
+EXIT_HOOK = '_hpcl_job_done'
+
+# inotify event masks, see inotify(7)
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_NONBLOCK = 0o4000
+_EVENT_HEADER = struct.Struct('iIII')
+
+DEFAULT_SCAN_INTERVAL = 1.0
+
+
+def get_job_sentinel(jobname, sentineldir):
+    return os.path.join(sentineldir, '{0}.job'.format(jobname))
+
+
+def get_task_sentinel(jobname, taskname, sentineldir):
+    return os.path.join(sentineldir, '{0}.{1}.task'.format(jobname, taskname))
+
+
+def clear(jobname, sentineldir):
+    """
+    Removes sentinels of a previous run of the job.
+    """
+    files = glob.glob(os.path.join(sentineldir, '{0}.*.task'.format(jobname)))
+    files.append(get_job_sentinel(jobname, sentineldir))
+    for f in files:
+        if os.path.isfile(f):
+            os.remove(f)
+
+
+def generate_prologue(jobname, sentineldir):
+    """
+    Returns script lines that define the sentinel shell functions.
+
+    EXIT_HOOK must be called when the job script exits.
+    """
+    return PROLOGUE_TEMPLATE.format(jobname=jobname, sentineldir=sentineldir)
+
+
+def wrap_command(cmd, taskname):
+    """
+    Wraps a bash command to write the task sentinel when it finishes.
+    """
+    return '{{ {0}\n_hpcl_task_done {1} $?; }}'.format(cmd, taskname)
+
+
+def read_sentinel(path):
+    """
+    Returns (status, exitcode) stored in a sentinel file.
+    """
+    with open(path) as f:
+        words = f.read().split()
+    return words[0], int(words[1])
+
+
+def _load_libc():
+    """
+    Returns libc with inotify functions, or None if not supported.
+    """
+    if not sys.platform.startswith('linux'):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6',
+                           use_errno=True)
+        libc.inotify_init1
+        libc.inotify_add_watch
+    except (OSError, AttributeError):
+        return None
+    return libc
+
+
+class SentinelWaiter(object):
+    """
+    Waits for sentinel files to appear.
+
+    Files are grouped by directory. With inotify one watch is added per
+    directory and the waiter sleeps until files are renamed into it, or at
+    most scan_interval seconds after which the directories are listed in
+    case an event was missed. Without inotify directories are listed every
+    scan_interval seconds.
+    """
+    def __init__(self, use_inotify=True, scan_interval=DEFAULT_SCAN_INTERVAL):
+        self.libc = _load_libc() if use_inotify else None
+        self.scan_interval = scan_interval
+
+    @property
+    def uses_inotify(self):
+        return self.libc is not None
+
+    def _scan(self, pending, done):
+        """
+        Lists each directory once and collects finished sentinels.
+        """
+        for d in list(pending.keys()):
+            try:
+                present = set(os.listdir(d))
+            except OSError:
+                continue
+            found = pending[d] & present
+            for name in found:
+                path = os.path.join(d, name)
+                done[path] = read_sentinel(path)
+            pending[d] -= found
+            if len(pending[d]) == 0:
+                del pending[d]
+
+    def _open_inotify(self, dirs):
+        fd = self.libc.inotify_init1(IN_NONBLOCK)
+        if fd < 0:
+            return None, {}
+        watches = {}
+        for d in dirs:
+            wd = self.libc.inotify_add_watch(
+                fd, d.encode(), IN_MOVED_TO | IN_CLOSE_WRITE | IN_CREATE)
+            if wd < 0:
+                os.close(fd)
+                return None, {}
+            watches[wd] = d
+        return fd, watches
+
+    def _read_events(self, fd, watches, pending, done):
+        try:
+            buf = os.read(fd, 65536)
+        except OSError as e:
+            if e.errno == errno.EAGAIN:
+                return
+            raise
+        i = 0
+        while i + _EVENT_HEADER.size <= len(buf):
+            wd, mask, cookie, length = _EVENT_HEADER.unpack_from(buf, i)
+            i += _EVENT_HEADER.size
+            name = buf[i:i + length].rstrip(b'\0').decode()
+            i += length
+            d = watches.get(wd)
+            if d in pending and name in pending[d]:
+                path = os.path.join(d, name)
+                if mask & IN_CREATE and not mask & IN_MOVED_TO:
+                    # written in place, wait for IN_CLOSE_WRITE
+                    continue
+                done[path] = read_sentinel(path)
+                pending[d].discard(name)
+                if len(pending[d]) == 0:
+                    del pending[d]
+
+    def wait(self, paths, timeout=None, callback=None):
+        """
+        Waits until all given sentinel files exist.
+
+        callback(path, status, exitcode) is called for each file as soon as
+        it appears. Returns an OrderedDict of path: (status, exitcode). On
+        timeout, unfinished files are omitted.
+        """
+        original = OrderedDict([(os.path.abspath(p), p) for p in paths])
+        pending = OrderedDict()
+        for p in original:
+            d, name = os.path.split(p)
+            pending.setdefault(d, set()).add(name)
+        for d in pending:
+            if not os.path.isdir(d):
+                os.makedirs(d)
+        deadline = None if timeout is None else time.time() + timeout
+        done = OrderedDict()
+        reported = set()
+
+        def report():
+            for path in done:
+                if path not in reported:
+                    reported.add(path)
+                    if callback is not None:
+                        callback(original[path], *done[path])
+
+        fd, watches = None, {}
+        if self.libc is not None:
+            fd, watches = self._open_inotify(list(pending.keys()))
+        try:
+            # files that were written before the watches were added
+            self._scan(pending, done)
+            report()
+            while len(pending) > 0:
+                wait = self.scan_interval
+                if deadline is not None:
+                    wait = min(wait, deadline - time.time())
+                    if wait <= 0:
+                        break
+                if fd is not None:
+                    # rescan on timeout in case an event was missed, e.g.
+                    # on NFS or after an event queue overflow
+                    r, _, _ = select.select([fd], [], [], wait)
+                    if r:
+                        self._read_events(fd, watches, pending, done)
+                    else:
+                        self._scan(pending, done)
+                else:
+                    time.sleep(wait)
+                    self._scan(pending, done)
+                report()
+        finally:
+            if fd is not None:
+                os.close(fd)
+        return OrderedDict([(p, done[a]) for a, p in original.items()
+                            if a in done])
+
+
+def wait_for_jobs(jobnames, sentineldir, timeout=None, callback=None,
+                  use_inotify=True):
+    """
+    Waits until the given jobs have finished.
+
+    callback(jobname, status, exitcode) is called for each job as soon as it
+    finishes. Returns an OrderedDict of jobname: (status, exitcode).
+    """
+    if not isinstance(jobnames, (list, tuple)):
+        jobnames = [jobnames]
+    paths = OrderedDict([(get_job_sentinel(n, sentineldir), n)
+                         for n in jobnames])
+    cb = None if callback is None else \
+        lambda path, status, exitcode: callback(paths[path], status, exitcode)
+    waiter = SentinelWaiter(use_inotify=use_inotify)
+    done = waiter.wait(list(paths.keys()), timeout=timeout, callback=cb)
+    return OrderedDict([(paths[p], s) for p, s in done.items()])
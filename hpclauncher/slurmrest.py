@@ -0,0 +1,302 @@
+"""
+Submission of batch jobs through the Slurm REST API (slurmrestd).
+
+With resourcemanager 'slurmrest' job scripts are posted to slurmrestd instead
+of calling sbatch. #SBATCH directives of the script header are converted to
+job description fields. Connections are kept alive and pooled, and
+independent jobs are submitted concurrently.
+
+Cluster keywords:
+
+- submitexec: slurmrestd address, e.g. 'https://login1:6820' or
+  'unix:///run/slurmrestd/slurmrestd.socket'
+- resourcemanager: 'slurmrest'
+- restapiversion: API version (default 'v0.0.39')
+- restuser: user name (default $USER)
+- resttoken: JWT token (default $SLURM_JWT)
+- restconnections: number of concurrent connections (default 8)
+"""
+from __future__ import absolute_import
+import os
+import json
+import shlex
+import socket
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import http.client as httplib
+from urllib.parse import urlparse
+
+DEFAULT_API_VERSION = 'v0.0.39'
+DEFAULT_CONNECTIONS = 8
+
+# sbatch options and the corresponding job description fields
+SBATCH_FIELDS = [
+    # (short option, long option, field)
+    ('-J', '--job-name', 'name'),
+    ('-o', '--output', 'standard_output'),
+    ('-e', '--error', 'standard_error'),
+    ('-N', '--nodes', 'minimum_nodes'),
+    ('-n', '--ntasks', 'tasks'),
+    ('-p', '--partition', 'partition'),
+    ('-t', '--time', 'time_limit'),
+    ('-A', '--account', 'account'),
+    ('-D', '--chdir', 'current_working_directory'),
+    ('-d', '--dependency', 'dependency'),
+    (None, '--mail-user', 'mail_user'),
+    (None, '--mail-type', 'mail_type'),
+]
+
+# options that may be given several times, joined with comma
+LIST_FIELDS = ['dependency', 'mail_type']
+INTEGER_FIELDS = ['minimum_nodes', 'tasks', 'time_limit']
+
+
+def _time_to_minutes(s):
+    """
+    Converts a Slurm time string [D-]HH:MM:SS to minutes, rounding up.
+    """
+    s = str(s).strip()
+    days = 0
+    if '-' in s:
+        d, s = s.split('-', 1)
+        days = int(d)
+        parts = [int(p) for p in s.split(':')]
+        parts += [0]*(3 - len(parts))
+    else:
+        parts = [int(p) for p in s.split(':')]
+        if len(parts) == 1:
+            parts = [0, parts[0], 0]
+        elif len(parts) == 2:
+            parts = [0] + parts
+    h, m, sec = parts
+    return (days*24 + h)*60 + m + (1 if sec > 0 else 0)
+
+
+def parse_sbatch_directives(script):
+    """
+    Returns a list of (option, value) pairs of the #SBATCH lines in a script.
+    """
+    pairs = []
+    tokens = []
+    for line in script.splitlines()[1:]:
+        s = line.strip()
+        if s.startswith('#SBATCH'):
+            tokens.extend(shlex.split(s[len('#SBATCH'):]))
+        elif len(s) > 0 and not s.startswith('#'):
+            break
+    i = 0
+    while i < len(tokens):
+        t = tokens[i]
+        if t.startswith('--') and '=' in t:
+            pairs.append(tuple(t.split('=', 1)))
+        elif i + 1 < len(tokens) and not tokens[i + 1].startswith('-'):
+            pairs.append((t, tokens[i + 1]))
+            i += 1
+        else:
+            pairs.append((t, None))
+        i += 1
+    return pairs
+
+
+def script_to_job(script, workdir=None, environment=None,
+                  api_version=DEFAULT_API_VERSION):
+    """
+    Returns the job description of a batch script.
+
+    #SBATCH directives of the header are converted to job fields. Unknown
+    directives are left in the script.
+    """
+    fields = {}
+    for short, long, field in SBATCH_FIELDS:
+        fields[short] = field
+        fields[long] = field
+    job = OrderedDict()
+    for opt, value in parse_sbatch_directives(script):
+        field = fields.get(opt)
+        if field is None or value is None:
+            continue
+        if field == 'time_limit':
+            value = _time_to_minutes(value)
+        elif field == 'minimum_nodes':
+            value = int(value.split('-')[0])
+        elif field in INTEGER_FIELDS:
+            value = int(value)
+        if field in LIST_FIELDS and field in job:
+            value = job[field] + ',' + value
+        job[field] = value
+    if workdir is None:
+        workdir = os.getcwd()
+    job.setdefault('current_working_directory', os.path.abspath(workdir))
+    if environment is None:
+        environment = {'PATH': os.environ.get('PATH', '/usr/bin:/bin')}
+    if api_version < 'v0.0.39':
+        job['environment'] = dict(environment)
+    else:
+        job['environment'] = ['{0}={1}'.format(k, v)
+                              for k, v in sorted(environment.items())]
+    return job
+
+
+def job_to_sbatch_args(job):
+    """
+    Converts a job description to sbatch command line arguments.
+    """
+    args = []
+    for short, long, field in SBATCH_FIELDS:
+        value = job.get(field)
+        if value is None:
+            continue
+        if isinstance(value, dict):
+            # {"number": ..., "set": true} in newer API versions
+            value = value.get('number')
+        args.append('{0}={1}'.format(long, value))
+    return args
+
+
+class UnixHTTPConnection(httplib.HTTPConnection):
+    """
+    HTTP connection over a Unix domain socket.
+    """
+    def __init__(self, path, timeout=None):
+        httplib.HTTPConnection.__init__(self, 'localhost', timeout=timeout)
+        self.socket_path = path
+
+    def connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        if self.timeout is not None:
+            sock.settimeout(self.timeout)
+        sock.connect(self.socket_path)
+        self.sock = sock
+
+
+class SlurmRestClient(object):
+    """
+    Client for slurmrestd with a pool of keep-alive connections.
+    """
+    def __init__(self, url, api_version=None, user=None, token=None,
+                 connections=None, timeout=60.0):
+        self.url = url
+        self.api_version = api_version or DEFAULT_API_VERSION
+        self.user = user or os.environ.get('USER')
+        self.token = token or os.environ.get('SLURM_JWT')
+        self.connections = int(connections or DEFAULT_CONNECTIONS)
+        self.timeout = timeout
+        self._pool = []
+        self._lock = threading.Lock()
+
+    def _new_connection(self):
+        if self.url.startswith('unix:'):
+            path = self.url[len('unix:'):]
+            if path.startswith('//'):
+                path = path[2:]
+            return UnixHTTPConnection(path, timeout=self.timeout)
+        u = urlparse(self.url)
+        if u.scheme == 'https':
+            return httplib.HTTPSConnection(u.hostname, u.port,
+                                           timeout=self.timeout)
+        if u.scheme == 'http':
+            return httplib.HTTPConnection(u.hostname, u.port,
+                                          timeout=self.timeout)
+        raise Exception('unsupported slurmrestd address: ' + self.url)
+
+    def _get_connection(self):
+        with self._lock:
+            if len(self._pool) > 0:
+                return self._pool.pop()
+        return self._new_connection()
+
+    def _put_connection(self, conn):
+        with self._lock:
+            if len(self._pool) < self.connections:
+                self._pool.append(conn)
+                return
+        conn.close()
+
+    def close(self):
+        """
+        Closes all pooled connections.
+        """
+        with self._lock:
+            for conn in self._pool:
+                conn.close()
+            self._pool = []
+
+    def request(self, method, path, body=None):
+        """
+        Sends a request and returns the decoded json response.
+        """
+        headers = {'Content-Type': 'application/json',
+                   'Accept': 'application/json'}
+        if self.user is not None:
+            headers['X-SLURM-USER-NAME'] = self.user
+        if self.token is not None:
+            headers['X-SLURM-USER-TOKEN'] = self.token
+        data = None if body is None else json.dumps(body).encode('utf-8')
+        # retry once if the server closed an idle connection
+        for attempt in range(2):
+            conn = self._get_connection()
+            try:
+                conn.request(method, path, body=data, headers=headers)
+                response = conn.getresponse()
+                content = response.read()
+            except (httplib.HTTPException, socket.error):
+                conn.close()
+                if attempt == 1:
+                    raise
+                continue
+            if response.getheader('Connection', '').lower() == 'close':
+                conn.close()
+            else:
+                self._put_connection(conn)
+            break
+        try:
+            output = json.loads(content.decode('utf-8'))
+        except ValueError:
+            raise Exception('slurmrestd returned {0:d}: {1}'.format(
+                response.status, content[:200]))
+        errors = [e.get('error', e.get('description', str(e)))
+                  for e in output.get('errors', [])]
+        if len(errors) > 0 or response.status >= 400:
+            raise Exception('slurmrestd returned {0:d}: {1}'.format(
+                response.status, '; '.join(errors)))
+        return output
+
+    def submit(self, script, workdir=None):
+        """
+        Submits a batch script. Returns the job id.
+        """
+        job = script_to_job(script, workdir=workdir,
+                            api_version=self.api_version)
+        path = '/slurm/{0}/job/submit'.format(self.api_version)
+        output = self.request('POST', path, {'script': script, 'job': job})
+        return int(output['job_id'])
+
+    def submit_many(self, scripts, workdirs=None):
+        """
+        Submits many batch scripts concurrently. Returns the job ids in the
+        same order.
+        """
+        if workdirs is None:
+            workdirs = [None]*len(scripts)
+        if len(scripts) == 1:
+            return [self.submit(scripts[0], workdirs[0])]
+        with ThreadPoolExecutor(max_workers=self.connections) as pool:
+            return list(pool.map(self.submit, scripts, workdirs))
+
+
+_clients = {}
+
+
+def get_client(clusterparams):
+    """
+    Returns a shared client for the configured slurmrestd address.
+    """
+    url = clusterparams['submitexec']
+    if url not in _clients:
+        _clients[url] = SlurmRestClient(
+            url, api_version=clusterparams['restapiversion'],
+            user=clusterparams['restuser'],
+            token=clusterparams['resttoken'],
+            connections=clusterparams['restconnections'])
+    return _clients[url]
@@ -0,0 +1,130 @@
+"""
+Staging of input and output files to node-local storage.
+
+Files listed in stage_in are copied once to node-local storage of every node
+in the allocation (with sbcast on slurm, parallel copy over the node list
+elsewhere). Files listed in stage_out are copied back from node-local storage
+when the job exits. Task tags whose value matches a staged path are rewritten
+to point at the local copy, and the local directory is available in tag
+{stagedir}.
+
+Job and task keywords:
+
+- stage_in: list of input files or directories
+- stage_out: list of output files
+- localscratch: node-local directory (default ${TMPDIR:-/tmp})
+"""
+from __future__ import absolute_import
+import os
+
+DEFAULT_LOCALSCRATCH = '${TMPDIR:-/tmp}'
+
+STAGEDIR = '$_hpcl_stagedir'
+
+# unique host names from the node file of pbs and sge
+HOSTLIST_CMD = ('$( (cat ${PBS_NODEFILE:-/dev/null}; '
+                'cut -d " " -f 1 ${PE_HOSTFILE:-/dev/null}) | sort -u)')
+
+PROLOGUE_TEMPLATE = """# stage files to node-local storage
+export _hpcl_stagedir={localscratch}/hpclauncher_stage_{jobname}_$$
+mkdir -p $_hpcl_stagedir
+"""
+
+STAGE_IN_SLURM = """srun -N {nnode} --ntasks-per-node=1 mkdir -p $_hpcl_stagedir
+"""
+STAGE_IN_SLURM_FILE = """sbcast -f {src} $_hpcl_stagedir/{name}
+"""
+STAGE_IN_SLURM_DIR = """srun -N {nnode} --ntasks-per-node=1 cp -r {src} $_hpcl_stagedir/
+"""
+
+STAGE_IN_REMOTE = """_hpcl_stage_in() {{
+{copy}}}
+_hpcl_hosts={hostlist}
+for _hpcl_host in $_hpcl_hosts; do
+    if [ "$_hpcl_host" == "$(hostname)" ]; then
+        _hpcl_stage_in
+    else
+        ssh $_hpcl_host "_hpcl_stagedir=$_hpcl_stagedir; mkdir -p $_hpcl_stagedir; cd $PWD; $(declare -f _hpcl_stage_in); _hpcl_stage_in" &
+    fi
+done
+[ -z "$_hpcl_hosts" ] && _hpcl_stage_in
+wait
+"""
+
+STAGE_OUT_TEMPLATE = """_hpcl_stage_out() {{
+{copy}    rm -rf $_hpcl_stagedir
+}}
+"""
+
+# name of the shell function that must be called at exit
+EXIT_HOOK = '_hpcl_stage_out'
+
+
+def as_list(value):
+    """
+    Returns the value as a list of strings.
+    """
+    if value is None:
+        return []
+    if isinstance(value, (list, tuple)):
+        return [str(v) for v in value]
+    return [str(value)]
+
+
+def get_local_path(path):
+    """
+    Returns node-local path of a staged file.
+    """
+    return os.path.join(STAGEDIR, os.path.basename(path.rstrip('/')))
+
+
+def rewrite_tags(d, staged):
+    """
+    Replaces tag values that match a staged path with the local path.
+    """
+    for k, v in d.items():
+        if k in ['stage_in', 'stage_out', 'logfile']:
+            continue
+        if isinstance(v, str) and v in staged:
+            d[k] = get_local_path(v)
+    d['stagedir'] = STAGEDIR
+
+
+def generate_prologue(jobname, stage_in, stage_out, managertype=None,
+                      nnode=None, localscratch=None):
+    """
+    Returns script lines that copy stage_in files to node-local storage.
+
+    EXIT_HOOK must be called when the job script exits, it copies stage_out
+    files back and removes the local directory.
+    """
+    if localscratch is None:
+        localscratch = DEFAULT_LOCALSCRATCH
+    content = PROLOGUE_TEMPLATE.format(localscratch=localscratch,
+                                       jobname=jobname)
+    multinode = nnode is not None and int(nnode) > 1
+    if len(stage_in) > 0:
+        if multinode and managertype == 'slurm':
+            content += STAGE_IN_SLURM.format(nnode=nnode)
+            for src in stage_in:
+                if src.endswith('/') or os.path.isdir(src):
+                    content += STAGE_IN_SLURM_DIR.format(nnode=nnode,
+                                                         src=src.rstrip('/'))
+                else:
+                    name = os.path.basename(src)
+                    content += STAGE_IN_SLURM_FILE.format(src=src, name=name)
+        else:
+            copy = ['cp -r {0} $_hpcl_stagedir/\n'.format(src.rstrip('/'))
+                    for src in stage_in]
+            if multinode:
+                copy = ''.join(['    ' + c for c in copy])
+                content += STAGE_IN_REMOTE.format(copy=copy,
+                                                  hostlist=HOSTLIST_CMD)
+            else:
+                content += ''.join(copy)
+    copy = ''
+    for dst in stage_out:
+        copy += '    [ -e {0} ] && cp -r {0} {1}\n'.format(
+            get_local_path(dst), dst)
+    content += STAGE_OUT_TEMPLATE.format(copy=copy)
+    return content
@@ -0,0 +1,252 @@
+"""
+Record of a submitted run and bulk job control.
+
+submit_jobs returns a SubmittedRun object that knows the job ids and the
+dependency structure (DAG) of the submitted jobs. Jobs can be cancelled, held
+or released individually, together with their descendants, or all at once.
+Scheduler commands are issued in batches with many job ids per call.
+
+Usage:
+
+    run = submit_jobs(jobs)
+    run.save('myrun.json')
+    run.hold('solver', descendants=True)
+    run.release()
+    run = SubmittedRun.load('myrun.json')
+    run.cancel()
+"""
+from __future__ import absolute_import
+import os
+import json
+import subprocess
+from collections import OrderedDict
+
+from .clusterparameters import clusterparams
+
+# commands for each action and resource manager: (command, id separator)
+# separator None means that ids are passed as separate arguments
+CONTROL_COMMANDS = {
+    'slurm': {
+        'cancel': (['scancel'], None),
+        'hold': (['scontrol', 'hold'], ','),
+        'release': (['scontrol', 'release'], ','),
+    },
+    'sge': {
+        'cancel': (['qdel'], ','),
+        'hold': (['qhold'], ','),
+        'release': (['qrls'], ','),
+    },
+    'pbs': {
+        'cancel': (['qdel'], None),
+        'hold': (['qhold'], None),
+        'release': (['qrls'], None),
+    },
+}
+
+# max number of job ids in one scheduler call
+DEFAULT_CHUNKSIZE = 500
+
+
+def _find_exec(name):
+    """
+    Returns path to a scheduler executable.
+
+    If submitexec is given with a path, executables in the same directory
+    are preferred.
+    """
+    submitexec = clusterparams['submitexec']
+    if submitexec is not None and os.path.dirname(submitexec):
+        candidate = os.path.join(os.path.dirname(submitexec), name)
+        if os.path.isfile(candidate):
+            return candidate
+    return name
+
+
+def get_control_command(action, managertype):
+    """
+    Returns the command (list) and id separator for the given action.
+
+    Commands can be overridden with cluster parameters cancelexec, holdexec
+    and releaseexec.
+    """
+    custom = clusterparams[action + 'exec']
+    if custom is not None:
+        return custom.split(), None
+    if managertype not in CONTROL_COMMANDS:
+        raise Exception('job control not supported for resourcemanager: ' +
+                        str(managertype))
+    cmd, sep = CONTROL_COMMANDS[managertype][action]
+    return [_find_exec(cmd[0])] + cmd[1:], sep
+
+
+def control_jobs(action, jobids, managertype=None, chunksize=DEFAULT_CHUNKSIZE,
+                 testonly=False, verbose=False):
+    """
+    Applies action ('cancel', 'hold' or 'release') to the given job ids.
+
+    Ids are passed to the scheduler in batches of chunksize ids.
+    Returns list of executed commands.
+    """
+    if managertype is None:
+        managertype = clusterparams['resourcemanager']
+    jobids = [str(i) for i in jobids if i is not None and str(i) != '0']
+    if len(jobids) == 0:
+        return []
+    cmd, sep = get_control_command(action, managertype)
+    calls = []
+    for i in range(0, len(jobids), chunksize):
+        chunk = jobids[i:i + chunksize]
+        if sep is None:
+            call = cmd + chunk
+        else:
+            call = cmd + [sep.join(chunk)]
+        if verbose or testonly:
+            print('excecuting {:}'.format(' '.join(call)))
+        if not testonly:
+            subprocess.check_call(call)
+        calls.append(call)
+    return calls
+
+
+class SubmittedRun(object):
+    """
+    Job names, ids and dependencies of submitted jobs.
+    """
+    def __init__(self, managertype=None):
+        self.managertype = managertype
+        self.jobs = OrderedDict()
+        # names that refer to another job, e.g. coalesced members
+        self.aliases = OrderedDict()
+
+    def add_job(self, name, jobid, parents=None, resources=None):
+        """
+        Adds a submitted job. parents is a list of parent job names,
+        resources a dict of requested resources, see
+        BatchJob.get_resources.
+        """
+        self.jobs[name] = OrderedDict([
+            ('jobid', jobid),
+            ('parents', list(parents or [])),
+            ('resources', resources or OrderedDict()),
+        ])
+
+    def add_alias(self, alias, name):
+        self.aliases[alias] = name
+
+    def resolve(self, name):
+        """
+        Returns the name of the submitted job that name refers to.
+        """
+        while name in self.aliases:
+            name = self.aliases[name]
+        return name
+
+    def __getitem__(self, name):
+        """
+        Returns job id of a job.
+        """
+        return self.jobs[self.resolve(name)]['jobid']
+
+    def __contains__(self, name):
+        return self.resolve(name) in self.jobs
+
+    def __len__(self):
+        return len(self.jobs)
+
+    def get_job_ids(self):
+        return [j['jobid'] for j in self.jobs.values()]
+
+    def get_children(self, name):
+        """
+        Returns names of the jobs that depend directly on the given job.
+        """
+        name = self.resolve(name)
+        return [n for n, j in self.jobs.items()
+                if name in [self.resolve(p) for p in j['parents']]]
+
+    def get_descendants(self, names):
+        """
+        Returns names of the given jobs and all jobs that depend on them.
+        """
+        children = OrderedDict([(n, []) for n in self.jobs])
+        for n, j in self.jobs.items():
+            for p in j['parents']:
+                p = self.resolve(p)
+                if p in children:
+                    children[p].append(n)
+        found = OrderedDict()
+        stack = [self.resolve(n) for n in names]
+        while len(stack) > 0:
+            n = stack.pop()
+            if n in found:
+                continue
+            if n not in self.jobs:
+                raise KeyError('unknown job: ' + n)
+            found[n] = True
+            stack.extend(children[n])
+        # keep submission order
+        return [n for n in self.jobs if n in found]
+
+    def select(self, names=None, descendants=True):
+        """
+        Returns job ids of the given jobs (default: all jobs).
+        """
+        if names is None:
+            selected = list(self.jobs.keys())
+        else:
+            if not isinstance(names, (list, tuple)):
+                names = [names]
+            if descendants:
+                selected = self.get_descendants(names)
+            else:
+                selected = [self.resolve(n) for n in names]
+        return [self.jobs[n]['jobid'] for n in selected]
+
+    def _control(self, action, names, descendants, **kwargs):
+        ids = self.select(names, descendants)
+        return control_jobs(action, ids, managertype=self.managertype,
+                            **kwargs)
+
+    def cancel(self, names=None, descendants=True, **kwargs):
+        """
+        Cancels the given jobs and their descendants (default: all jobs).
+        """
+        return self._control('cancel', names, descendants, **kwargs)
+
+    def hold(self, names=None, descendants=True, **kwargs):
+        """
+        Holds the given jobs and their descendants (default: all jobs).
+        """
+        return self._control('hold', names, descendants, **kwargs)
+
+    def release(self, names=None, descendants=True, **kwargs):
+        """
+        Releases the given jobs and their descendants (default: all jobs).
+        """
+        return self._control('release', names, descendants, **kwargs)
+
+    def as_dict(self):
+        return OrderedDict([
+            ('managertype', self.managertype),
+            ('jobs', self.jobs),
+            ('aliases', self.aliases),
+        ])
+
+    def save(self, filename):
+        """
+        Stores the run in a json file.
+        """
+        with open(filename, 'w') as f:
+            json.dump(self.as_dict(), f, indent=2)
+
+    @classmethod
+    def load(cls, filename):
+        """
+        Reads a run from a json file.
+        """
+        with open(filename) as f:
+            d = json.load(f, object_pairs_hook=OrderedDict)
+        run = cls(d.get('managertype'))
+        run.jobs = d['jobs']
+        run.aliases = d.get('aliases', OrderedDict())
+        return run
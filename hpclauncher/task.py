@@ -10,18 +10,28 @@ class BatchTask(object):
     """
     A single task, representable as a bash command.
     Tasks can be added to batchJob objects.
+
+    Instead of a command, a python function 'package.module:function' can
+    be given with arguments funcargs and funckwargs. Such tasks are run by a
+    pool of python workers in the job, see pyworker module.
     """
-    def __init__(self, command, threaded=False, logfile=None,
-                 redirmode='append', **kwargs):
-        # rm trailing whitespace
-        if command is None:
+    def __init__(self, command=None, threaded=False, logfile=None,
+                 redirmode='append', taskname=None, function=None,
+                 funcargs=None, funckwargs=None, **kwargs):
+        if command is None and function is None:
             raise Exception('missing task parameter: command')
-        self.cmd = command.strip()
+        self.function = function
+        self.funcargs = list(funcargs or [])
+        self.funckwargs = dict(funckwargs or {})
+        # rm trailing whitespace
+        self.cmd = command.strip() if command is not None else None
         self.logfile = logfile
         self.threaded = bool(threaded)
         self.redirmode = redirmode
+        self.taskname = taskname
         self.kwargs = kwargs
         self.kwargs['logfile'] = self.logfile
+        self.kwargs['taskname'] = self.taskname
 
     def __getitem__(self, key):
         return self.kwargs.get(key)
@@ -30,20 +40,24 @@ class BatchTask(object):
         """Get a deep copy of this task"""
         return copy.deepcopy(self)
 
-    def get_command(self):
+    def get_command(self, command=None, logfile=None):
         """
         Returns the command of this task.
 
         Appends redirection to log file and/or ampersand for threading
-        if needed.
+        if needed. By default the command and log file are returned as
+        templates, e.g. '{logfile}'. If given, command and logfile are used
+        instead.
         """
-        full_cmd = self.cmd
+        full_cmd = self.cmd if command is None else command
+        if logfile is None:
+            logfile = '{logfile}'
         if self.redirmode == 'append':
             redir_op = '&>>'
         elif self.redirmode == 'replace':
             redir_op = '&>'
         if self.logfile:
-            full_cmd += ' ' + redir_op + ' ' + '{logfile}'
+            full_cmd += ' ' + redir_op + ' ' + logfile
         if self.threaded:
             full_cmd += ' &'
         return full_cmd
@@ -0,0 +1,49 @@
+#!/usr/bin/env python
+"""
+Cancels, holds or releases jobs of a run stored by submitYAMLJob.py.
+"""
+from hpclauncher import *
+import argparse
+
+
+def controlJobs(action, runfile, jobnames=None, descendants=True,
+                testonly=False, verbose=False):
+    """
+    Applies action to the given jobs (default: all jobs) in the run file.
+    """
+    run = SubmittedRun.load(runfile)
+    if action == 'cancel':
+        run.cancel(jobnames, descendants=descendants, testonly=testonly,
+                   verbose=verbose)
+    elif action == 'hold':
+        run.hold(jobnames, descendants=descendants, testonly=testonly,
+                 verbose=verbose)
+    elif action == 'release':
+        run.release(jobnames, descendants=descendants, testonly=testonly,
+                    verbose=verbose)
+
+
+def parseCommandLine():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('action', choices=['cancel', 'hold', 'release'])
+    parser.add_argument('runfile', help='json run file created with '
+                        'submitYAMLJob.py -s')
+    parser.add_argument('-j', '--jobname', action='append',
+                        help='Apply only to this job and its descendants. '
+                        'Can be repeated.')
+    parser.add_argument('-n', '--no-descendants', action='store_true',
+                        default=False,
+                        help='Do not apply to the descendants of given jobs')
+    parser.add_argument('-t', '--testonly', action='store_true', default=False,
+                        help='Only print the scheduler commands')
+    parser.add_argument('-v', '--verbose', action='store_true', default=False,
+                        help='Print the scheduler commands')
+    args = parser.parse_args()
+
+    controlJobs(args.action, args.runfile, args.jobname,
+                descendants=not args.no_descendants,
+                testonly=args.testonly, verbose=args.verbose)
+
+
+if __name__ == '__main__':
+    parseCommandLine()
@@ -0,0 +1,47 @@
+#!/usr/bin/env python
+"""
+Reports queue wait, wall time utilization and the critical path of a run
+stored by submitYAMLJob.py -s.
+"""
+from hpclauncher import *
+from hpclauncher import report
+import argparse
+
+
+def runReport(runfile, clusterparamsfile, outfile=None):
+    """
+    Prints report summary and writes the per job report in outfile (.csv
+    or .json).
+    """
+    if clusterparamsfile is not None:
+        clusterparams.initialize_from_file(clusterparamsfile)
+
+    run = SubmittedRun.load(runfile)
+    rows, summary = report.generate_report(run)
+    if outfile is not None:
+        if outfile.endswith('.json'):
+            report.write_json(rows, summary, outfile)
+        else:
+            report.write_csv(rows, outfile)
+    for k, v in summary.items():
+        if isinstance(v, list):
+            v = ' -> '.join(v)
+        print('{0}: {1}'.format(k, v))
+
+
+def parseCommandLine():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('runfile', help='json run file created with '
+                        'submitYAMLJob.py -s')
+    parser.add_argument('-c', '--clusterparamsfile', help='Custom yaml '
+                        'cluster parameter file. By default user config file '
+                        'is used (if present).')
+    parser.add_argument('-o', '--outfile', help='Write per job report to a '
+                        '.csv or .json file')
+    args = parser.parse_args()
+
+    runReport(args.runfile, args.clusterparamsfile, outfile=args.outfile)
+
+
+if __name__ == '__main__':
+    parseCommandLine()
@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+"""
+Scans task logs of jobs defined in yaml file for errors and completion
+markers.
+"""
+from hpclauncher import *
+from hpclauncher import logscan
+import sys
+import argparse
+
+
+def scanLogs(jobfile, clusterparamsfile, error_patterns=None,
+             done_patterns=None, workers=None, all_rows=False, outfile=None):
+    """
+    Prints status table of the task logs. Returns number of failed tasks.
+    """
+    if clusterparamsfile is not None:
+        clusterparams.initialize_from_file(clusterparamsfile)
+
+    jobs = parse_jobs_from_yaml(jobfile)
+    rows = logscan.scan_task_logs(jobs, error_patterns=error_patterns,
+                                  done_patterns=done_patterns,
+                                  workers=workers)
+    statuses = None if all_rows else ['error', 'incomplete', 'missing']
+    table = logscan.format_table(rows, statuses=statuses)
+    if outfile is not None:
+        with open(outfile, 'w') as f:
+            f.write(table)
+    else:
+        sys.stdout.write(table)
+    counts = logscan.summarize(rows)
+    print(' '.join('{0}: {1:d}'.format(k, v) for k, v in counts.items()))
+    return len(rows) - counts.get('ok', 0)
+
+
+def parseCommandLine():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('jobfile', help='yaml job file')
+    parser.add_argument('-c', '--clusterparamsfile', help='Custom yaml '
+                        'cluster parameter file. By default user config file '
+                        'is used (if present).')
+    parser.add_argument('-e', '--error', action='append',
+                        help='Regular expression that indicates an error. '
+                        'Can be repeated. Replaces the default patterns.')
+    parser.add_argument('-d', '--done', action='append',
+                        help='Regular expression that marks a completed '
+                        'task. Can be repeated.')
+    parser.add_argument('-n', '--nprocs', type=int,
+                        help='Number of parallel processes')
+    parser.add_argument('-a', '--all', action='store_true', default=False,
+                        help='List all tasks, not only the failed ones')
+    parser.add_argument('-o', '--outfile', help='Write table to a file')
+    args = parser.parse_args()
+
+    nfailed = scanLogs(args.jobfile, args.clusterparamsfile,
+                       error_patterns=args.error, done_patterns=args.done,
+                       workers=args.nprocs, all_rows=args.all,
+                       outfile=args.outfile)
+    sys.exit(1 if nfailed > 0 else 0)
+
+
+if __name__ == '__main__':
+    parseCommandLine()
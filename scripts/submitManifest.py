@@ -0,0 +1,46 @@
+#!/usr/bin/env python
+"""
+Submits jobs rendered with submitYAMLJob.py -r.
+"""
+from hpclauncher import *
+import argparse
+
+
+def submitManifest(manifestfile, clusterparamsfile, testonly=False,
+                   verbose=False, runfile=None):
+    """
+    Submits the jobs listed in the manifest file.
+    """
+    if clusterparamsfile is not None:
+        clusterparams.initialize_from_file(clusterparamsfile)
+
+    run = submit_manifest(manifestfile, testonly=testonly, verbose=verbose)
+    if runfile is not None:
+        run.save(runfile)
+
+
+def parseCommandLine():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('manifest', help='manifest.json in the render '
+                        'directory')
+    parser.add_argument('-c', '--clusterparamsfile', help='Custom yaml '
+                        'cluster parameter file. By default user config file '
+                        'is used (if present).')
+    parser.add_argument('-t', '--testonly', action='store_true', default=False,
+                        help=('Do not launch anything, just print submission '
+                              'script on stdout'))
+    parser.add_argument('-v', '--verbose', action='store_true', default=False,
+                        help='Print submission script on stdout')
+    parser.add_argument('-s', '--saverun',
+                        help='Store job ids and dependencies in a json file. '
+                        'The jobs can be cancelled, held or released with '
+                        'controlJobs.py')
+    args = parser.parse_args()
+
+    submitManifest(args.manifest, args.clusterparamsfile,
+                   testonly=args.testonly, verbose=args.verbose,
+                   runfile=args.saverun)
+
+
+if __name__ == '__main__':
+    parseCommandLine()
@@ -8,15 +8,26 @@ from hpclauncher import *
 import argparse
 
 
-def submitYamlJobs(jobfile, clusterparamsfile, testonly=False, verbose=False):
+def submitYamlJobs(jobfile, clusterparamsfile, testonly=False, verbose=False,
+                   runfile=None, renderdir=None, workers=None,
+                   preflight=False):
     """
     Submits jobs defined in the jobfile.
+
+    If renderdir is given, scripts are only rendered to renderdir.
     """
     if clusterparamsfile is not None:
         clusterparams.initialize_from_file(clusterparamsfile)
 
     jobs = parse_jobs_from_yaml(jobfile)
-    submit_jobs(jobs, testonly=testonly, verbose=verbose)
+    if renderdir is not None:
+        render_jobs(jobs, renderdir, workers=workers, verbose=verbose,
+                    preflight=preflight)
+        return
+    run = submit_jobs(jobs, testonly=testonly, verbose=verbose,
+                      preflight=preflight)
+    if runfile is not None:
+        run.save(runfile)
 
 
 def parseCommandLine():
@@ -30,10 +41,27 @@ def parseCommandLine():
                               'script on stdout'))
     parser.add_argument('-v', '--verbose', action='store_true', default=False,
                         help='Print submission script on stdout')
+    parser.add_argument('-s', '--saverun',
+                        help='Store job ids and dependencies in a json file. '
+                        'The jobs can be cancelled, held or released with '
+                        'controlJobs.py')
+    parser.add_argument('-r', '--renderdir',
+                        help='Do not submit, write scripts and a manifest '
+                        'in this directory. Submit later with '
+                        'submitManifest.py')
+    parser.add_argument('-j', '--workers', type=int,
+                        help='Number of processes used for rendering '
+                        '(default: number of cpus)')
+    parser.add_argument('-p', '--preflight', action='store_true',
+                        default=False,
+                        help='Validate all jobs against partition and QOS '
+                        'limits before submitting anything')
     args = parser.parse_args()
 
     submitYamlJobs(args.jobfile, args.clusterparamsfile,
-                   testonly=args.testonly, verbose=args.verbose)
+                   testonly=args.testonly, verbose=args.verbose,
+                   runfile=args.saverun, renderdir=args.renderdir,
+                   workers=args.workers, preflight=args.preflight)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,50 @@
+from hpclauncher import *
+from hpclauncher import accounting
+import os
+import sys
+import shutil
+import tempfile
+import subprocess
+import unittest
+
+
+class TestAccounting(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.curdir = os.getcwd()
+        clusterparams.initialize_from_file('../examples/cluster_config/bash.yaml')
+        os.chdir(self.tmpdir)
+
+    def tearDown(self):
+        os.chdir(self.curdir)
+        shutil.rmtree(self.tmpdir)
+
+    def test_task_records(self):
+        j = BatchJob(jobname='acctjob', queue='normal', nproc=1,
+                     logfiledir='logs', accounting=True,
+                     pythonexec=sys.executable)
+        j.append_new_task("echo '{word}'", word='hello', logfile='log_a',
+                          taskname='a', threaded=True)
+        j.append_new_task('exit 3', taskname='b')
+        content = j.generate_script()
+        self.assertIn("-t a -j acctjob -- bash -c 'echo '\"'\"'hello'\"'\"'' &>> logs/log_a &\n",
+                      content)
+        with open('job.sh', 'w') as f:
+            f.write(content)
+        pkgdir = os.path.dirname(os.path.dirname(accounting.__file__))
+        env = dict(os.environ, PYTHONPATH=pkgdir, SLURM_JOB_ID='5')
+        subprocess.check_call(['bash', 'job.sh'], env=env)
+        with open('logs/log_a') as f:
+            self.assertEqual(f.read(), 'hello\n')
+        acct = accounting.load_summaries('logs/acctjob_acct.*.tsv')
+        self.assertEqual(sorted(acct['taskname']), ['a', 'b'])
+        self.assertEqual(acct['jobid'], ['5', '5'])
+        exitcodes = dict(zip(acct['taskname'], acct['exitcode']))
+        self.assertEqual(exitcodes, {'a': 0, 'b': 3})
+        self.assertTrue(all(r > 0 for r in acct['maxrss']))
+
+
+if __name__ == '__main__':
+    """Run all tests"""
+    unittest.main()
@@ -92,6 +92,37 @@ wait"""
 #$ -A j007
 #$ -V
 mpirun -n 8 python runSome.py -r run_lola &>> /tmp/logs/log_yamljob
+wait"""
+        self.assert_string_equal(correct_output, out)
+
+    def test_yaml_sge_pinning(self):
+        clusterparams.initialize_from_file('../examples/cluster_config/joe_sirius.yaml')
+        treq = TimeRequest(1, 0, 0)
+        j = BatchJob(jobname='pinjob', queue='normal', nproc=8,
+                     timereq=treq, logfile='log', pinning='numactl')
+        j.append_new_task('{mpiexec} python combine.py -s {stack}',
+                          stack=1, nthread=3, threaded=True)
+        j.append_new_task('{mpiexec} python combine.py -s {stack}',
+                          stack=2, nthread=3, threaded=True)
+        j.append_new_task('{mpiexec} python combine.py -s {stack}',
+                          stack=3, nthread=2, threaded=True)
+        out = j.generate_script()
+        correct_output = """#!/bin/bash
+#$ -cwd
+#$ -j y
+#$ -S /bin/bash
+#$ -N pinjob
+#$ -o /tmp/logs/log.out
+#$ -e /tmp/logs/log.err
+#$ -q normal
+#$ -pe orte 8
+#$ -M glassJoe@stccmop.org
+#$ -m ea
+#$ -A j007
+#$ -V
+OMP_NUM_THREADS=3 OMP_PLACES=cores OMP_PROC_BIND=close numactl --physcpubind=0-2 --membind=0 bash -c 'mpirun -n 3 python combine.py -s 1' &
+OMP_NUM_THREADS=3 OMP_PLACES=cores OMP_PROC_BIND=close numactl --physcpubind=4-6 --membind=1 bash -c 'mpirun -n 3 python combine.py -s 2' &
+OMP_NUM_THREADS=2 OMP_PLACES=cores OMP_PROC_BIND=close numactl --physcpubind=3,7 --membind=0-1 bash -c 'mpirun -n 2 python combine.py -s 3' &
 wait"""
         self.assert_string_equal(correct_output, out)
 
@@ -0,0 +1,54 @@
+from hpclauncher import *
+from hpclauncher.coalesce import JobBundle
+import os
+import shutil
+import tempfile
+import subprocess
+import unittest
+
+
+class TestCoalesce(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.curdir = os.getcwd()
+        clusterparams.initialize_from_file('../examples/cluster_config/bash.yaml')
+        os.chdir(self.tmpdir)
+
+    def tearDown(self):
+        os.chdir(self.curdir)
+        shutil.rmtree(self.tmpdir)
+
+    def test_bundles(self):
+        jobs = []
+        for i in range(5):
+            j = BatchJob(jobname='small{:d}'.format(i), queue='normal',
+                         nproc=1, timereq=TimeRequest(0, 10, 0))
+            j.append_new_task('echo {jobname} >> out_{jobname}')
+            jobs.append(j)
+        child = BatchJob(jobname='child', queue='normal', nproc=1,
+                         timereq=TimeRequest(0, 10, 0), parentjobok='small3')
+        child.append_new_task('echo child')
+        jobs.append(child)
+        new_jobs = coalesce_jobs(jobs, nnode=1, ncoresnode=2,
+                                 walltime=TimeRequest(0, 20, 0))
+        self.assertEqual([j['jobname'] for j in new_jobs],
+                         ['bundle1', 'small4', 'child'])
+        bundle = new_jobs[0]
+        self.assertTrue(isinstance(bundle, JobBundle))
+        self.assertEqual([[m['jobname'] for m in lane] for lane in bundle.lanes],
+                         [['small0', 'small2'], ['small1', 'small3']])
+        self.assertEqual(bundle['nproc'], 2)
+        self.assertEqual(bundle.get_walltime(), 20*60)
+        self.assertEqual(child['parentjobok'], 'bundle1')
+        with open('bundle.sh', 'w') as f:
+            f.write(bundle.generate_script())
+        subprocess.check_call(['bash', 'bundle.sh'])
+        for i in range(4):
+            with open('out_small{:d}'.format(i)) as f:
+                self.assertEqual(f.read(), 'small{:d}\n'.format(i))
+
+
+if __name__ == '__main__':
+    """Run all tests"""
+    unittest.main()
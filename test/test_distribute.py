@@ -0,0 +1,63 @@
+from hpclauncher import *
+from hpclauncher import distribute
+import os
+import shutil
+import tempfile
+import subprocess
+import unittest
+
+
+class TestDistribute(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.curdir = os.getcwd()
+        clusterparams.initialize_from_file('../examples/cluster_config/bash.yaml')
+        os.chdir(self.tmpdir)
+        with open('hosts', 'w') as f:
+            f.write('n1 slots=2\nn2 slots=2\nn1\nn3\n')
+
+    def tearDown(self):
+        os.chdir(self.curdir)
+        shutil.rmtree(self.tmpdir)
+
+    def test_distribute(self):
+        j = BatchJob(jobname='dist', queue='normal', nproc=6, nnode=3,
+                     logfiledir='logs', distribute='local', hostfile='hosts',
+                     slotspernode=2)
+        for i in range(6):
+            j.append_new_task('echo $HPCL_NODE; sleep 0.5',
+                              logfile='log_{0:d}'.format(i), threaded=True)
+        j.append_new_task('{mpiexec} echo "node:$HPCL_NODE"',
+                          logfile='log_mpi', threaded=True)
+        j.append_new_task('echo $HPCL_NODE', logfile='log_big', nthread=4,
+                          threaded=True)
+        content = j.generate_script()
+        self.assertIn("_hpcl_on_node 1 'echo $HPCL_NODE; sleep 0.5'", content)
+        self.assertIn("_hpcl_on_node 4 'echo $HPCL_NODE'", content)
+        with open('job.sh', 'w') as f:
+            f.write(content)
+        subprocess.check_call(['bash', 'job.sh'])
+        nodes = []
+        for i in range(6):
+            with open('logs/log_{0:d}'.format(i)) as f:
+                nodes.append(f.read().strip())
+        self.assertEqual(sorted(nodes), ['n1', 'n1', 'n2', 'n2', 'n3', 'n3'])
+        with open('logs/log_mpi') as f:
+            # mpi tasks are not distributed
+            self.assertEqual(f.read().strip(), 'node:')
+        with open('logs/log_big') as f:
+            self.assertIn(f.read().strip(), ['n1', 'n2', 'n3'])
+
+    def test_pinning_conflict(self):
+        j = BatchJob(jobname='dist', queue='normal', nproc=2,
+                     distribute=True, pinning='taskset', ncoresnode=2)
+        j.append_new_task('true', threaded=True)
+        with self.assertRaises(Exception):
+            j.generate_script()
+        self.assertEqual(distribute.get_slots_per_node(nproc=10, nnode=3), 4)
+
+
+if __name__ == '__main__':
+    """Run all tests"""
+    unittest.main()
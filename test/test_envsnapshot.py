@@ -0,0 +1,73 @@
+from hpclauncher import *
+from hpclauncher import envsnapshot
+import os
+import sys
+import shutil
+import tempfile
+import subprocess
+import unittest
+
+
+class TestEnvSnapshot(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.curdir = os.getcwd()
+        clusterparams.initialize_from_file('../examples/cluster_config/bash.yaml')
+        os.chdir(self.tmpdir)
+        with open('env.sh', 'w') as f:
+            f.write('echo loaded >> setup_calls\n'
+                    'export MYVAR="a b\'c"\n'
+                    'export PATH=/opt/mytool/bin:$PATH\n'
+                    'unset HPCL_TEST_UNSET\n')
+        self.setup = ['source {0}/env.sh'.format(self.tmpdir)]
+        pkgdir = os.path.dirname(os.path.dirname(envsnapshot.__file__))
+        os.environ['HPCL_TEST_UNSET'] = '1'
+        self.env = dict(os.environ, PYTHONPATH=pkgdir)
+
+    def tearDown(self):
+        del os.environ['HPCL_TEST_UNSET']
+        os.chdir(self.curdir)
+        shutil.rmtree(self.tmpdir)
+
+    def run_job(self, resolve):
+        j = BatchJob(jobname='envjob', queue='normal', nproc=1,
+                     logfiledir='logs', envsetup=self.setup, envcache='cache',
+                     envresolve=resolve, pythonexec=sys.executable)
+        for name in ['a', 'b', 'c']:
+            j.append_new_task('echo "$MYVAR x$HPCL_TEST_UNSET $PATH"',
+                              logfile='log_' + name, threaded=True)
+        content = j.generate_script()
+        with open('job.sh', 'w') as f:
+            f.write(content)
+        subprocess.check_call(['bash', 'job.sh'], env=self.env)
+        with open('logs/log_c') as f:
+            self.assertTrue(f.read().startswith("a b'c x /opt/mytool/bin:"))
+        return content
+
+    def count_setup_calls(self):
+        if not os.path.isfile('setup_calls'):
+            return 0
+        with open('setup_calls') as f:
+            return len(f.readlines())
+
+    def test_submit(self):
+        self.run_job('submit')
+        self.run_job('submit')
+        self.assertEqual(self.count_setup_calls(), 1)
+        snapshot = envsnapshot.get_snapshot_file(self.setup, 'cache')
+        with open(snapshot) as f:
+            content = f.read()
+        self.assertIn('unset HPCL_TEST_UNSET\n', content)
+        self.assertNotIn('SHLVL', content)
+
+    def test_job(self):
+        content = self.run_job('job')
+        self.assertIn(' -m hpclauncher envsnapshot ', content)
+        self.run_job('job')
+        self.assertEqual(self.count_setup_calls(), 1)
+
+
+if __name__ == '__main__':
+    """Run all tests"""
+    unittest.main()
@@ -0,0 +1,42 @@
+from hpclauncher import *
+import json
+import unittest
+
+
+class TestPhaseMetrics(unittest.TestCase):
+
+    def setUp(self):
+        metrics.reset()
+
+    def test_generate_script_phases(self):
+        clusterparams.initialize_from_file('../examples/cluster_config/mike_stampede.yaml')
+        calls = []
+
+        def hook(phase, duration):
+            calls.append(phase)
+        metrics.add_hook(hook)
+        try:
+            j = BatchJob(jobname='yamljob', queue='normal', nproc=12,
+                         timereq=TimeRequest(1, 0, 0))
+            j.append_new_task('echo hello')
+            j.generate_script()
+        finally:
+            metrics.remove_hook(hook)
+        self.assertEqual(calls, ['generate_script_header', 'generate_script'])
+        d = json.loads(metrics.to_json())
+        self.assertEqual(d['generate_script']['count'], 1)
+        self.assertEqual(d['generate_script']['buckets'][-1], ['+Inf', 1])
+
+    def test_prometheus_format(self):
+        metrics.observe('submit_call', 0.2)
+        metrics.observe('submit_call', 20.0)
+        out = metrics.to_prometheus().splitlines()
+        self.assertIn('# TYPE hpclauncher_phase_duration_seconds histogram', out)
+        self.assertIn('hpclauncher_phase_duration_seconds_bucket{phase="submit_call",le="0.5"} 1', out)
+        self.assertIn('hpclauncher_phase_duration_seconds_bucket{phase="submit_call",le="+Inf"} 2', out)
+        self.assertIn('hpclauncher_phase_duration_seconds_count{phase="submit_call"} 2', out)
+
+
+if __name__ == '__main__':
+    """Run all tests"""
+    unittest.main()
@@ -0,0 +1,52 @@
+from hpclauncher import *
+from hpclauncher import logscan
+import os
+import shutil
+import tempfile
+import unittest
+
+
+class TestLogScan(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.curdir = os.getcwd()
+        clusterparams.initialize_from_file('../examples/cluster_config/bash.yaml')
+        os.chdir(self.tmpdir)
+
+    def tearDown(self):
+        os.chdir(self.curdir)
+        shutil.rmtree(self.tmpdir)
+
+    def test_scan(self):
+        os.makedirs('run/log')
+        j = BatchJob(jobname='scan', queue='normal', nproc=1, rundir='run')
+        for name in ['ok', 'error', 'incomplete', 'missing']:
+            j.append_new_task('true', logfile='log_{taskname}_{case}',
+                              taskname=name, case='x')
+        j.append_new_task('true', taskname='nolog')
+        with open('run/log/log_ok_x', 'w') as f:
+            f.write('x'*100000 + '\nrun finished\n')
+        with open('run/log/log_error_x', 'w') as f:
+            f.write('starting\nTraceback (most recent call last):\n  boom\n'
+                    'run finished\n')
+        with open('run/log/log_incomplete_x', 'w') as f:
+            f.write('run finished\n' + 'x'*100000)
+        logs = logscan.get_task_logs(j)
+        self.assertEqual(logs[0], ('scan', 'ok', 'run/log/log_ok_x'))
+        self.assertEqual(len(logs), 4)
+        for workers in [1, 2]:
+            rows = logscan.scan_task_logs([j], done_patterns=['run finished'],
+                                          workers=workers, tailsize=1000)
+            self.assertEqual([r['status'] for r in rows],
+                             ['ok', 'error', 'incomplete', 'missing'])
+            self.assertEqual(rows[1]['match'],
+                             'Traceback (most recent call last):')
+        table = logscan.format_table(rows, statuses=['error'])
+        self.assertEqual(len(table.splitlines()), 2)
+        self.assertEqual(logscan.summarize(rows)['missing'], 1)
+
+
+if __name__ == '__main__':
+    """Run all tests"""
+    unittest.main()
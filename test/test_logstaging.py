@@ -0,0 +1,48 @@
+from hpclauncher import *
+from hpclauncher import logstaging
+import os
+import glob
+import shutil
+import tempfile
+import subprocess
+import unittest
+
+
+class TestLocalLogs(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.curdir = os.getcwd()
+        clusterparams.initialize_from_file('../examples/cluster_config/bash.yaml')
+        os.chdir(self.tmpdir)
+
+    def tearDown(self):
+        os.chdir(self.curdir)
+        shutil.rmtree(self.tmpdir)
+
+    def test_bundle(self):
+        j = BatchJob(jobname='locjob', queue='normal', nproc=1,
+                     logfiledir='logs', logmode='local')
+        j.append_new_task('echo hello {name}', name='a', logfile='log_a',
+                          taskname='a')
+        j.append_new_task('echo hello {name}', name='b', logfile='log_b',
+                          threaded=True, taskname='b')
+        content = j.generate_script()
+        self.assertIn('echo hello a &>> $_hpcl_logdir/log_a\n', content)
+        with open('job.sh', 'w') as f:
+            f.write(content)
+        env = dict(os.environ, TMPDIR=self.tmpdir, SLURM_JOB_ID='77')
+        subprocess.check_call(['bash', 'job.sh'], env=env)
+        bundle = 'logs/locjob_logs.77.tar.gz'
+        self.assertTrue(os.path.isfile(bundle))
+        self.assertEqual(glob.glob('hpclauncher_logs_*'), [])
+        self.assertEqual(logstaging.read_task_log(bundle, 'b'), 'hello b\n')
+        files = logstaging.extract_task_logs(bundle, ['a'])
+        self.assertEqual(files, ['logs/log_a'])
+        with open('logs/log_a') as f:
+            self.assertEqual(f.read(), 'hello a\n')
+
+
+if __name__ == '__main__':
+    """Run all tests"""
+    unittest.main()
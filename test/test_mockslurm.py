@@ -0,0 +1,369 @@
+from hpclauncher import *
+from hpclauncher import mockslurm
+from hpclauncher import priority
+from hpclauncher import partitions
+from hpclauncher import report
+from hpclauncher import limits
+import os
+import json
+import hashlib
+import shutil
+import tempfile
+import unittest
+
+
+class TestMockSlurm(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.curdir = os.getcwd()
+        os.chdir(self.tmpdir)
+        self.slurm = mockslurm.install('bin', statedir='state', seed=1)
+        clusterparams.initialize_from_file(os.path.join(self.curdir, '../examples/cluster_config/mike_stampede.yaml'))
+        kw = dict(clusterparams.get_args())
+        kw['submitexec'] = os.path.join(self.tmpdir, 'bin', 'sbatch')
+        kw['mpiexec'] = ''
+        clusterparams.initialize_with_args(scriptpattern=clusterparams.scriptpattern, **kw)
+
+    def tearDown(self):
+        os.chdir(self.curdir)
+        shutil.rmtree(self.tmpdir)
+
+    def test_dependencies(self):
+        treq = TimeRequest(0, 1, 0)
+        j1 = BatchJob(jobname='first', queue='normal', nproc=1, timereq=treq,
+                      logfile='log_first')
+        j1.append_new_task('sleep 0.2; exit 3')
+        j2 = BatchJob(jobname='second', queue='normal', nproc=1, timereq=treq,
+                      logfile='log_second', parentJobOk='first')
+        j2.append_new_task('echo second')
+        j3 = BatchJob(jobname='third', queue='normal', nproc=1, timereq=treq,
+                      logfile='log_third', parentjobany='first')
+        j3.append_new_task('echo third')
+        submit_jobs([j1, j2, j3])
+        self.assertTrue(self.slurm.wait(timeout=20))
+        jobs = self.slurm.get_jobs()
+        self.assertEqual(jobs['2']['dependency'], [['afterok', 1]])
+        self.assertEqual(jobs['2']['reason'], 'DependencyNeverSatisfied')
+        self.assertGreaterEqual(jobs['3']['start'], jobs['1']['end'] - 1.0)
+        out = self.slurm.sacct(['-j', '1,2,3', '-P', '-n',
+                                '--format=JobID,JobName,State,ExitCode'])
+        self.assertEqual(out, '1|first|FAILED|3:0\n2|second|PENDING|0:0\n'
+                         '3|third|COMPLETED|0:0\n')
+
+    def test_bulk_control(self):
+        self.slurm.configure(partitions={'normal': {'nodes': 1, 'cpus_per_node': 4,
+                                                    'max_time': '01:00:00'}})
+        jobs = []
+        for name, parent in [('blocker', None), ('a', None), ('b', 'a'),
+                             ('c', 'b'), ('d', None)]:
+            kw = {'parentjobok': parent} if parent else {}
+            j = BatchJob(jobname=name, queue='normal', nproc=1,
+                         logfile='log_' + name, **kw)
+            j.append_new_task('sleep 10' if name == 'blocker' else 'true')
+            jobs.append(j)
+        run = submit_jobs(jobs)
+        self.assertEqual(run.get_children('a'), ['b'])
+        self.assertEqual(run.get_descendants(['a']), ['a', 'b', 'c'])
+        calls = run.hold('a')
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(calls[0][1:], ['hold', '2,3,4'])
+        run.cancel('b')
+        run.cancel('blocker', descendants=False)
+        self.assertTrue(self.slurm.wait([1, 5], timeout=20))
+        jobs = self.slurm.get_jobs()
+        states = [(jobs[i]['state'], jobs[i]['held']) for i in ['1', '2', '3', '4', '5']]
+        self.assertEqual(states, [('CANCELLED', False), ('PENDING', True),
+                                  ('CANCELLED', True), ('CANCELLED', True),
+                                  ('COMPLETED', False)])
+        run.save('run.json')
+        run = SubmittedRun.load('run.json')
+        run.release()
+        self.assertTrue(self.slurm.wait([2], timeout=20))
+        self.assertEqual(self.slurm.get_jobs()['2']['state'], 'COMPLETED')
+
+    def test_submit_failure(self):
+        self.slurm.configure(submit_failure_rate=1.0)
+        j = BatchJob(jobname='fail', queue='normal', nproc=1)
+        j.append_new_task('true')
+        with self.assertRaises(Exception):
+            submit_jobs(j)
+        self.assertEqual(self.slurm.get_jobs(), {})
+
+    def test_heterogeneous_job(self):
+        solver = BatchJob(jobname='solver', queue='normal', nproc=16, nnode=1,
+                          timereq=TimeRequest(0, 10, 0), logfile='log_pair',
+                          hetjob='pair')
+        solver.append_new_task('echo solver >> out.txt')
+        post = BatchJob(jobname='post', queue='normal', nproc=2, nnode=1,
+                        timereq=TimeRequest(0, 5, 0), parentjobok='solver',
+                        hetjob='pair')
+        post.append_new_task('echo post {mpiexec} >> out.txt')
+        child = BatchJob(jobname='child', queue='normal', nproc=1,
+                         logfile='log_child', parentjobok='post')
+        child.append_new_task('echo child >> out.txt')
+        run = submit_jobs([solver, post, child])
+        self.assertEqual(len(run), 2)
+        self.assertEqual(run['post'], run['pair'])
+        with open('batch_pair.sub') as f:
+            content = f.read()
+        self.assertEqual(content.count('#SBATCH -J'), 1)
+        self.assertEqual(content.count('#SBATCH -t 00:15:00'), 2)
+        self.assertIn('#SBATCH -A TG-OCENNNNNN\n#SBATCH hetjob\n'
+                      '#SBATCH -N 1\n#SBATCH -n 2\n', content)
+        self.assertTrue(self.slurm.wait(timeout=20))
+        jobs = self.slurm.get_jobs()
+        self.assertEqual(jobs['1']['nodes'], 2)
+        self.assertEqual(jobs['2']['dependency'], [['afterok', 1]])
+        with open('out.txt') as f:
+            self.assertEqual(f.read(), 'solver\npost srun --het-group=1\nchild\n')
+
+    def test_chain_fusion(self):
+        def make_jobs():
+            jobs = []
+            for name, nproc, parent, cmd in [('a', 4, None, ''),
+                                             ('b', 2, 'a', '; exit 3'),
+                                             ('c', 2, 'b', ''),
+                                             ('d', 8, 'c', '')]:
+                kw = {'parentjobok': parent} if parent else {}
+                j = BatchJob(jobname=name, queue='normal', nproc=nproc,
+                             timereq=TimeRequest(0, 10, 0),
+                             logfile='log_' + name, **kw)
+                j.append_new_task('echo {0} >> out.txt{1}'.format(name, cmd))
+                jobs.append(j)
+            return jobs
+        # split chains that exceed the wall time limit
+        fused = fuse_chains(make_jobs(), maxwalltime='00:20:00')
+        self.assertEqual([j['jobname'] for j in fused], ['a', 'c', 'd'])
+        self.assertEqual([s['jobname'] for s in fused[0].stages], ['a', 'b'])
+        self.assertEqual(fused[1]['parentjobok'], 'a')
+        jobs = make_jobs()
+        run = submit_jobs(jobs, fuse=True)
+        self.assertEqual(len(run), 2)
+        self.assertEqual(run['c'], run['a'])
+        with open('batch_a.sub') as f:
+            self.assertIn('#SBATCH -t 00:30:00\n', f.read())
+        self.assertTrue(self.slurm.wait([1], timeout=20))
+        jobs = self.slurm.get_jobs()
+        self.assertEqual((jobs['1']['state'], jobs['1']['exitcode']),
+                         ('FAILED', 3))
+        self.assertEqual(jobs['2']['dependency'], [['afterok', 1]])
+        self.assertEqual(jobs['2']['reason'], 'DependencyNeverSatisfied')
+        with open('out.txt') as f:
+            self.assertEqual(f.read(), 'a\nb\n')
+
+    def test_critical_path_order(self):
+        jobs = []
+        for name, minutes, parent in [('leaf1', 10, None), ('leaf2', 10, None),
+                                      ('c', 10, 'b'), ('a', 10, None),
+                                      ('b', 60, 'a')]:
+            kw = {'parentjobok': parent} if parent else {}
+            j = BatchJob(jobname=name, queue='normal', nproc=1,
+                         timereq=TimeRequest(0, minutes, 0), **kw)
+            j.append_new_task('true')
+            jobs.append(j)
+        lengths = priority.get_path_lengths(jobs)
+        self.assertEqual(lengths['a'], 80*60)
+        run = submit_jobs(jobs, critical_path=True, nice=100)
+        self.assertEqual(list(run.jobs.keys()), ['a', 'b', 'leaf1', 'leaf2', 'c'])
+        self.assertTrue(self.slurm.wait(timeout=20))
+        jobs = self.slurm.get_jobs()
+        self.assertEqual([jobs[str(run[n])]['nice'] for n in ['a', 'b', 'c']],
+                         [0, 12, 88])
+        cycle = [BatchJob(jobname='x', queue='normal', nproc=1, parentjobok='y'),
+                 BatchJob(jobname='y', queue='normal', nproc=1, parentjobok='x')]
+        with self.assertRaises(Exception):
+            priority.get_path_lengths(cycle)
+
+    def test_render_manifest(self):
+        jobs = []
+        for i in range(6):
+            kw = {'parentjobok': 'job0'} if i > 0 else {}
+            j = BatchJob(jobname='job{0:d}'.format(i), queue='normal', nproc=1,
+                         timereq=TimeRequest(0, 5, 0),
+                         logfile='log_job{0:d}'.format(i), **kw)
+            j.append_new_task('echo {0:d}'.format(i))
+            jobs.append(j)
+        manifest = render_jobs(jobs, 'scripts', workers=2, batchsize=2)
+        self.assertEqual(len(self.slurm.get_jobs()), 0)
+        with open(manifest) as f:
+            entries = json.load(f)['jobs']
+        self.assertEqual(entries[1]['dependencies'], {'parentjobok': 'job0'})
+        self.assertEqual(entries[1]['resources']['walltime'], '00:05:00')
+        with open(os.path.join('scripts', entries[1]['script'])) as f:
+            content = f.read()
+        self.assertIn('afterok:@HPCL_PARENTJOBOK@', content)
+        self.assertEqual(hashlib.sha1(content.encode()).hexdigest(),
+                         entries[1]['sha1'])
+        run = submit_manifest(manifest)
+        self.assertEqual(run['job5'], 6)
+        self.assertTrue(self.slurm.wait(timeout=20))
+        jobs = self.slurm.get_jobs()
+        self.assertEqual(jobs['6']['dependency'], [['afterok', 1]])
+        self.assertEqual(jobs['6']['state'], 'COMPLETED')
+
+    def test_partition_selection(self):
+        self.slurm.configure(partitions={
+            'normal': {'nodes': 1, 'cpus_per_node': 4, 'max_time': '01:00:00'},
+            'short': {'nodes': 2, 'cpus_per_node': 4, 'max_time': '00:10:00'}})
+        blocker = BatchJob(jobname='blocker', queue='normal', nproc=1,
+                           timereq=TimeRequest(0, 30, 0), logfile='log_blocker')
+        blocker.append_new_task('sleep 10')
+        submit_jobs([blocker])
+        jobs = []
+        for name in ['a', 'b', 'c']:
+            j = BatchJob(jobname=name, queue=['normal', 'short'], nproc=1,
+                         timereq=TimeRequest(0, 1, 0), logfile='log_' + name)
+            j.append_new_task('true')
+            jobs.append(j)
+        selector = partitions.PartitionSelector()
+        self.assertEqual(selector.get_state(),
+                         {'normal': (0, 4), 'short': (2, 4)})
+        self.assertEqual([selector.select(j) for j in jobs],
+                         ['short', 'short', 'short'])
+        self.assertEqual(selector.get_state()['short'], (0, 4))
+        self.assertEqual(len(selector.estimates), 1)
+        j = BatchJob(jobname='d', queue=['normal', 'short'], nproc=1,
+                     timereq=TimeRequest(0, 1, 0), logfile='log_d')
+        j.append_new_task('true')
+        run = submit_jobs([j])
+        self.assertEqual(self.slurm.get_jobs()[str(run['d'])]['partition'],
+                         'short')
+        run = SubmittedRun(clusterparams['resourcemanager'])
+        run.add_job('blocker', 1)
+        run.cancel()
+
+    def test_run_report(self):
+        treq = TimeRequest(0, 1, 0)
+        jobs = []
+        for name, parent, cmd in [('pre', None, 'sleep 3'),
+                                  ('side', None, 'true'),
+                                  ('main', 'pre', 'sleep 1')]:
+            kw = {'parentjobok': parent} if parent else {}
+            j = BatchJob(jobname=name, queue='normal', nproc=1, timereq=treq,
+                         logfile='log_' + name, **kw)
+            j.append_new_task(cmd)
+            jobs.append(j)
+        run = submit_jobs(jobs)
+        self.assertTrue(self.slurm.wait(timeout=20))
+        run.save('run.json')
+        run = SubmittedRun.load('run.json')
+        self.assertEqual(run.jobs['main']['resources']['walltime'],
+                         '00:01:00')
+        rows, summary = report.generate_report(run)
+        self.assertEqual(summary['critical_path'], ['pre', 'main'])
+        self.assertEqual([r['critical'] for r in rows], [True, False, True])
+        main = rows[2]
+        self.assertEqual(main['state'], 'COMPLETED')
+        self.assertGreaterEqual(main['dependency_wait'], 1)
+        self.assertEqual(main['walltime'], 60)
+        self.assertLess(main['utilization'], 1.0)
+        self.assertGreaterEqual(summary['makespan'], 2)
+        report.write_csv(rows, 'report.csv')
+        with open('report.csv') as f:
+            self.assertEqual(len(f.readlines()), 4)
+
+    def test_preflight_limits(self):
+        self.slurm.configure(
+            partitions={'normal': {'nodes': 4, 'cpus_per_node': 4,
+                                   'max_time': '01:00:00', 'max_nodes': 2}},
+            qos={'normal': {'max_submit_pu': 2, 'max_cpus': 8}})
+        clusterparams.get_args()['limitscache'] = 'limits'
+        jobs = []
+        for name, queue, hours, nnode in [('long', 'normal', 2, 1),
+                                          ('wide', 'normal', 0, 3),
+                                          ('gpu', 'gpu', 0, 1),
+                                          ('ok', 'normal', 0, 1)]:
+            j = BatchJob(jobname=name, queue=queue, nproc=nnode,
+                         nnode=nnode, timereq=TimeRequest(hours, 10, 0),
+                         logfile='log_' + name)
+            j.append_new_task('true')
+            jobs.append(j)
+        with self.assertRaises(Exception) as cm:
+            submit_jobs(jobs, preflight=True)
+        msg = str(cm.exception)
+        self.assertIn('4 limit violations', msg)
+        self.assertIn('long: wall time 02:10:00 exceeds partition normal '
+                      'limit 01:00:00', msg)
+        self.assertIn('wide: nodes 3 exceeds partition normal limit 2', msg)
+        self.assertIn('gpu: unknown partition gpu', msg)
+        self.assertIn('3 jobs in QOS normal exceed MaxSubmitPU 2', msg)
+        self.assertEqual(len(self.slurm.get_jobs()), 0)
+        # limits are read from the cache until refreshed
+        self.slurm.configure(qos={'normal': {}})
+        self.assertEqual(limits.get_limits()['qos']['normal']['maxsubmit'], 2)
+        fresh = limits.get_limits(refresh=True)
+        self.assertEqual(fresh['qos']['normal']['maxsubmit'], None)
+        self.assertEqual(limits.validate_jobs(jobs[3:], fresh), [])
+
+    def test_fan_in_barriers(self):
+        clusterparams.get_args()['maxfanin'] = 2
+        treq = TimeRequest(0, 1, 0)
+        jobs = []
+        for i in range(5):
+            name = 'run{0:d}'.format(i)
+            j = BatchJob(jobname=name, queue='normal', nproc=1,
+                         timereq=treq, logfile='log_' + name)
+            j.append_new_task('sleep 0.{0:d}'.format(i))
+            jobs.append(j)
+        agg = BatchJob(jobname='agg', queue='normal', nproc=1, timereq=treq,
+                       logfile='log_agg',
+                       parentJobOk=[j['jobname'] for j in jobs])
+        agg.append_new_task('echo agg')
+        run = submit_jobs(jobs + [agg])
+        self.assertEqual(list(run.jobs),
+                         ['run0', 'run1', 'run2', 'run3', 'run4',
+                          'agg_barrierok1_1', 'agg_barrierok1_2',
+                          'agg_barrierok2_1', 'agg'])
+        self.assertEqual(run.jobs['agg']['parents'],
+                         ['agg_barrierok2_1', 'run4'])
+        self.assertTrue(self.slurm.wait(timeout=30))
+        state = self.slurm.get_jobs()
+        self.assertEqual(state['6']['dependency'], [['afterok', 1],
+                                                    ['afterok', 2]])
+        self.assertEqual(state['9']['dependency'], [['afterok', 8],
+                                                    ['afterok', 5]])
+        self.assertEqual(set(s['state'] for s in state.values()),
+                         set(['COMPLETED']))
+        last_end = max(state[str(i)]['end'] for i in range(1, 6))
+        self.assertGreaterEqual(state['9']['start'], last_end - 1.0)
+
+    def test_rest_submission(self):
+        server = mockslurm.start_restd('unix:' + os.path.join(self.tmpdir, 'rest.sock'),
+                                       statedir='state')
+        kw = dict(clusterparams.get_args())
+        kw['submitexec'] = 'unix:' + os.path.join(self.tmpdir, 'rest.sock')
+        kw['resourcemanager'] = 'slurmrest'
+        kw['restconnections'] = 3
+        clusterparams.initialize_with_args(scriptpattern=clusterparams.scriptpattern, **kw)
+        try:
+            jobs = []
+            for i in range(10):
+                j = BatchJob(jobname='job{:d}'.format(i), queue='normal', nproc=1,
+                             timereq=TimeRequest(0, 1, 30), logfile='log_rest')
+                j.append_new_task('echo hello')
+                jobs.append(j)
+            j = BatchJob(jobname='last', queue='normal', nproc=1,
+                         logfile='log_last', parentjobok='job3')
+            j.append_new_task('echo last')
+            jobs.append(j)
+            run = submit_jobs(jobs)
+            self.assertEqual(sorted(run.get_job_ids()), list(range(1, 12)))
+            self.assertLessEqual(server.connections, 3)
+            self.assertEqual(server.requests, 11)
+            self.assertTrue(self.slurm.wait(timeout=20))
+            jobs = self.slurm.get_jobs()
+            self.assertEqual(jobs[str(run['last'])]['dependency'],
+                             [['afterok', run['job3']]])
+            self.assertEqual(jobs[str(run['job0'])]['timelimit'], 120)
+            self.assertEqual(jobs[str(run['job0'])]['name'], 'job0')
+            self.assertEqual(set(j['state'] for j in jobs.values()),
+                             set(['COMPLETED']))
+        finally:
+            server.shutdown()
+            server.server_close()
+
+
+if __name__ == '__main__':
+    """Run all tests"""
+    unittest.main()
@@ -0,0 +1,79 @@
+from hpclauncher import *
+from hpclauncher import pyworker
+from hpclauncher import sentinel
+import os
+import sys
+import shutil
+import tempfile
+import subprocess
+import unittest
+
+TASK_MODULE = """import os
+def report(name, value=None):
+    print('task {0} {1} {2}'.format(name, value, os.getpid()))
+def fail(code):
+    return code
+def crash():
+    raise ValueError('bad input')
+"""
+
+
+class TestPyWorker(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.curdir = os.getcwd()
+        clusterparams.initialize_from_file('../examples/cluster_config/bash.yaml')
+        os.chdir(self.tmpdir)
+        with open('mytasks.py', 'w') as f:
+            f.write(TASK_MODULE)
+        pkgdir = os.path.dirname(os.path.dirname(pyworker.__file__))
+        self.env = dict(os.environ,
+                        PYTHONPATH=os.pathsep.join([pkgdir, self.tmpdir]))
+
+    def tearDown(self):
+        os.chdir(self.curdir)
+        shutil.rmtree(self.tmpdir)
+
+    def test_tasks(self):
+        j = BatchJob(jobname='pyjob', queue='normal', nproc=1,
+                     logfiledir='logs', pyworkers=2, pythonexec=sys.executable,
+                     sentineldir='sentinels', case='c1')
+        for name in ['a', 'b', 'c']:
+            j.append_new_task(function='mytasks:report', funcargs=[name],
+                              funckwargs={'value': '{case}'},
+                              logfile='log_' + name, taskname=name,
+                              threaded=True)
+        j.append_new_task('echo bash', logfile='log_bash')
+        j.append_new_task(function='mytasks:fail', funcargs=[3],
+                          taskname='fail', logfile='log_fail')
+        j.append_new_task(function='mytasks:crash', taskname='crash',
+                          logfile='log_crash', threaded=True)
+        content = j.generate_script()
+        self.assertIn('_hpcl_pytask 0 "logs/log_a"', content)
+        with open('job.sh', 'w') as f:
+            f.write(content)
+        subprocess.check_call(['bash', 'job.sh'], env=self.env)
+        pids = set()
+        for name in ['a', 'b', 'c']:
+            with open('logs/log_' + name) as f:
+                words = f.read().split()
+            self.assertEqual(words[:3], ['task', name, 'c1'])
+            pids.add(words[3])
+        self.assertTrue(len(pids) <= 2)
+        with open('logs/log_crash') as f:
+            self.assertIn('ValueError: bad input', f.read())
+        for name, code in [('a', 0), ('fail', 3), ('crash', 1)]:
+            f = sentinel.get_task_sentinel('pyjob', name, 'sentinels')
+            self.assertEqual(sentinel.read_sentinel(f)[1], code)
+        # workers and their directory are gone
+        self.assertEqual(subprocess.call(['pgrep', '-f', 'pyworker -d']), 1)
+
+    def test_missing_command(self):
+        with self.assertRaises(Exception):
+            BatchTask(logfile='log')
+
+
+if __name__ == '__main__':
+    """Run all tests"""
+    unittest.main()
@@ -0,0 +1,92 @@
+from hpclauncher import *
+from hpclauncher import sentinel
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+
+class TestSentinel(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.curdir = os.getcwd()
+        clusterparams.initialize_from_file('../examples/cluster_config/bash.yaml')
+        os.chdir(self.tmpdir)
+
+    def tearDown(self):
+        os.chdir(self.curdir)
+        shutil.rmtree(self.tmpdir)
+
+    def test_local_jobs(self):
+        jobs = []
+        for i, cmd in enumerate(['sleep 0.2', 'exit 3']):
+            j = BatchJob(jobname='job{:d}'.format(i), queue='normal', nproc=1,
+                         logfile='log_job{:d}'.format(i), logfiledir='log',
+                         sentineldir='sentinels')
+            j.append_new_task('echo hello', taskname='a')
+            j.append_new_task(cmd, taskname='b')
+            jobs.append(j)
+        run = submit_jobs(jobs)
+        # bash jobs with sentinels run in the background
+        self.assertNotEqual(run['job0'], 0)
+        finished = []
+        status = sentinel.wait_for_jobs(
+            ['job0', 'job1'], 'sentinels', timeout=20,
+            callback=lambda *args: finished.append(args))
+        self.assertEqual(status['job0'], ('COMPLETED', 0))
+        self.assertEqual(status['job1'], ('FAILED', 3))
+        self.assertEqual(len(finished), 2)
+        self.assertEqual(sentinel.read_sentinel('sentinels/job0.a.task'),
+                         ('COMPLETED', 0))
+        self.assertEqual(os.listdir('sentinels').count('job1.b.task.tmp'), 0)
+
+    def test_scan_fallback(self):
+        waiter = sentinel.SentinelWaiter(use_inotify=False, scan_interval=0.05)
+        self.assertFalse(waiter.uses_inotify)
+        paths = ['s/f{:d}.job'.format(i) for i in range(50)]
+
+        def write():
+            for p in paths:
+                with open(p + '.tmp', 'w') as f:
+                    f.write('COMPLETED 0\n')
+                os.rename(p + '.tmp', p)
+        os.makedirs('s')
+        threading.Timer(0.1, write).start()
+        done = waiter.wait(paths, timeout=20)
+        self.assertEqual(list(done.keys()), paths)
+        self.assertEqual(waiter.wait(['s/missing.job'], timeout=0.1), {})
+
+    def test_inotify(self):
+        waiter = sentinel.SentinelWaiter()
+        if not waiter.uses_inotify:
+            self.skipTest('inotify not available')
+        os.makedirs('s')
+
+        def write():
+            with open('s/x.job', 'w') as f:
+                f.write('FAILED 143\n')
+        threading.Timer(0.1, write).start()
+        done = waiter.wait(['s/x.job'], timeout=20)
+        self.assertEqual(done['s/x.job'], ('FAILED', 143))
+
+
+    def test_missed_event(self):
+        waiter = sentinel.SentinelWaiter(scan_interval=0.05)
+        if not waiter.uses_inotify:
+            self.skipTest('inotify not available')
+        # events are dropped, the file must be found by rescanning
+        waiter._read_events = lambda *args: None
+        os.makedirs('s')
+
+        def write():
+            with open('s/y.job', 'w') as f:
+                f.write('COMPLETED 0\n')
+        threading.Timer(0.1, write).start()
+        done = waiter.wait(['s/y.job'])
+        self.assertEqual(done['s/y.job'], ('COMPLETED', 0))
+
+if __name__ == '__main__':
+    """Run all tests"""
+    unittest.main()
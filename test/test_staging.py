@@ -0,0 +1,50 @@
+from hpclauncher import *
+import os
+import shutil
+import tempfile
+import subprocess
+import unittest
+
+
+class TestStaging(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.curdir = os.getcwd()
+
+    def tearDown(self):
+        os.chdir(self.curdir)
+        shutil.rmtree(self.tmpdir)
+
+    def test_stage_in_out_bash(self):
+        clusterparams.initialize_from_file('../examples/cluster_config/bash.yaml')
+        os.chdir(self.tmpdir)
+        with open('mesh.txt', 'w') as f:
+            f.write('mesh\n')
+        j = BatchJob(jobname='stagejob', queue='normal', nproc=1,
+                     stage_in=['mesh.txt'], stage_out=['out.txt'])
+        j.append_new_task('cat {mesh} > {stagedir}/out.txt', mesh='mesh.txt')
+        content = j.generate_script()
+        self.assertIn('cat $_hpcl_stagedir/mesh.txt > $_hpcl_stagedir/out.txt\n',
+                      content)
+        with open('job.sh', 'w') as f:
+            f.write(content)
+        env = dict(os.environ, TMPDIR=self.tmpdir)
+        subprocess.check_call(['bash', 'job.sh'], env=env)
+        with open('out.txt') as f:
+            self.assertEqual(f.read(), 'mesh\n')
+        self.assertEqual(sorted(os.listdir('.')), ['job.sh', 'log', 'mesh.txt', 'out.txt'])
+
+    def test_sbcast(self):
+        clusterparams.initialize_from_file('../examples/cluster_config/mike_stampede.yaml')
+        j = BatchJob(jobname='stagejob', queue='normal', nproc=32, nnode=2,
+                     stage_in=['/data/mesh.gr3'])
+        j.append_new_task('{mpiexec} solver -m {mesh}', mesh='/data/mesh.gr3')
+        content = j.generate_script()
+        self.assertIn('sbcast -f /data/mesh.gr3 $_hpcl_stagedir/mesh.gr3\n', content)
+        self.assertIn('ibrun tacc_affinity solver -m $_hpcl_stagedir/mesh.gr3\n', content)
+
+
+if __name__ == '__main__':
+    """Run all tests"""
+    unittest.main()